@@ -3,13 +3,72 @@ import logging
 # Set up default logger
 logging.getLogger(__name__).addHandler(logging.NullHandler())
 
-from .encoding import detect, convert
-from .recovery import repair_mojibake, decode_unicode_escapes
-
 __version__ = "0.0.1"
 __all__ = [
     "detect", 
     "convert", 
+    "convert_report",
+    "iter_convert",
+    "convert_stream",
+    "detect_file",
+    "convert_file",
+    "transcode",
+    "iter_transcode",
+    "transcode_file",
+    "segment_detect",
+    "convert_mixed",
+    "transcode_mixed_file",
+    "tail_convert",
+    "detect_many",
+    "convert_many",
     "repair_mojibake", 
-    "decode_unicode_escapes"
+    "repair_mojibake_report",
+    "iter_repair_mojibake",
+    "decode_unicode_escapes",
+    "iter_decode_unicode_escapes",
+    "Pipeline",
+    "DetectionCache",
+    "SQLiteCache",
 ]
+
+# Public name -> submodule defining it. Submodules are imported on first access so that
+# `import charset_util` stays cheap (charset_normalizer and ftfy load only when used).
+_LAZY = {
+    "detect": "encoding",
+    "convert": "encoding",
+    "convert_report": "encoding",
+    "iter_convert": "encoding",
+    "convert_stream": "encoding",
+    "detect_file": "encoding",
+    "convert_file": "encoding",
+    "transcode": "encoding",
+    "iter_transcode": "encoding",
+    "transcode_file": "encoding",
+    "segment_detect": "mixed",
+    "convert_mixed": "mixed",
+    "transcode_mixed_file": "mixed",
+    "tail_convert": "tail",
+    "detect_many": "batch",
+    "convert_many": "batch",
+    "repair_mojibake": "recovery",
+    "repair_mojibake_report": "recovery",
+    "iter_repair_mojibake": "recovery",
+    "decode_unicode_escapes": "recovery",
+    "iter_decode_unicode_escapes": "recovery",
+    "Pipeline": "pipeline",
+    "DetectionCache": "cache",
+    "SQLiteCache": "cache",
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
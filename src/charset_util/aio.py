@@ -0,0 +1,104 @@
+import asyncio
+import functools
+import weakref
+from concurrent.futures import Executor
+from typing import Any, Callable, Optional, Union
+
+from .encoding import detect, convert
+from .recovery import repair_mojibake, decode_unicode_escapes
+
+# Payloads smaller than this (bytes or characters) run inline: offloading costs more than the work
+DEFAULT_INLINE_THRESHOLD = 64 * 1024
+
+# Offloaded calls allowed to run at the same time, per event loop
+DEFAULT_MAX_CONCURRENCY = 4
+
+_executor = None
+_max_concurrency = DEFAULT_MAX_CONCURRENCY
+_inline_threshold = DEFAULT_INLINE_THRESHOLD
+
+# asyncio primitives belong to one event loop, so keep a semaphore per loop
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def configure(
+    executor: Optional[Executor] = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    inline_threshold: int = DEFAULT_INLINE_THRESHOLD,
+) -> None:
+    """
+    Configure how the async functions offload work.
+    配置异步函数如何卸载工作。
+
+    Args:
+        executor: A ThreadPoolExecutor or ProcessPoolExecutor. None uses the event loop's
+                  default executor (threads). A process pool avoids holding the GIL on large bodies.
+                  线程池或进程池执行器。None 表示使用事件循环默认的执行器（线程）。
+                  进程池可以避免处理大文本时占用 GIL。
+        max_concurrency: Offloaded calls running at once per event loop; the rest wait.
+                         每个事件循环同时运行的卸载调用数；其余的排队等待。
+        inline_threshold: Payloads smaller than this run inline on the event loop.
+                          小于该大小的内容直接在事件循环中执行。
+    """
+    global _executor, _max_concurrency, _inline_threshold
+    _executor = executor
+    _max_concurrency = max_concurrency
+    _inline_threshold = inline_threshold
+    _semaphores.clear()
+
+
+def _semaphore(loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(_max_concurrency)
+    return semaphore
+
+
+async def _offload(size: int, func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    Run func inline when the payload is small, otherwise in the executor under the concurrency limit.
+    内容较小时直接执行 func，否则在并发限制下交给执行器。
+
+    If the awaiting task is cancelled, a call that has not started yet never runs and the
+    slot is released at once. A call that is already running finishes in the background
+    and its result is dropped.
+    如果等待的任务被取消，尚未开始的调用不会运行，名额立即释放；
+    已经在运行的调用会在后台完成，其结果被丢弃。
+    """
+    if size < _inline_threshold:
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    async with _semaphore(loop):
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def adetect(content: Union[bytes, str], **kwargs: Any) -> dict:
+    """
+    Async version of detect(); keyword arguments are passed through.
+    detect() 的异步版本；关键字参数原样传递。
+    """
+    return await _offload(len(content), detect, content, **kwargs)
+
+
+async def aconvert(content: bytes, **kwargs: Any) -> str:
+    """
+    Async version of convert(); keyword arguments are passed through.
+    convert() 的异步版本；关键字参数原样传递。
+    """
+    return await _offload(len(content), convert, content, **kwargs)
+
+
+async def arepair(text: str) -> str:
+    """
+    Async version of repair_mojibake().
+    repair_mojibake() 的异步版本。
+    """
+    return await _offload(len(text), repair_mojibake, text)
+
+
+async def adecode_unicode_escapes(text: str) -> str:
+    """
+    Async version of decode_unicode_escapes().
+    decode_unicode_escapes() 的异步版本。
+    """
+    return await _offload(len(text), decode_unicode_escapes, text)
@@ -0,0 +1,214 @@
+from itertools import repeat
+from typing import Iterable, List, Optional, Union
+
+from . import instrument
+from .encoding import _decoding_codec, _fast_detect, _scope, convert, detect
+
+# Items shorter than this are pooled into the column sample (column=True)
+SHORT_ITEM_SIZE = 256
+
+# Items sent to a worker process per task
+BATCH_CHUNK = 512
+
+# Separator between pooled items: ASCII, so it never splits a multibyte character
+_POOL_SEPARATOR = b"\n"
+
+Item = Optional[Union[bytes, bytearray, memoryview, str]]
+
+
+def _detect_chunk(values: List[bytes], options: dict) -> List[dict]:
+    """Detect each value (runs in a worker process). (逐个检测，在工作进程中运行)"""
+    return [detect(value, **options) for value in values]
+
+
+def _strict_decodes(value: bytes, encoding: str) -> bool:
+    try:
+        value.decode(encoding)
+        return True
+    except (UnicodeDecodeError, LookupError):
+        return False
+
+
+def _detect_unique(
+    values: List[bytes],
+    chunk_size: Optional[int],
+    column: bool,
+    jobs: int,
+    scope_options: dict,
+) -> List[dict]:
+    """One detection per distinct value: fast tiers, then the column sample, then the pool."""
+    scope = _scope(**scope_options)
+    results = [None] * len(values)
+    hard = []
+    fast_bytes = 0
+    started = instrument.clock()
+    for index, value in enumerate(values):
+        if chunk_size is None or len(value) <= chunk_size:
+            # The whole value is examined, so a UTF-8 sequence cut at its end is invalid
+            result = _fast_detect(value, scope, truncated=False)
+            if result is not None:
+                result["bytes_examined"] = len(value)
+                results[index] = result
+                fast_bytes += len(value)
+                continue
+        hard.append(index)
+    instrument.emit("batch.fast", fast_bytes, started)
+
+    if column:
+        short = [i for i in hard if len(values[i]) < SHORT_ITEM_SIZE and b"\x00" not in values[i]]
+        if short:
+            # Short strings carry too little signal on their own; one decision for the column
+            # is both faster and more reliable, and items it cannot decode are detected alone
+            started = instrument.clock()
+            sample = _POOL_SEPARATOR.join(values[i] for i in short)
+            pooled = detect(sample, chunk_size=chunk_size, **scope_options)
+            encoding = pooled["encoding"]
+            pooled_items = set(short)
+            hard = [i for i in hard if i not in pooled_items]
+            for i in short:
+                if encoding is not None and _strict_decodes(values[i], encoding):
+                    results[i] = dict(pooled, method="column", bytes_examined=len(values[i]))
+                else:
+                    hard.append(i)
+            hard.sort()
+            instrument.emit("batch.column", len(sample), started)
+
+    options = dict(scope_options, chunk_size=chunk_size)
+    if jobs > 1 and len(hard) > BATCH_CHUNK:
+        from concurrent.futures import ProcessPoolExecutor
+        chunks = [[values[i] for i in hard[start:start + BATCH_CHUNK]] for start in range(0, len(hard), BATCH_CHUNK)]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            detected = [result for chunk in pool.map(_detect_chunk, chunks, repeat(options)) for result in chunk]
+    else:
+        detected = _detect_chunk([values[i] for i in hard], options)
+    for index, result in zip(hard, detected):
+        results[index] = result
+    return results
+
+
+def _unique(items: Iterable[Item]):
+    """Distinct byte values, and each item's index into them (None and str items are kept as they are)."""
+    index_of = {}
+    values = []
+    positions = []
+    for item in items:
+        if item is None or isinstance(item, str):
+            positions.append(item)
+            continue
+        if not isinstance(item, bytes):
+            item = bytes(item)
+        index = index_of.get(item)
+        if index is None:
+            index = index_of[item] = len(values)
+            values.append(item)
+        positions.append(index)
+    return values, positions
+
+
+def detect_many(
+    items: Iterable[Item],
+    chunk_size: Optional[int] = 1024 * 50,
+    column: bool = False,
+    jobs: int = 1,
+    candidates: Optional[Union[str, Iterable[str]]] = None,
+    exclude: Optional[Iterable[str]] = None,
+    language: Optional[str] = None,
+) -> List[Optional[dict]]:
+    """
+    Detect the encoding of many byte strings, e.g. the values of a database column.
+    检测大量字节串的编码，例如数据库某一列的值。
+
+    Use Case (场景):
+    - Cleaning text columns with millions of short, often repeated values: a Python loop over
+      detect() is dominated by per-call overhead, and short values are too short to detect reliably.
+    - 清洗包含数百万个短小、经常重复的值的文本列：对 detect() 的 Python 循环主要耗在每次调用的开销上，
+      而且短值太短，无法可靠地检测。
+
+    Identical values are detected once. Values that are ASCII, valid UTF-8 or start with a
+    BOM are answered by the fast tiers without a detect() call. With column=True, the
+    remaining short values are joined into one sample and share one decision (method
+    'column'); values that do not decode with it are detected on their own. What is left
+    is detected in chunks of BATCH_CHUNK on a process pool when jobs > 1.
+    相同的值只检测一次。ASCII、合法 UTF-8 或以 BOM 开头的值由快速层直接给出结果，不调用 detect()。
+    column=True 时，其余的短值拼接成一个样本，共用一个判断（method 为 'column'）；
+    无法用该编码解码的值单独检测。剩下的值在 jobs > 1 时按 BATCH_CHUNK 分块交给进程池检测。
+
+    Args:
+        items: Byte strings (bytes, bytearray or memoryview). None is passed through, and a str
+               is reported as ascii or utf_8 like detect() does.
+               字节串（bytes、bytearray 或 memoryview）。None 原样返回，str 与 detect() 一样报告为 ascii 或 utf_8。
+        chunk_size: Maximum bytes examined per value. (每个值最多检查的字节数)
+        column: The values come from one source (e.g. one column): pool short values and make
+                one encoding decision for them.
+                这些值来自同一来源（例如同一列）：把短值合在一起，只做一次编码判断。
+        jobs: Worker processes for the values left after the fast tiers (default: 1, in this process).
+              处理快速层之后剩余值的工作进程数（默认：1，在当前进程中）。
+        candidates, exclude, language: Candidate restrictions, see detect(). (候选编码限制，见 detect())
+
+    Returns:
+        One detect() result (or None) per item, in input order.
+        每个条目一个 detect() 结果（或 None），与输入顺序一致。
+    """
+    values, positions = _unique(items)
+    scope_options = dict(candidates=candidates, exclude=exclude, language=language)
+    results = _detect_unique(values, chunk_size, column, jobs, scope_options)
+    output = []
+    for position in positions:
+        if position is None:
+            output.append(None)
+        elif isinstance(position, str):
+            output.append(detect(position))
+        else:
+            # Callers may modify the dicts; duplicates must not share one
+            output.append(dict(results[position]))
+    return output
+
+
+def convert_many(
+    items: Iterable[Item],
+    target_encoding: str = "utf-8",
+    chunk_size: Optional[int] = 1024 * 50,
+    column: bool = False,
+    jobs: int = 1,
+    candidates: Optional[Union[str, Iterable[str]]] = None,
+    exclude: Optional[Iterable[str]] = None,
+    language: Optional[str] = None,
+) -> List[Optional[str]]:
+    """
+    Convert many byte strings to text, e.g. the values of a database column.
+    把大量字节串转换为文本，例如数据库某一列的值。
+
+    Detection works as in detect_many(); each distinct value is then decoded once, with the
+    same fallbacks as convert().
+    检测方式与 detect_many() 相同；随后每个不同的值只解码一次，回退方式与 convert() 相同。
+
+    Args:
+        items: Byte strings; None and str items are passed through. (字节串；None 和 str 原样返回)
+        target_encoding: See convert(). (参见 convert())
+        chunk_size, column, jobs, candidates, exclude, language: See detect_many(). (参见 detect_many())
+
+    Returns:
+        One string (or None) per item, in input order. (每个条目一个字符串（或 None），与输入顺序一致)
+    """
+    values, positions = _unique(items)
+    scope_options = dict(candidates=candidates, exclude=exclude, language=language)
+    detections = _detect_unique(values, chunk_size, column, jobs, scope_options)
+
+    started = instrument.clock()
+    texts = []
+    for value, detection in zip(values, detections):
+        encoding = detection["encoding"]
+        method = detection["method"]
+        if method == "column" or (method in ("ascii", "utf8-strict") and detection["bytes_examined"] == len(value)):
+            # Already known to decode strictly: checked by the column pass, or a fast tier saw every
+            # byte (a detect() answer from a head sample says nothing about the rest of the value)
+            try:
+                texts.append(value.decode(_decoding_codec(encoding, value)))
+                continue
+            except UnicodeDecodeError:
+                # One value the shortcut got wrong must not abort the whole column: convert() it
+                pass
+        texts.append(convert(value, target_encoding=target_encoding, chunk_size=chunk_size,
+                             detection=detection, **scope_options))
+    instrument.emit("batch.decode", sum(len(value) for value in values), started)
+    return [position if position is None or isinstance(position, str) else texts[position] for position in positions]
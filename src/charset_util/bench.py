@@ -0,0 +1,250 @@
+import json
+import platform
+import random
+import re
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+import charset_normalizer
+import ftfy
+
+from .encoding import detect, convert
+from .recovery import repair_mojibake, decode_unicode_escapes
+
+DEFAULT_SIZES = ("100B", "10KB", "1MB")
+DEFAULT_THRESHOLD = 0.2
+
+# Each corpus is generated once as a block of at most this size, then tiled
+_BLOCK_SIZE = 1024 * 1024
+
+_ASCII_WORDS = (
+    "the quick brown fox jumps over lazy dog data export report value customer order "
+    "invoice amount total status pending shipped id name comment date time user account"
+).split()
+_SIMPLIFIED = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处"
+_TRADITIONAL = "這是一個測試繁體中文的句子我們喜歡閱讀書籍與學習語言電腦網路資料庫時間國家經濟發展社會文化歷史地理科學技術醫療教育環境問題解決方法研究報告會議記錄"
+_JAPANESE = "日本語のテキストですこれはテストです私たちは東京に住んでいます今日は天気がいいですね会議の資料を確認してくださいありがとうございますアイウエオカキクケコサシスセソ"
+_WESTERN_WORDS = (
+    "café naïve résumé déjà vu façade garçon über straße crème brûlée fiancée piñata señor "
+    "müller françois zoë ångström cœur œuvre élève château"
+).split()
+
+
+def _text_words(rng: random.Random, corpus: str) -> Callable[[], str]:
+    """A function producing the next word or phrase for a text corpus."""
+    def cjk(alphabet: str) -> Callable[[], str]:
+        return lambda: "".join(rng.choice(alphabet) for _ in range(rng.randint(2, 12))) + rng.choice("，。\n")
+
+    if corpus == "ascii":
+        return lambda: rng.choice(_ASCII_WORDS) + rng.choice("  ,.\n")
+    if corpus in ("utf8-cjk", "gbk", "mojibake"):
+        return cjk(_SIMPLIFIED)
+    if corpus == "big5":
+        return cjk(_TRADITIONAL)
+    if corpus == "shift_jis":
+        return lambda: "".join(rng.choice(_JAPANESE) for _ in range(rng.randint(2, 12))) + rng.choice("、。\n")
+    if corpus == "cp1252":
+        return lambda: rng.choice(_WESTERN_WORDS + _ASCII_WORDS) + rng.choice("  ,.\n")
+    if corpus == "escapes-json":
+        return lambda: json.dumps({rng.choice(_ASCII_WORDS): "".join(rng.choice(_SIMPLIFIED) for _ in range(8))}) + "\n"
+    raise ValueError(f"Unknown corpus: {corpus!r}")
+
+
+# Corpus name -> how each generated piece is turned into the payload unit
+_CORPORA = {
+    "ascii": lambda piece: piece.encode("ascii"),
+    "utf8-cjk": lambda piece: piece.encode("utf-8"),
+    "gbk": lambda piece: piece.encode("gbk"),
+    "big5": lambda piece: piece.encode("big5"),
+    "shift_jis": lambda piece: piece.encode("shift_jis"),
+    "cp1252": lambda piece: piece.encode("cp1252"),
+    # Text corpora (str): UTF-8 read as Latin-1, and JSON dumped with ensure_ascii
+    "mojibake": lambda piece: piece.encode("utf-8").decode("latin-1"),
+    "escapes-json": lambda piece: piece,
+}
+CORPORA = tuple(_CORPORA)
+
+# Operation -> (function, corpora it runs on)
+OPERATIONS = {
+    "detect": (detect, ("ascii", "utf8-cjk", "gbk", "big5", "shift_jis", "cp1252")),
+    "convert": (convert, ("ascii", "utf8-cjk", "gbk", "big5", "shift_jis", "cp1252")),
+    "repair_mojibake": (repair_mojibake, ("mojibake",)),
+    "decode_unicode_escapes": (decode_unicode_escapes, ("escapes-json",)),
+}
+
+
+def parse_size(size: str) -> int:
+    """
+    Parse a size like '100B', '10KB', '1MB' or '1GB' (binary units).
+    解析 '100B'、'10KB'、'1MB' 或 '1GB' 这样的大小（二进制单位）。
+    """
+    match = re.fullmatch(r"\s*(\d+)\s*([KMG]?)B?\s*", size.upper())
+    if not match:
+        raise ValueError(f"Invalid size: {size!r}")
+    return int(match.group(1)) * 1024 ** " KMG".index(match.group(2) or " ")
+
+
+def generate_corpus(corpus: str, size: int, seed: int = 0) -> Union[bytes, str]:
+    """
+    Generate a reproducible synthetic payload of exactly `size` bytes (or characters for text corpora).
+    生成可复现的合成数据，大小恰好为 size 字节（文本类语料为字符数）。
+
+    Args:
+        corpus: One of CORPORA. (CORPORA 之一)
+        size: Payload size. (数据大小)
+        seed: Random seed; the same seed always gives the same payload. (随机种子；相同的种子总是生成相同的数据)
+
+    Returns:
+        bytes for encoded corpora, str for 'mojibake' and 'escapes-json'.
+        编码类语料返回 bytes，'mojibake' 和 'escapes-json' 返回 str。
+    """
+    encode = _CORPORA[corpus]
+    next_piece = _text_words(random.Random(f"{corpus}:{seed}"), corpus)
+    empty = encode("")
+    pad = encode(" ")
+
+    block_target = min(size, _BLOCK_SIZE)
+    pieces = []
+    length = 0
+    while True:
+        piece = encode(next_piece())
+        if length + len(piece) > block_target:
+            break
+        pieces.append(piece)
+        length += len(piece)
+    block = empty.join(pieces)
+
+    # Tile the block for large sizes, then pad with spaces to the exact size
+    if not block:
+        return pad * size
+    repeats = size // len(block)
+    payload = block * repeats
+    return payload + pad * (size - len(payload))
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(func: Callable, payload: Union[bytes, str], min_time: float = 0.2, max_iterations: int = 1000) -> dict:
+    """
+    Time func(payload) repeatedly and measure its peak Python memory.
+    重复计时 func(payload)，并测量其 Python 内存峰值。
+
+    Calls repeat until min_time has elapsed (at least 3 calls, at most max_iterations).
+    Peak memory is taken from one extra call under tracemalloc, so tracing does not skew the timings.
+    调用会重复进行直到累计达到 min_time（至少 3 次，至多 max_iterations 次）。
+    内存峰值来自 tracemalloc 下额外的一次调用，因此追踪不会影响计时。
+    """
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < max_iterations and (len(latencies) < 3 or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter()
+        func(payload)
+        latencies.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    try:
+        func(payload)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    median = statistics.median(latencies)
+    return {
+        "iterations": len(latencies),
+        "mb_per_s": round(len(payload) / median / 1e6, 3) if median else None,
+        "p50_ms": round(median * 1000, 4),
+        "p90_ms": round(_percentile(latencies, 0.9) * 1000, 4),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 4),
+        "peak_bytes": peak,
+    }
+
+
+def run_benchmarks(
+    sizes: Iterable[str] = DEFAULT_SIZES,
+    operations: Optional[Iterable[str]] = None,
+    corpora: Optional[Iterable[str]] = None,
+    seed: int = 0,
+    min_time: float = 0.2,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Run the benchmark suite offline on generated corpora.
+    在生成的语料上离线运行基准测试套件。
+
+    Args:
+        sizes: Payload sizes, e.g. ('100B', '10KB', '1MB', '1GB'). (数据大小)
+        operations: Subset of OPERATIONS to run (default: all). (要运行的操作子集，默认全部)
+        corpora: Subset of CORPORA to run on (default: all). (要使用的语料子集，默认全部)
+        seed: Corpus seed. (语料随机种子)
+        min_time: Minimum timing duration per case, in seconds. (每个用例的最短计时，秒)
+        progress: Called with each result as it completes. (每个结果完成时调用)
+
+    Returns:
+        {'meta': {...versions...}, 'results': [{'name': 'op/corpus/size', ...measure()...}, ...]}
+    """
+    operations = list(operations or OPERATIONS)
+    wanted_corpora = set(corpora or CORPORA)
+    unknown = [name for name in operations if name not in OPERATIONS] + sorted(wanted_corpora - set(CORPORA))
+    if unknown:
+        raise ValueError(f"Unknown operation or corpus: {', '.join(unknown)}")
+
+    results = []
+    for op in operations:
+        func, op_corpora = OPERATIONS[op]
+        for corpus in op_corpora:
+            if corpus not in wanted_corpora:
+                continue
+            for size in sizes:
+                payload = generate_corpus(corpus, parse_size(size), seed=seed)
+                result = {"name": f"{op}/{corpus}/{size}", "operation": op, "corpus": corpus, "size": len(payload)}
+                result.update(measure(func, payload, min_time=min_time))
+                results.append(result)
+                if progress:
+                    progress(result)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "charset_normalizer": charset_normalizer.__version__,
+            "ftfy": ftfy.__version__,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> List[dict]:
+    """
+    List the cases whose throughput regressed by more than threshold against a saved baseline.
+    列出吞吐量相对已保存基线下降超过 threshold 的用例。
+
+    Args:
+        results: Output of run_benchmarks(). (run_benchmarks() 的输出)
+        baseline: An earlier output of run_benchmarks(). (之前 run_benchmarks() 的输出)
+        threshold: Allowed slowdown, e.g. 0.2 for 20%. (允许的变慢比例，例如 0.2 表示 20%)
+
+    Returns:
+        One entry per regression with 'name', 'baseline_mb_per_s', 'mb_per_s' and 'change'.
+        每个退化一条记录，包含 'name'、'baseline_mb_per_s'、'mb_per_s' 和 'change'。
+    """
+    previous: Dict[str, dict] = {r["name"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results["results"]:
+        before = previous.get(result["name"])
+        if not before or not before.get("mb_per_s") or not result.get("mb_per_s"):
+            continue
+        change = result["mb_per_s"] / before["mb_per_s"] - 1.0
+        if change < -threshold:
+            regressions.append({
+                "name": result["name"],
+                "baseline_mb_per_s": before["mb_per_s"],
+                "mb_per_s": result["mb_per_s"],
+                "change": round(change, 4),
+            })
+    return regressions
@@ -0,0 +1,173 @@
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+# Bump to invalidate every cached result after a change to the detection logic
+CACHE_FORMAT = 1
+
+
+def detector_version() -> str:
+    """The version string cached results are tied to. (缓存结果所绑定的版本字符串)"""
+    import charset_normalizer
+    return f"{CACHE_FORMAT}:charset_normalizer-{charset_normalizer.__version__}"
+
+
+def content_key(policy: tuple, *regions: bytes) -> str:
+    """
+    Build a cache key from the sampling policy and a digest of the sampled regions.
+    根据采样策略和采样区域的摘要构建缓存键。
+    """
+    digest = hashlib.blake2b(repr((detector_version(), policy)).encode("utf-8"), digest_size=16)
+    for region in regions:
+        digest.update(len(region).to_bytes(8, "little"))
+        digest.update(region)
+    return "c:" + digest.hexdigest()
+
+
+def file_key(policy: tuple, path: str, size: int, mtime_ns: int) -> str:
+    """
+    Build a cache key for a file from its path, size and modification time.
+    根据文件路径、大小和修改时间构建缓存键。
+    """
+    identity = repr((detector_version(), policy, path, size, mtime_ns)).encode("utf-8")
+    return "f:" + hashlib.blake2b(identity, digest_size=16).hexdigest()
+
+
+class DetectionCache:
+    """
+    Bounded in-memory LRU cache of detect() results.
+    有容量上限的内存 LRU 缓存，保存 detect() 的结果。
+
+    Use Case (场景):
+    - The same payloads are detected again and again (e.g. one attachment arriving many times).
+    - 同样的内容被反复检测（例如同一个附件多次到达）。
+
+    Pass it as detect(content, cache=...). Keys include the detector version and the
+    sampling policy, so results never leak across policies.
+    通过 detect(content, cache=...) 使用。缓存键包含检测器版本和采样策略，不同策略之间的结果不会混用。
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+        if result is None:
+            result = self._load(key)
+            if result is not None:
+                self._remember(key, result)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        # Callers may modify the dict they get back
+        return copy.deepcopy(result)
+
+    def set(self, key: str, result: dict) -> None:
+        result = copy.deepcopy(result)
+        self._remember(key, result)
+        self._store(key, result)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters. (命中/未命中计数)"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+    def _remember(self, key: str, result: dict) -> None:
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    # Persistent backends override these two
+    def _load(self, key: str) -> Optional[dict]:
+        return None
+
+    def _store(self, key: str, result: dict) -> None:
+        pass
+
+
+class SQLiteCache(DetectionCache):
+    """
+    DetectionCache backed by a SQLite file, so results survive between runs.
+    以 SQLite 文件为后端的 DetectionCache，结果可以跨运行保留。
+
+    Use Case (场景):
+    - Nightly rescans of mostly unchanged corpora (charset-util detect/scan --cache PATH).
+    - 每晚重新扫描基本不变的语料（charset-util detect/scan --cache PATH）。
+
+    The file remembers the detector version it was written with and is emptied when
+    that changes (e.g. after upgrading charset-normalizer).
+    文件会记录写入时的检测器版本，版本变化时（例如升级 charset-normalizer 后）会被清空。
+    """
+
+    def __init__(self, path: str, maxsize: int = 4096):
+        import sqlite3
+
+        super().__init__(maxsize=maxsize)
+        self.path = path
+        # Several scan workers may share one file: wait for locks instead of failing
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db_lock = threading.Lock()
+        with self._db_lock, self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS detections (key TEXT PRIMARY KEY, result TEXT)")
+            row = self._db.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+            if row is None or row[0] != detector_version():
+                self._db.execute("DELETE FROM detections")
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (detector_version(),))
+
+    def close(self) -> None:
+        with self._db_lock:
+            self._db.close()
+
+    def __enter__(self) -> "SQLiteCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM detections").fetchone()[0]
+
+    def clear(self) -> None:
+        super().clear()
+        with self._db_lock, self._db:
+            self._db.execute("DELETE FROM detections")
+
+    def _load(self, key: str) -> Optional[dict]:
+        with self._db_lock:
+            row = self._db.execute("SELECT result FROM detections WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _store(self, key: str, result: dict) -> None:
+        import sqlite3
+
+        try:
+            with self._db_lock, self._db:
+                self._db.execute("INSERT OR REPLACE INTO detections VALUES (?, ?)", (key, json.dumps(result)))
+        except sqlite3.OperationalError:
+            # A busy database only costs us a future miss
+            pass
@@ -1,9 +1,13 @@
 import argparse
+import codecs
+import os
 import sys
 import json
 import logging
-from .encoding import detect, convert
-from .recovery import repair_mojibake, decode_unicode_escapes
+from .cache import SQLiteCache
+from .encoding import PROFILE_ENV, PROFILES, convert, detect_file, transcode_file
+from .recovery import repair_mojibake_report, decode_unicode_escapes
+from . import instrument
 
 def setup_logging(verbose: bool):
     level = logging.DEBUG if verbose else logging.WARNING
@@ -20,29 +24,72 @@ def main():
     
     # Global arguments
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose debug logging")
+    parser.add_argument("--profile", choices=list(PROFILES), default=os.environ.get(PROFILE_ENV),
+                        help=f"Candidate encodings for detection (default: ${PROFILE_ENV}, else all)")
+    parser.add_argument("--stats", action="store_true", help="Print per-stage timings and fallback counters to stderr when done")
     
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     # Command: detect
     detect_parser = subparsers.add_parser("detect", help="Detect encoding of a file")
     detect_parser.add_argument("file", help="Path to the file")
+    detect_parser.add_argument("--cache", metavar="PATH", help="Persistent detection cache (SQLite file)")
 
     # Command: convert
     convert_parser = subparsers.add_parser("convert", help="Convert file encoding")
     convert_parser.add_argument("file", help="Path to the source file")
     convert_parser.add_argument("-t", "--target", default="utf-8", help="Target encoding (default: utf-8)")
     convert_parser.add_argument("-o", "--output", help="Path to output file (default: stdout)")
+    convert_parser.add_argument("--mixed", action="store_true", help="The file mixes encodings (e.g. concatenated logs): decode each run with its own codec")
+    convert_parser.add_argument("--follow", action="store_true", help="Keep converting bytes appended to the file (live logs); follows rotation and truncation")
+    convert_parser.add_argument("--state", metavar="PATH", help="With --follow: checkpoint file to resume from after a restart")
+    convert_parser.add_argument("--poll", type=float, default=1.0, help="With --follow: seconds between polls (default: %(default)s)")
 
     # Command: repair
     repair_parser = subparsers.add_parser("repair", help="Repair mojibake (乱码)")
     repair_parser.add_argument("file", help="Path to the file containing mojibake")
     repair_parser.add_argument("-o", "--output", help="Path to output file (default: stdout)")
+    repair_parser.add_argument("-j", "--jobs", type=int, default=1, help="Worker processes for large files (default: 1)")
 
     # Command: decode-escapes
     decode_parser = subparsers.add_parser("decode-escapes", help="Decode unicode escapes (e.g. \\u4f60) in text")
     decode_parser.add_argument("file", help="Path to the file containing unicode escapes")
     decode_parser.add_argument("-o", "--output", help="Path to output file (default: stdout)")
 
+    # Command: pipeline
+    pipeline_parser = subparsers.add_parser("pipeline", help="Decode and run text steps over a file in one streaming pass")
+    pipeline_parser.add_argument("file", help="Path to the source file")
+    pipeline_parser.add_argument("--steps", default="convert,repair,unescape", help="Comma-separated steps: convert, repair, unescape (default: %(default)s)")
+    pipeline_parser.add_argument("-t", "--target", default="utf-8", help="Target encoding (default: utf-8)")
+    pipeline_parser.add_argument("-o", "--output", help="Path to output file (default: stdout)")
+
+    # Command: scan
+    scan_parser = subparsers.add_parser("scan", help="Detect (and optionally convert) many files in parallel, one JSON line per file")
+    scan_parser.add_argument("target", help="Directory, glob pattern (quote it) or @filelist")
+    scan_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Worker processes (default: CPU count)")
+    scan_parser.add_argument("--strategy", choices=["head", "progressive", "stratified"], default="head", help="Detection sampling strategy (default: head)")
+    scan_parser.add_argument("--convert-to", help="Also convert every file to this encoding")
+    scan_parser.add_argument("-o", "--output-dir", help="Mirror directory for converted files (required with --convert-to)")
+    scan_parser.add_argument("--cache", metavar="PATH", help="Persistent detection cache (SQLite file) shared by all workers")
+
+    # Command: serve
+    serve_parser = subparsers.add_parser("serve", help="Answer JSON-lines requests (detect/convert/repair/decode-escapes) from a warm process")
+    serve_parser.add_argument("--socket", metavar="PATH", help="Listen on this Unix domain socket (default: stdin/stdout)")
+    serve_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Worker threads; they overlap I/O, not CPU work (default: CPU count)")
+    serve_parser.add_argument("--timeout", type=float, help="Default per-request timeout in seconds")
+    serve_parser.add_argument("--cache", metavar="PATH", help="Persistent detection cache (SQLite file); default is in memory")
+
+    # Command: bench
+    bench_parser = subparsers.add_parser("bench", help="Run the offline benchmark suite and check for regressions")
+    bench_parser.add_argument("--sizes", default="100B,10KB,1MB", help="Comma-separated payload sizes, e.g. 100B,10KB,1MB,1GB (default: %(default)s)")
+    bench_parser.add_argument("--ops", help="Comma-separated operations: detect, convert, repair_mojibake, decode_unicode_escapes (default: all)")
+    bench_parser.add_argument("--corpora", help="Comma-separated corpora: ascii, utf8-cjk, gbk, big5, shift_jis, cp1252, mojibake, escapes-json (default: all)")
+    bench_parser.add_argument("--seed", type=int, default=0, help="Corpus seed (default: 0)")
+    bench_parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds timed per case (default: 0.2)")
+    bench_parser.add_argument("-o", "--output", help="Write the JSON results here (default: stdout); can be used as a later --baseline")
+    bench_parser.add_argument("--baseline", help="Saved JSON results to compare against")
+    bench_parser.add_argument("--threshold", type=float, default=0.2, help="Allowed throughput drop against the baseline (default: %(default)s)")
+
     args = parser.parse_args()
 
     if not args.command:
@@ -50,24 +97,65 @@ def main():
         sys.exit(1)
 
     setup_logging(args.verbose)
+    if args.profile:
+        # Detection reads the profile from the environment, so scan workers inherit it too
+        os.environ[PROFILE_ENV] = args.profile
+    if args.stats:
+        instrument.stats.enable()
 
     try:
         if args.command == "detect":
-            with open(args.file, "rb") as f:
-                content = f.read()
-            result = detect(content)
+            # The file is memory-mapped: only the sampled pages are read
+            if args.cache:
+                with SQLiteCache(args.cache) as cache:
+                    result = detect_file(args.file, cache=cache)
+            else:
+                result = detect_file(args.file)
             print(json.dumps(result, indent=2, ensure_ascii=False))
 
         elif args.command == "convert":
-            with open(args.file, "rb") as f:
-                content = f.read()
-            result = convert(content, target_encoding=args.target)
-            if args.output:
-                with open(args.output, "w", encoding=args.target) as f:
-                    f.write(result)
+            # Transcode block by block from a memory map straight to bytes: no whole-file string,
+            # no round trip through the stdout text encoding, and no re-encoding if already in the target
+            if args.follow:
+                from .tail import tail_convert
+
+                if args.mixed:
+                    parser.error("--follow cannot be combined with --mixed")
+                # Resuming from a checkpoint continues the output instead of starting it over
+                resuming = bool(args.state) and os.path.exists(args.state)
+                out = open(args.output, "ab" if resuming else "wb") if args.output else sys.stdout.buffer
+                sys.stdout.flush()
+                encoder = codecs.getincrementalencoder(args.target)(errors="replace")
+                try:
+                    for text in tail_convert(args.file, state_path=args.state, poll_interval=args.poll):
+                        out.write(encoder.encode(text))
+                        out.flush()
+                except KeyboardInterrupt:
+                    pass
+                finally:
+                    # Stateful targets (e.g. UTF-16, ISO-2022) may still hold bytes to end the output
+                    out.write(encoder.encode("", final=True))
+                    if args.output:
+                        out.close()
+                    else:
+                        out.flush()
+            elif args.mixed:
+                from .mixed import transcode_mixed_file
+
+                sys.stdout.flush()
+                runs = transcode_mixed_file(args.file, args.output or sys.stdout.buffer, target_encoding=args.target)
+                logging.getLogger(__name__).info("Encoding runs: %s", runs)
+                if args.output:
+                    print(f"Converted content written to {args.output}")
+                else:
+                    sys.stdout.buffer.flush()
+            elif args.output:
+                transcode_file(args.file, args.output, target_encoding=args.target)
                 print(f"Converted content written to {args.output}")
             else:
-                print(result)
+                sys.stdout.flush()
+                transcode_file(args.file, sys.stdout.buffer, target_encoding=args.target)
+                sys.stdout.buffer.flush()
 
         elif args.command == "repair":
             # Assuming file is readable as text, or we detect it first
@@ -75,7 +163,8 @@ def main():
                 content_bytes = f.read()
             # First ensure we have a string
             content_str = convert(content_bytes)
-            result = repair_mojibake(content_str)
+            result, report = repair_mojibake_report(content_str, workers=args.jobs)
+            logging.getLogger(__name__).info("Repair report: %s", report)
             if args.output:
                 with open(args.output, "w", encoding="utf-8") as f:
                     f.write(result)
@@ -95,9 +184,92 @@ def main():
             else:
                 print(result)
 
+        elif args.command == "pipeline":
+            from .pipeline import Pipeline
+
+            pipeline = Pipeline(steps=[step.strip() for step in args.steps.split(",") if step.strip()], target_encoding=args.target)
+            out = open(args.output, "wb") if args.output else sys.stdout.buffer
+            sys.stdout.flush()
+            try:
+                with open(args.file, "rb") as src:
+                    pipeline.run(src, out)
+            finally:
+                if args.output:
+                    out.close()
+                else:
+                    out.flush()
+            logging.getLogger(__name__).info("Stage timings: %s", pipeline.timings())
+            if args.output:
+                print(f"Processed content written to {args.output}")
+
+        elif args.command == "scan":
+            # Imported here: the process pool machinery is only needed by this subcommand
+            from .scan import iter_paths, scan
+
+            if args.convert_to and not args.output_dir:
+                parser.error("--output-dir is required with --convert-to")
+            root = args.target if os.path.isdir(args.target) else None
+            records = scan(
+                iter_paths(args.target),
+                jobs=args.jobs,
+                convert_to=args.convert_to,
+                output_dir=args.output_dir,
+                root=root,
+                strategy=args.strategy,
+                cache_path=args.cache,
+            )
+            for record in records:
+                print(json.dumps(record, ensure_ascii=False), flush=True)
+
+        elif args.command == "serve":
+            from .serve import serve
+
+            cache = SQLiteCache(args.cache) if args.cache else None
+            try:
+                serve(socket_path=args.socket, jobs=args.jobs, timeout=args.timeout, cache=cache)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                if cache is not None:
+                    cache.close()
+
+        elif args.command == "bench":
+            from . import bench
+
+            def progress(result):
+                print(f"{result['name']:<45} {result['mb_per_s']:>10} MB/s  p50 {result['p50_ms']} ms  "
+                      f"p99 {result['p99_ms']} ms  peak {result['peak_bytes']} B", file=sys.stderr, flush=True)
+
+            results = bench.run_benchmarks(
+                sizes=args.sizes.split(","),
+                operations=args.ops.split(",") if args.ops else None,
+                corpora=args.corpora.split(",") if args.corpora else None,
+                seed=args.seed,
+                min_time=args.min_time,
+                progress=progress,
+            )
+            regressions = []
+            if args.baseline:
+                with open(args.baseline, "r", encoding="utf-8") as f:
+                    regressions = bench.compare(results, json.load(f), threshold=args.threshold)
+                results["regressions"] = regressions
+            if args.output:
+                with open(args.output, "w", encoding="utf-8") as f:
+                    json.dump(results, f, indent=2)
+            else:
+                print(json.dumps(results, indent=2))
+            for regression in regressions:
+                print(f"Regression: {regression['name']} {regression['baseline_mb_per_s']} -> "
+                      f"{regression['mb_per_s']} MB/s ({regression['change']:+.1%})", file=sys.stderr)
+            if regressions:
+                sys.exit(1)
+
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        if args.stats:
+            print(json.dumps(instrument.stats.snapshot(), indent=2), file=sys.stderr)
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,422 @@
-from typing import Optional, Union
-import charset_normalizer
+import codecs
+import io
+import mmap
+import os
+import re
+import stat
+import threading
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
 
-def detect(content: Union[bytes, str], chunk_size: Optional[int] = 1024 * 50) -> dict:
+from . import instrument
+from .cache import DetectionCache, content_key, file_key
+
+# Bytes read per step when streaming (1MB keeps peak memory flat on multi-GB files)
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# Progressive detection scans 4KB, then 16KB, 64KB, ... up to chunk_size
+PROGRESSIVE_START = 1024 * 4
+PROGRESSIVE_GROWTH = 4
+
+# Stratified detection spreads the chunk_size budget over windows from head, middle and tail
+STRATIFIED_WINDOWS = 5
+
+# How far a window edge may move to reach a safe byte boundary
+ALIGN_LOOKAROUND = 64
+
+_NON_ASCII_BYTE = re.compile(rb"[\x80-\xff]")
+_NON_ASCII_RUN = re.compile(rb"[\x80-\xff]+")
+
+# Bytes below 0x40 are never trail bytes in GBK, Big5, Shift-JIS, EUC-* or UTF-8,
+# so a cut right after one never splits a character
+_SAFE_BYTE = re.compile(rb"[\x00-\x3f]")
+
+# Candidate encodings for typical deployments; "all" lets charset_normalizer try every code page
+PROFILES = {
+    "all": None,
+    "cjk": ("utf_8", "gb18030", "big5", "shift_jis", "euc_jp", "euc_kr"),
+    "western": ("utf_8", "cp1252", "iso8859_15"),
+}
+
+# Profile used when no candidates are given (e.g. CHARSET_UTIL_PROFILE=cjk)
+PROFILE_ENV = "CHARSET_UTIL_PROFILE"
+
+# Encodings a language hint narrows detection to; UTF-8 can carry any language
+LANGUAGE_CANDIDATES = {
+    "zh": ("utf_8", "gb18030", "big5"),
+    "zh-cn": ("utf_8", "gb18030"),
+    "zh-tw": ("utf_8", "big5"),
+    "ja": ("utf_8", "shift_jis", "euc_jp", "iso2022_jp"),
+    "ko": ("utf_8", "euc_kr", "cp949"),
+    "en": ("utf_8", "cp1252"),
+    "de": ("utf_8", "cp1252", "iso8859_15"),
+    "fr": ("utf_8", "cp1252", "iso8859_15"),
+    "es": ("utf_8", "cp1252", "iso8859_15"),
+    "ru": ("utf_8", "cp1251", "koi8_r"),
+}
+
+# Byte order marks, longest first (the UTF-32-LE BOM starts with the UTF-16-LE BOM).
+# The codecs named here consume the BOM while decoding.
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf_32"),
+    (codecs.BOM_UTF32_BE, "utf_32"),
+    (codecs.BOM_UTF8, "utf_8_sig"),
+    (codecs.BOM_UTF16_LE, "utf_16"),
+    (codecs.BOM_UTF16_BE, "utf_16"),
+)
+
+
+def _result(encoding: Optional[str], confidence: float, language: Optional[str], method: str) -> dict:
+    return {
+        "encoding": encoding,
+        "confidence": confidence,
+        "language": language,
+        "method": method,
+    }
+
+
+def _canonical(encoding: str) -> str:
+    try:
+        return codecs.lookup(encoding).name
+    except LookupError:
+        raise ValueError(f"Unknown encoding: {encoding!r}") from None
+
+
+def _scope(
+    candidates: Optional[Union[str, Iterable[str]]],
+    exclude: Optional[Iterable[str]],
+    language: Optional[str],
+) -> Optional[Tuple[Optional[Tuple[str, ...]], Tuple[str, ...]]]:
+    """
+    Resolve the candidate restrictions to (candidates or None, excluded), or None for no restriction.
+    把候选编码限制解析为 (候选编码或 None, 排除的编码)；没有限制时返回 None。
+    """
+    if candidates is None:
+        candidates = os.environ.get(PROFILE_ENV) or "all"
+    if isinstance(candidates, str):
+        if candidates not in PROFILES:
+            raise ValueError(f"Unknown profile: {candidates!r} (expected one of {', '.join(PROFILES)})")
+        candidates = PROFILES[candidates]
+    if language is not None:
+        hinted = LANGUAGE_CANDIDATES.get(language.lower()) or LANGUAGE_CANDIDATES.get(language.lower().split("-")[0])
+        if hinted is None:
+            raise ValueError(f"Unknown language hint: {language!r}")
+        candidates = hinted if candidates is None else [c for c in candidates if _canonical(c) in {_canonical(h) for h in hinted}]
+    if candidates is None and not exclude:
+        return None
+    # Candidates keep their order: it is the preference when charset_normalizer gives no answer
+    return (
+        None if candidates is None else tuple(dict.fromkeys(_canonical(c) for c in candidates)),
+        tuple(sorted({_canonical(e) for e in exclude or ()})),
+    )
+
+
+def _allowed(encoding: str, scope) -> bool:
+    """Whether scope (see _scope()) lets detection answer encoding. (scope 是否允许检测给出该编码)"""
+    if scope is None:
+        return True
+    candidates, excluded = scope
+    name = codecs.lookup(encoding).name
+    if name == "utf-8-sig":
+        name = "utf-8"
+    return (candidates is None or name in candidates) and name not in excluded
+
+
+def _fast_detect(sample: bytes, scope=None, truncated: bool = False) -> Optional[dict]:
+    """
+    Cheap tiers tried before charset_normalizer: BOM, pure ASCII, strict UTF-8.
+    在 charset_normalizer 之前尝试的廉价检测：BOM、纯 ASCII、严格 UTF-8。
+
+    Each check runs at C speed over the sample. Returns None when the statistical
+    detector is needed. BOM and UTF-8 answers are skipped when scope rules them out;
+    ASCII is compatible with every candidate and always answers. Only a truncated sample
+    (one that stops before the end of the content) may end in a cut UTF-8 sequence.
+    每项检查都以 C 的速度扫描样本。需要统计检测时返回 None。
+    scope 排除了 BOM 或 UTF-8 时跳过相应的判断；ASCII 与所有候选编码兼容，总是可以给出结果。
+    只有被截断的样本（在内容结束之前停止）才允许以被切开的 UTF-8 序列结尾。
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            if not _allowed(encoding, scope):
+                break
+            return _result(encoding, 1.0, "Unknown", "bom")
+    # NUL bytes are a sign of BOM-less UTF-16/32: leave those to charset_normalizer
+    if b"\x00" in sample:
+        return None
+    if sample.isascii():
+        return _result("ascii", 1.0, "English", "ascii")
+    if _allowed("utf_8", scope) and _can_decode_prefix(sample, "utf_8", final=not truncated):
+        return _result("utf_8", 1.0, "Unknown", "utf8-strict")
+    return None
+
+
+def _statistical_detect(sample: bytes, scope=None, truncated: bool = False) -> Tuple[dict, float]:
+    """
+    Run charset_normalizer over the sample.
+    用 charset_normalizer 分析样本。
+
+    Returns the result and the best candidate's lead over the runner-up: its coherence
+    gain plus its chaos (mess) reduction. A lone candidate has an infinite lead.
+    返回结果以及最佳候选相对第二名的领先幅度：一致性（coherence）之差加上混乱度（chaos）之差。
+    只有一个候选时领先幅度为无穷大。
+
+    scope (see _scope()) is passed on as charset_normalizer's cp_isolation / cp_exclusion.
+    scope（见 _scope()）作为 charset_normalizer 的 cp_isolation / cp_exclusion 传入。
+    If that finds nothing, the first candidate that decodes the sample answers (method 'candidate');
+    as in _fast_detect(), only a truncated sample may end in a cut character.
+    如果这样找不到结果，则由第一个能解码样本的候选编码给出结果（method 为 'candidate'）；
+    与 _fast_detect() 一样，只有被截断的样本才允许以被切开的字符结尾。
+    """
+    # Imported here: charset_normalizer is slow to load and the fast tiers rarely need it
+    import charset_normalizer
+
+    started = instrument.clock()
+    isolation, exclusion = scope or (None, ())
+    matches = list(charset_normalizer.from_bytes(
+        sample,
+        cp_isolation=list(isolation) if isolation else None,
+        cp_exclusion=list(exclusion) if exclusion else None,
+    ))
+    instrument.emit("detect.statistical", len(sample), started)
+    if not matches:
+        # charset_normalizer rejects short samples outright; with a declared candidate list,
+        # the first candidate that decodes the sample is a better answer than none
+        for candidate in isolation or ():
+            if _allowed(candidate, scope) and _can_decode_prefix(sample, candidate, final=not truncated):
+                return _result(candidate, 0.0, None, "candidate"), 0.0
+        return _result(None, 0.0, None, "statistical"), 0.0
+
+    best = matches[0]
+    lead = float("inf")
+    if len(matches) > 1:
+        runner_up = matches[1]
+        lead = (best.coherence - runner_up.coherence) + (runner_up.chaos - best.chaos)
+
+    # result.fingerprint is a SHA256 hash string in newer versions of charset-normalizer, not a float confidence!
+    # result.coherence is what we might want for confidence-like metric if available, but it's not always exposed same way.
+    # For now, let's just return 1.0 if we found a match, or use coherence if present.
+    return _result(best.encoding, getattr(best, 'coherence', 1.0), best.language, "statistical"), lead
+
+
+def _detect_window(window: bytes, fast_path: bool, scope=None, truncated: bool = False) -> Tuple[dict, float]:
+    """
+    Detect a single window: fast tiers first, then charset_normalizer.
+    检测单个窗口：先走快速层，再用 charset_normalizer。
+
+    A leading all-ASCII region (e.g. a CSV header) is skipped before statistical
+    detection, so that charset_normalizer samples the bytes that actually matter.
+    开头的纯 ASCII 区域（例如 CSV 表头）在统计检测前会被跳过，
+    让 charset_normalizer 采样真正重要的字节。
+    """
+    if fast_path:
+        started = instrument.clock()
+        result = _fast_detect(window, scope, truncated)
+        instrument.emit("detect.fast", len(window), started)
+        if result is not None:
+            return result, float("inf")
+    first = _NON_ASCII_BYTE.search(window)
+    start = window.rfind(b"\n", 0, first.start()) + 1 if first else 0
+    return _statistical_detect(window[start:] if start else window, scope, truncated)
+
+
+def _align_window(window: bytes, trim_start: bool, trim_end: bool) -> Tuple[int, bytes]:
+    """
+    Move the edges of a window cut out of the middle of the content to safe byte boundaries.
+    把从内容中间截取的窗口边界移动到安全的字节边界上。
+
+    Each edge moves to just after the nearest byte below 0x40 (at most ALIGN_LOOKAROUND
+    bytes away). Failing that, UTF-8 continuation bytes are dropped from the start.
+    每个边界移动到最近的小于 0x40 的字节之后（最多移动 ALIGN_LOOKAROUND 个字节）。
+    找不到时，从开头丢弃 UTF-8 的后续字节。
+
+    Returns how many bytes were dropped from the start, and the aligned window.
+    返回从开头丢弃的字节数，以及对齐后的窗口。
+    """
+    start, end = 0, len(window)
+    if trim_start:
+        match = _SAFE_BYTE.search(window, 0, ALIGN_LOOKAROUND)
+        if match:
+            start = match.end()
+        else:
+            while start < min(3, end) and 0x80 <= window[start] < 0xC0:
+                start += 1
+    if trim_end:
+        for i in range(end - 1, max(start, end - ALIGN_LOOKAROUND) - 1, -1):
+            if window[i] < 0x40:
+                end = i + 1
+                break
+    if start == 0 and end == len(window):
+        return 0, window
+    return start, window[start:end]
+
+
+def _progressive_detect(
+    read_at: Callable[[int, int], bytes],
+    limit: int,
+    fast_path: bool,
+    margin: float,
+    scope=None,
+    truncated: bool = False,
+) -> Tuple[dict, int]:
+    """
+    Scan growing head windows until the answer is clear or the limit is reached.
+    逐步扩大开头窗口进行扫描，直到结果明确或达到上限。
+
+    All-ASCII windows and ambiguous statistical results (lead below margin) keep growing.
+    truncated says whether the content goes on past limit.
+    纯 ASCII 窗口和不明确的统计结果（领先幅度低于 margin）会继续扩大窗口。
+    truncated 表示内容是否超出 limit。
+    """
+    size = min(PROGRESSIVE_START, limit)
+    while True:
+        window = read_at(0, size)
+        if size < limit:
+            _, window = _align_window(window, False, True)
+        result, lead = _detect_window(window, fast_path, scope, truncated or size < limit)
+        # ASCII so far says nothing about the bytes after the window
+        if (result["encoding"] != "ascii" and lead >= margin) or size >= limit:
+            return result, size
+        size = min(size * PROGRESSIVE_GROWTH, limit)
+
+
+def _stratified_layout(size: int, budget: int, count: int) -> Tuple[int, List[int]]:
+    """Window size and offsets for stratified sampling. (分层采样的窗口大小和偏移量)"""
+    window_size = max(budget // count, 1)
+    if size <= window_size * count:
+        return size, [0]
+    return window_size, [(size - window_size) * i // (count - 1) for i in range(count)]
+
+
+def _stratified_detect(
+    read_at: Callable[[int, int], bytes],
+    size: int,
+    budget: int,
+    count: int,
+    fast_path: bool,
+    scope=None,
+) -> Tuple[dict, int]:
+    """
+    Detect windows taken from the head, middle and tail, then combine them by weighted vote.
+    分别检测取自开头、中间和结尾的窗口，再通过加权投票合并结果。
+
+    ASCII windows abstain, since ASCII is compatible with every candidate. The others
+    vote with their size weighted by confidence. The result lists every window and
+    the share of the vote that disagreed with the winner.
+    纯 ASCII 窗口弃权，因为 ASCII 与所有候选编码都兼容。其余窗口按大小乘以置信度加权投票。
+    结果会列出每个窗口，以及与胜出编码不一致的票数占比。
+    """
+    window_size, offsets = _stratified_layout(size, budget, count)
+
+    windows = []
+    votes = {}
+    best_by_encoding = {}
+    examined = 0
+    for offset in offsets:
+        skipped, window = _align_window(read_at(offset, window_size), offset > 0, offset + window_size < size)
+        examined += len(window)
+        result, _ = _detect_window(window, fast_path, scope, offset + window_size < size)
+        windows.append({
+            "offset": offset + skipped,
+            "size": len(window),
+            "encoding": result["encoding"],
+            "confidence": result["confidence"],
+            "method": result["method"],
+        })
+        # A BOM at the start of the content settles it for the whole content
+        if result["method"] == "bom":
+            result["windows"] = windows
+            result["disagreement"] = 0.0
+            return result, examined
+
+        encoding = result["encoding"]
+        if encoding is None or encoding == "ascii":
+            continue
+        votes[encoding] = votes.get(encoding, 0.0) + len(window) * (1.0 + result["confidence"])
+        if encoding not in best_by_encoding or result["confidence"] > best_by_encoding[encoding]["confidence"]:
+            best_by_encoding[encoding] = result
+
+    if votes:
+        winner = max(votes, key=votes.get)
+        result = dict(best_by_encoding[winner])
+        disagreement = 1.0 - votes[winner] / sum(votes.values())
+    elif windows and all(w["encoding"] == "ascii" for w in windows):
+        result = _result("ascii", 1.0, "English", "ascii")
+        disagreement = 0.0
+    else:
+        result = _result(None, 0.0, None, "statistical")
+        disagreement = 0.0
+
+    result["windows"] = windows
+    result["disagreement"] = round(disagreement, 4)
+    return result, examined
+
+
+def _random_access(content: Union[bytes, memoryview, BinaryIO]) -> Tuple[int, Callable[[int, int], bytes]]:
+    """
+    Return the size of bytes, a memoryview or a seekable binary file, and a read_at(offset, size) function.
+    返回字节串、memoryview 或可定位二进制文件的大小，以及一个 read_at(offset, size) 函数。
+
+    For a memoryview (e.g. over an mmap) only the requested window is copied out.
+    对于 memoryview（例如基于 mmap 的），只会复制出所请求的窗口。
+    """
+    if isinstance(content, memoryview):
+        return content.nbytes, lambda offset, size: content[offset:offset + size].tobytes()
+    if not hasattr(content, "read"):
+        return len(content), lambda offset, size: content[offset:offset + size]
+
+    fileobj = content
+    total = fileobj.seek(0, io.SEEK_END)
+
+    def read_at(offset: int, size: int) -> bytes:
+        fileobj.seek(offset)
+        return fileobj.read(size)
+
+    return total, read_at
+
+
+def _policy(chunk_size: Optional[int], fast_path: bool, strategy: str, margin: float, windows: int, scope=None) -> tuple:
+    """The detection options that cached results depend on. (缓存结果所依赖的检测参数)"""
+    return (strategy, chunk_size, fast_path, margin, windows, scope)
+
+
+def _cache_key(
+    content: Union[bytes, BinaryIO],
+    read_at: Callable[[int, int], bytes],
+    size: int,
+    limit: int,
+    policy: tuple,
+) -> str:
+    """
+    Key a real file by path, size and mtime, anything else by a digest of the regions the policy samples.
+    真实文件按路径、大小和修改时间作为键，其他内容按策略所采样区域的摘要作为键。
+    """
+    name = getattr(content, "name", None)
+    if isinstance(name, str):
+        try:
+            st = os.fstat(content.fileno())
+            return file_key(policy, os.path.realpath(name), st.st_size, st.st_mtime_ns)
+        except (OSError, ValueError, io.UnsupportedOperation):
+            pass
+
+    strategy, count = policy[0], policy[4]
+    if strategy == "stratified":
+        window_size, offsets = _stratified_layout(size, limit, max(count, 2))
+        return content_key(policy + (size,), *(read_at(offset, window_size) for offset in offsets))
+    # Whether the head was truncated changes how it is aligned
+    return content_key(policy + (limit < size,), read_at(0, limit))
+
+
+def detect(
+    content: Union[bytes, memoryview, str, BinaryIO],
+    chunk_size: Optional[int] = 1024 * 50,
+    fast_path: bool = True,
+    strategy: str = "head",
+    margin: float = 0.2,
+    windows: int = STRATIFIED_WINDOWS,
+    cache: Optional[DetectionCache] = None,
+    candidates: Optional[Union[str, Iterable[str]]] = None,
+    exclude: Optional[Iterable[str]] = None,
+    language: Optional[str] = None,
+) -> dict:
     """
     Detect the encoding of the given content.
     检测给定内容的编码。
@@ -13,42 +428,296 @@ def detect(content: Union[bytes, str], chunk_size: Optional[int] = 1024 * 50) ->
     - 对应教程中“猜测包装盒”的步骤。
     
     Args:
-        content: The content to analyze. If string, it will be encoded to utf-8 first (trivial case).
-                 要分析的内容。如果是字符串，会先被编码为 utf-8（平凡情况）。
+        content: The content to analyze: bytes, a memoryview, or a seekable binary file (only the
+                 sampled bytes are read and the file position is restored). A string is already
+                 Unicode, so it is reported as ascii or utf_8 (trivial case).
+                 要分析的内容：字节串、memoryview，或可定位的二进制文件（只读取采样的字节，之后恢复文件位置）。
+                 字符串已经是 Unicode，因此直接报告为 ascii 或 utf_8（平凡情况）。
         chunk_size: Maximum bytes to read for detection. Defaults to 50KB. Set to None to scan full content.
                     检测时读取的最大字节数。默认为 50KB。设置为 None 则扫描全部内容。
+        fast_path: Answer from a BOM, pure ASCII or strict UTF-8 before running charset_normalizer.
+                   Disable it to always get charset_normalizer's language guess.
+                   在运行 charset_normalizer 之前先通过 BOM、纯 ASCII 或严格 UTF-8 判断。
+                   关闭后总是能得到 charset_normalizer 的语言判断。
+        strategy: 'head' scans the first chunk_size bytes. 'progressive' scans 4KB, 16KB, 64KB, ...
+                  up to chunk_size and stops as soon as the answer is clear. 'stratified' splits
+                  chunk_size over windows from the head, middle and tail and combines them by vote.
+                  'head' 扫描前 chunk_size 个字节。'progressive' 依次扫描 4KB、16KB、64KB……
+                  直到 chunk_size，结果一旦明确就停止。'stratified' 把 chunk_size 分配给
+                  开头、中间和结尾的多个窗口，再投票合并结果。
+        margin: For 'progressive', the lead the best candidate needs over the runner-up to stop early.
+                对于 'progressive'，最佳候选需要领先第二名多少才能提前停止。
+        windows: For 'stratified', the number of windows. (对于 'stratified'，窗口的数量)
+        cache: A DetectionCache (or SQLiteCache) to look results up in and store them to.
+               用于查找和保存结果的 DetectionCache（或 SQLiteCache）。
+        candidates: Encodings to choose from, or a profile name from PROFILES ('cjk', 'western', 'all').
+                    Defaults to the profile named by the CHARSET_UTIL_PROFILE environment variable, else 'all'.
+                    Fewer candidates make detection faster and rule out wrong guesses (e.g. cp1250 for short GBK).
+                    可选的编码列表，或 PROFILES 中的配置名（'cjk'、'western'、'all'）。
+                    默认使用环境变量 CHARSET_UTIL_PROFILE 指定的配置，否则为 'all'。
+                    候选越少检测越快，也能排除错误的猜测（例如把较短的 GBK 判断为 cp1250）。
+        exclude: Encodings never to answer. (永远不作为结果的编码)
+        language: Language hint such as 'zh', 'zh-TW', 'ja' or 'fr'; narrows candidates to LANGUAGE_CANDIDATES.
+                  语言提示，例如 'zh'、'zh-TW'、'ja' 或 'fr'；把候选编码缩小到 LANGUAGE_CANDIDATES 中对应的编码。
         
     Returns:
-        A dictionary containing 'encoding', 'confidence', and 'language'.
-        包含 'encoding' (编码), 'confidence' (置信度), 和 'language' (语言) 的字典。
+        A dictionary containing 'encoding', 'confidence', 'language', 'method'
+        ('bom', 'ascii', 'utf8-strict', 'statistical' or 'candidate': which tier answered) and 'bytes_examined'.
+        'stratified' adds 'windows' (per-window results) and 'disagreement' (share of the vote against the winner).
+        包含 'encoding' (编码), 'confidence' (置信度), 'language' (语言), 'method'
+        (由哪一层给出结果：'bom'、'ascii'、'utf8-strict'、'statistical' 或 'candidate') 和 'bytes_examined' (实际检查的字节数) 的字典。
+        'stratified' 还会返回 'windows'（每个窗口的结果）和 'disagreement'（反对胜出编码的票数占比）。
     """
     if isinstance(content, str):
-        content = content.encode('utf-8')
-    
-    # Slice content if chunk_size is provided to avoid memory issues on large files
-    scan_content = content
-    if chunk_size is not None and len(content) > chunk_size:
-        scan_content = content[:chunk_size]
-        
-    result = charset_normalizer.from_bytes(scan_content).best()
-    
-    if result is None:
-        return {
-            "encoding": None,
-            "confidence": 0.0,
-            "language": None
+        # Already decoded: no need to encode it back to bytes just to analyse it
+        if content.isascii():
+            result = _result("ascii", 1.0, "English", "ascii")
+        else:
+            result = _result("utf_8", 1.0, "Unknown", "utf8-strict")
+        result["bytes_examined"] = 0
+        return result
+
+    if strategy not in ("head", "progressive", "stratified"):
+        raise ValueError(f"Unknown detection strategy: {strategy!r}")
+    scope = _scope(candidates, exclude, language)
+
+    position = content.tell() if hasattr(content, "read") else None
+    try:
+        size, read_at = _random_access(content)
+        limit = size if chunk_size is None else min(chunk_size, size)
+
+        key = None
+        if cache is not None:
+            key = _cache_key(content, read_at, size, limit, _policy(chunk_size, fast_path, strategy, margin, windows, scope))
+            cached = cache.get(key)
+            if cached is not None:
+                instrument.emit("detect.cache_hit", 0, 0)
+                return cached
+
+        if strategy == "progressive":
+            result, examined = _progressive_detect(read_at, limit, fast_path, margin, scope, limit < size)
+        elif strategy == "stratified":
+            result, examined = _stratified_detect(read_at, size, limit, max(windows, 2), fast_path, scope)
+        else:
+            # Slice content if chunk_size is provided to avoid memory issues on large files
+            scan_content = content if isinstance(content, bytes) and limit >= size else read_at(0, limit)
+            if limit < size:
+                _, scan_content = _align_window(scan_content, False, True)
+            result = None
+            if fast_path:
+                started = instrument.clock()
+                result = _fast_detect(scan_content, scope, limit < size)
+                instrument.emit("detect.fast", len(scan_content), started)
+            if result is None:
+                result, _ = _statistical_detect(scan_content, scope, limit < size)
+            examined = len(scan_content)
+    finally:
+        if position is not None:
+            content.seek(position)
+
+    result["bytes_examined"] = examined
+    if key is not None:
+        cache.set(key, result)
+    return result
+
+# Invalid spans listed individually in a decode report; the counters always cover all of them
+MAX_REPORTED_SPANS = 64
+
+# Bytes the primary codec is given to decode one character when measuring an invalid span,
+# the longest an invalid span may grow, and how many following bytes a fallback codec may
+# borrow to finish a character cut by the end of the span
+_SPAN_LOOKAHEAD = 8
+_MAX_SPAN = 4096
+_SPAN_BORROW = 3
+
+# One entry per decode in progress on this thread, read by the registered error handler
+_span_decodes = threading.local()
+
+
+class _Redetect(Exception):
+    """Raised from the error handler to restart a decode with another encoding."""
+
+    def __init__(self, encoding: str):
+        super().__init__(encoding)
+        self.encoding = encoding
+
+
+class _SpanDecode:
+    """
+    State of one _decode_spans() call: the fallback chain and the report being built.
+    Nothing is looked up until the first error, so a clean decode costs almost nothing extra.
+    """
+
+    def __init__(self, codec: str, encoding: str, fallbacks: Iterable[str], errors: str, base: int,
+                 first_error: Optional[Callable[[int], None]]):
+        self.codec = codec
+        self.fallbacks = fallbacks
+        self.errors = errors
+        self.base = base
+        self.first_error = first_error
+        self.incremental = None
+        self.report = {
+            "encoding": encoding,
+            "invalid_spans": 0,
+            "invalid_bytes": 0,
+            "recovered_bytes": {},
+            "replaced_bytes": 0,
+            "spans": [],
         }
-        
-    return {
-        "encoding": result.encoding,
-        # result.fingerprint is a SHA256 hash string in newer versions of charset-normalizer, not a float confidence!
-        # result.coherence is what we might want for confidence-like metric if available, but it's not always exposed same way.
-        # For now, let's just return 1.0 if we found a match, or use coherence if present.
-        "confidence": getattr(result, 'coherence', 1.0),
-        "language": result.language
-    }
 
-def convert(content: bytes, target_encoding: str = "utf-8") -> str:
+    def _prepare(self) -> None:
+        self.incremental = codecs.getincrementaldecoder(self.codec)
+        names = {codecs.lookup(self.codec).name}
+        chain = []
+        # Spans of UTF-16/32 are not text in any ASCII-based fallback
+        for fallback in self.fallbacks if _ascii_compatible(self.codec) else ():
+            try:
+                name = codecs.lookup(fallback).name
+            except LookupError:
+                continue
+            if name not in names:
+                names.add(name)
+                chain.append(fallback)
+        self.fallbacks = tuple(chain)
+
+    def _decodes_at(self, data: bytes, pos: int) -> bool:
+        """Whether the primary codec can decode the character starting at pos."""
+        try:
+            self.incremental().decode(data[pos:pos + _SPAN_LOOKAHEAD], False)
+            return True
+        except UnicodeDecodeError as e:
+            return e.start > 0
+
+    def _fallback(self, codec: str, data: bytes, start: int, end: int) -> Optional[Tuple[str, int]]:
+        """Decode as much of data[start:end] as codec can; None if it cannot decode the first character."""
+        decoder = codecs.getincrementaldecoder(codec)()
+        try:
+            text = decoder.decode(data[start:end], False)
+        except UnicodeDecodeError as e:
+            if e.start == 0:
+                return None
+            return data[start:start + e.start].decode(codec), start + e.start
+        # A multibyte character cut by the span end (a GBK trail byte or a GB18030 digit in the ASCII range)
+        pos = end
+        limit = min(len(data), end + _SPAN_BORROW)
+        while decoder.getstate()[0] and pos < limit:
+            try:
+                text += decoder.decode(data[pos:pos + 1], False)
+            except UnicodeDecodeError:
+                break
+            pos += 1
+        consumed = pos - len(decoder.getstate()[0])
+        if not text or consumed <= start:
+            return None
+        return (text, consumed) if consumed == pos else (data[start:consumed].decode(codec), consumed)
+
+    def _record(self, start: int, end: int, codec: Optional[str]) -> None:
+        report = self.report
+        report["invalid_spans"] += 1
+        report["invalid_bytes"] += end - start
+        if codec is None:
+            report["replaced_bytes"] += end - start
+        else:
+            report["recovered_bytes"][codec] = report["recovered_bytes"].get(codec, 0) + end - start
+        if len(report["spans"]) < MAX_REPORTED_SPANS:
+            report["spans"].append([self.base + start, self.base + end, codec])
+
+    def handle(self, error: UnicodeDecodeError) -> Tuple[str, int]:
+        if self.incremental is None:
+            self._prepare()
+        if self.first_error is not None:
+            hook, self.first_error = self.first_error, None
+            hook(self.base + error.start)
+        data = error.object
+        start = error.start
+        # The span runs on while the primary codec still cannot decode, so the fallback sees
+        # whole characters rather than the single byte the decoder complained about
+        end = error.end
+        limit = min(len(data), start + _MAX_SPAN)
+        while end < limit and not self._decodes_at(data, end):
+            end += 1
+        fallbacks = self.fallbacks
+        if fallbacks:
+            # If the primary codec also rejects the rest of this non-ASCII run, the run is in
+            # another encoding (e.g. a GBK line in a UTF-8 file) and goes to the fallbacks whole.
+            # If it accepts the rest, a few corrupt bytes sit in valid text: decoding them with
+            # another codec would only turn them into wrong characters, so they are replaced.
+            run = _NON_ASCII_RUN.match(data, end, limit)
+            if run:
+                try:
+                    self.incremental().decode(data[end:run.end()], False)
+                    fallbacks = ()
+                except UnicodeDecodeError:
+                    end = run.end()
+        for codec in fallbacks:
+            recovered = self._fallback(codec, data, start, end)
+            if recovered is not None:
+                text, resume = recovered
+                self._record(start, resume, codec)
+                return text, resume
+        replacement, resume = codecs.lookup_error(self.errors)(error)
+        self._record(start, resume, None)
+        return replacement, resume
+
+
+def _ascii_compatible(codec: str) -> bool:
+    try:
+        return "\n".encode(codec) == b"\n"
+    except (UnicodeError, LookupError):
+        return False
+
+
+def _fallback_spans(error: UnicodeDecodeError) -> Tuple[str, int]:
+    return _span_decodes.stack[-1].handle(error)
+
+
+codecs.register_error("charset_util.fallback_spans", _fallback_spans)
+
+
+def _decode_spans(
+    content: bytes,
+    encoding: str,
+    fallbacks: Iterable[str] = ("gb18030",),
+    errors: str = "replace",
+    first_error: Optional[Callable[[int], None]] = None,
+) -> Tuple[str, dict]:
+    """
+    Decode in one pass, re-decoding only the invalid spans with the fallback codecs.
+    单遍解码，只把无法解码的片段交给后备编解码器重新解码。
+
+    Spans that no fallback can decode go to the errors handler. first_error, if given, is
+    called with the offset of the first invalid byte and may raise _Redetect to stop early.
+    所有后备编解码器都无法解码的片段交给 errors 处理。如果提供了 first_error，
+    会以第一个无效字节的偏移量调用它，它可以抛出 _Redetect 提前结束。
+    """
+    codec = _decoding_codec(encoding, content)
+    base = 0
+    if codec == "utf_8_sig" and content.startswith(codecs.BOM_UTF8):
+        # Offsets in the report are into content, so strip the BOM here rather than in the codec
+        codec, base, content = "utf_8", len(codecs.BOM_UTF8), content[len(codecs.BOM_UTF8):]
+    state = _SpanDecode(codec, encoding, fallbacks, errors, base, first_error)
+    stack = getattr(_span_decodes, "stack", None)
+    if stack is None:
+        stack = _span_decodes.stack = []
+    stack.append(state)
+    try:
+        text = content.decode(codec, "charset_util.fallback_spans")
+    finally:
+        stack.pop()
+    return text, state.report
+
+
+def convert(
+    content: bytes,
+    target_encoding: str = "utf-8",
+    chunk_size: Optional[int] = 1024 * 50,
+    encoding: Optional[str] = None,
+    detection: Optional[dict] = None,
+    strategy: str = "head",
+    candidates: Optional[Union[str, Iterable[str]]] = None,
+    exclude: Optional[Iterable[str]] = None,
+    language: Optional[str] = None,
+) -> str:
     """
     Convert the content to the target encoding.
     将内容转换为目标编码。
@@ -59,38 +728,777 @@ def convert(content: bytes, target_encoding: str = "utf-8") -> str:
     - This corresponds to the "Unpacking" step in our tutorial: auto-detect the box type and take out the character.
     - 对应教程中“拆快递”的步骤：自动识别盒子类型并取出字符。
     
+    The encoding is detected from a sample (see detect()), then the whole buffer is decoded
+    in a single pass. At the first invalid byte the encoding is re-detected over a window
+    around it; if that gives another encoding the decode restarts with it. Otherwise the
+    pass goes on: runs of bytes in another encoding are re-decoded with target_encoding,
+    then GB18030, and corrupt bytes inside otherwise valid text are replaced.
+    See convert_report() for what was lost.
+    编码先从样本中检测（见 detect()），然后单遍解码整个缓冲区。遇到第一个无效字节时，
+    会在它周围的窗口上重新检测编码；如果得到另一种编码，就用它重新解码。否则继续这一遍解码：
+    其他编码的字节片段依次用 target_encoding、GB18030 重新解码，而有效文本中的损坏字节会被替换。
+    丢失了什么见 convert_report()。
+
     Args:
         content: The bytes to convert.
                  要转换的字节内容。
         target_encoding: The target encoding (default: utf-8).
                          目标编码（默认：utf-8）。
+        chunk_size: Bytes sampled for detection. Defaults to 50KB. Set to None to scan full content.
+                    检测时采样的字节数。默认为 50KB。设置为 None 则扫描全部内容。
+        encoding: Skip detection and decode with this encoding.
+                  跳过检测，直接使用该编码解码。
+        detection: A result previously returned by detect() for this content.
+                   之前对该内容调用 detect() 得到的结果。
+        strategy: Sampling strategy passed to detect(). (传给 detect() 的采样策略)
+        candidates, exclude, language: Candidate restrictions passed to detect(). (传给 detect() 的候选编码限制)
         
     Returns:
         The decoded string.
         解码后的字符串。
     """
-    # For short content, charset_normalizer might be less accurate with GBK vs UTF-8
-    # But here we trust it. 
-    # NOTE: charset_normalizer.from_bytes returns a Matches object, .best() returns the best Match.
-    # Match object has .output() method (or str(match)) which returns bytes decoded to str.
-    
-    result = charset_normalizer.from_bytes(content).best()
-    
-    if result is None:
-        # Fallback: try to decode with target_encoding (usually utf-8), or try 'utf-8' with replace
+    return convert_report(
+        content,
+        target_encoding=target_encoding,
+        chunk_size=chunk_size,
+        encoding=encoding,
+        detection=detection,
+        strategy=strategy,
+        candidates=candidates,
+        exclude=exclude,
+        language=language,
+    )[0]
+
+
+def convert_report(
+    content: bytes,
+    target_encoding: str = "utf-8",
+    chunk_size: Optional[int] = 1024 * 50,
+    encoding: Optional[str] = None,
+    detection: Optional[dict] = None,
+    strategy: str = "head",
+    candidates: Optional[Union[str, Iterable[str]]] = None,
+    exclude: Optional[Iterable[str]] = None,
+    language: Optional[str] = None,
+    errors: str = "replace",
+) -> Tuple[str, dict]:
+    """
+    Like convert(), but also report which bytes could not be decoded and what became of them.
+    与 convert() 相同，但同时报告哪些字节无法解码，以及它们被如何处理。
+
+    Use Case (场景):
+    - Auditing data loss: a large file with a few corrupt bytes is decoded in one pass, and
+      the report says where they were and whether they were recovered or replaced.
+    - 审计数据损失：含有少量损坏字节的大文件只需解码一遍，报告会说明它们在哪里，以及是被恢复还是被替换。
+
+    Args:
+        content, target_encoding, chunk_size, encoding, detection, strategy, candidates,
+        exclude, language: See convert(). (参见 convert())
+        errors: Error handler for spans no fallback codec can decode (default: replace).
+                所有后备编解码器都无法解码的片段的错误处理方式（默认：replace）。
+
+    Returns:
+        The decoded string and a report: 'encoding' (the codec of the pass), 'invalid_spans',
+        'invalid_bytes', 'recovered_bytes' ({fallback codec: bytes}), 'replaced_bytes' and
+        'spans' (the first MAX_REPORTED_SPANS as [start, end, codec or None] byte offsets).
+        解码后的字符串和一份报告：'encoding'（本遍解码使用的编解码器）、'invalid_spans'、'invalid_bytes'、
+        'recovered_bytes'（{后备编解码器: 字节数}）、'replaced_bytes' 和 'spans'
+        （前 MAX_REPORTED_SPANS 个片段，格式为 [起始, 结束, 编解码器或 None] 的字节偏移）。
+    """
+    if encoding is None and detection is not None:
+        encoding = detection.get("encoding")
+    scope = dict(candidates=candidates, exclude=exclude, language=language)
+    if encoding is None:
+        encoding = detect(content, chunk_size=chunk_size, strategy=strategy, **scope)["encoding"]
+    if encoding is None:
+        # Nothing detected: target_encoding if the sample decodes with it, else GB18030 (common for Chinese)
+        sample = content if chunk_size is None else content[:chunk_size]
+        encoding = next((e for e in (target_encoding, "gb18030") if _can_decode_prefix(sample, e)), target_encoding)
+
+    tried = {encoding}
+
+    def redetect(failed_at: int) -> None:
+        # The sample was not representative (e.g. an ASCII header before a GBK body).
+        # Re-detect over a wider window that covers the bytes which failed to decode.
+        if chunk_size is None or len(content) <= chunk_size:
+            return
+        instrument.emit("convert.decode_failed", failed_at, started)
+        redetect_started = instrument.clock()
+        # From the start of the failing line: bytes before it were accepted already, and a long
+        # ASCII run in the window would only dilute the detection of the body
+        line = content.rfind(b"\n", max(0, failed_at - chunk_size), failed_at)
+        start = line + 1 if line >= 0 else failed_at
+        end = failed_at + chunk_size * 3
+        window = content[start:end]
+        result = _detect_sample(window, end < len(content), **scope)
+        instrument.emit("convert.redetect", len(window), redetect_started, fallback="window")
+        # A guess that cannot decode the window (or one over a few CJK bytes after a long ASCII
+        # run) is no reason to restart; the span fallbacks decode such bytes instead
+        found = _usable(result, window, end >= len(content))
+        if found is not None and found not in tried:
+            raise _Redetect(found)
+
+    while True:
+        started = instrument.clock()
         try:
-            return content.decode(target_encoding)
-        except:
-            # If target encoding fails, try GB18030 (common for Chinese) before giving up to 'replace'
-            try:
-                return content.decode('gb18030')
-            except:
-                return content.decode('utf-8', errors='replace')
-    
-    # result.encoding is the detected encoding.
-    # str(result) returns the decoded string using that encoding.
+            text, report = _decode_spans(content, encoding, (target_encoding, "gb18030"), errors, redetect)
+        except _Redetect as e:
+            encoding = e.encoding
+            tried.add(encoding)
+            continue
+        break
+
+    if report["invalid_spans"]:
+        used = list(report["recovered_bytes"]) + (["replace"] if report["replaced_bytes"] else [])
+        instrument.emit("convert.fallback", len(content), started, fallback="+".join(used))
+    else:
+        instrument.emit("convert.decode", len(content), started, fallback="redetect" if len(tried) > 1 else None)
+    return text, report
+
+
+def _decoding_codec(encoding: str, head: bytes) -> str:
+    """
+    Pick the codec used to decode a stream, dropping a UTF-8 BOM like str(match) does.
+    选择用于解码的编解码器；与 str(match) 一致，去掉 UTF-8 的 BOM。
+    """
+    if codecs.lookup(encoding).name == "utf-8" and head.startswith(codecs.BOM_UTF8):
+        return "utf_8_sig"
+    return encoding
+
+
+def _can_decode_prefix(sample: bytes, encoding: str, final: bool = False) -> bool:
+    """
+    Check that a (possibly truncated) sample decodes with the given encoding.
+    检查一个（可能被截断的）样本能否用给定编码解码。
+
+    An incremental decoder is used so that a multibyte sequence cut at the end of
+    the sample is not counted as an error, unless final says the sample is the whole content.
+    使用增量解码器，样本末尾被截断的多字节序列不会被视为错误，除非 final 表示样本就是全部内容。
+    """
     try:
-        return str(result)
-    except:
-        # If conversion fails even with detected encoding (rare but possible), fallback
-        return content.decode('utf-8', errors='replace')
+        codecs.getincrementaldecoder(encoding)().decode(sample, final=final)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def _stream_encoding(detected: Optional[str], sample: bytes) -> str:
+    """
+    The detected encoding, or the fallback used when nothing was detected.
+    检测到的编码；未检测到时使用的后备编码。
+    """
+    if detected is not None:
+        return detected
+    # Same fallback order as convert(): GB18030 first, then UTF-8 with replacement
+    started = instrument.clock()
+    fallback = "gb18030" if _can_decode_prefix(sample, "gb18030") else "utf-8"
+    instrument.emit("stream.fallback", len(sample), started, fallback=fallback)
+    return fallback
+
+
+def _detect_sample(sample: bytes, truncated: bool, **options) -> dict:
+    """
+    detect() over a sample of a stream; truncated says whether the stream goes on past it.
+    对流的样本调用 detect()；truncated 表示流在样本之后是否还有内容。
+    """
+    # A byte below 0x40 is never part of a multibyte character, so a sample ending in one was not
+    # cut inside a character. Otherwise, a limit short of the sample tells detect() that the content
+    # goes on, so it trims the sample to a safe boundary instead of failing the cut character.
+    cut = truncated and sample[-1:] >= b"\x40"
+    return detect(sample, chunk_size=len(sample) - 1 if cut else None, **options)
+
+
+# A statistical guess over fewer non-ASCII bytes than this (one or two CJK characters, which
+# nearly every double-byte codec decodes) is an arbitrary pick among equally good codecs
+_MIN_STATISTICAL_BYTES = 8
+
+_ASCII_BYTES = bytes(range(0x80))
+
+# Most ASCII bytes kept from the start of the line where a stream's first non-ASCII byte is,
+# as context for detecting from that byte on
+_LINE_CONTEXT = 256
+
+
+def _line_tail(context: bytes, data: Union[bytes, memoryview]) -> bytes:
+    """The ASCII since the last newline, given the previous one (context) and the next bytes."""
+    tail = bytes(data[-_LINE_CONTEXT:])
+    newline = tail.rfind(b"\n")
+    return tail[newline + 1:] if newline >= 0 else (context + tail)[-_LINE_CONTEXT:]
+
+
+def _usable(result: dict, sample: bytes, final: bool) -> Optional[str]:
+    """
+    The detected encoding, unless it does not strictly decode the sample it was detected from.
+    检测到的编码；如果它无法严格解码用于检测的样本，则返回 None。
+
+    Coherence is no gate: charset_normalizer reports 0.0 for correct Shift-JIS, EUC-JP and
+    EUC-KR answers. Only a statistical guess over a handful of non-ASCII bytes is dropped.
+    一致性不能作为判断依据：charset_normalizer 对正确的 Shift-JIS、EUC-JP 和 EUC-KR 结果也会给出 0.0。
+    只有基于极少数非 ASCII 字节的统计猜测会被丢弃。
+    """
+    encoding = result["encoding"]
+    if encoding is None:
+        return None
+    if result["method"] == "statistical" and len(sample.translate(None, _ASCII_BYTES)) < _MIN_STATISTICAL_BYTES:
+        return None
+    return encoding if _can_decode_prefix(sample, encoding, final=final) else None
+
+
+class _StreamDecoder:
+    """
+    Incremental decoder for a stream whose encoding was detected from a sample of its head.
+    以开头样本检测编码的流所用的增量解码器。
+
+    A sample that is all ASCII says nothing about the rest of the stream, so nothing is pinned
+    yet: ASCII is passed through, and the encoding is detected from the first non-ASCII bytes
+    (up to sample_size of them, together with the ASCII start of their line). A detected encoding is decoded strictly; at the first
+    invalid byte it is re-detected once from that byte on, as convert() does, and from then
+    on invalid bytes go to `errors`. An explicit encoding uses `errors` from the start.
+    全是 ASCII 的样本无法说明流的其余部分，因此暂不固定编码：ASCII 直接通过，编码由第一批非 ASCII 字节
+    （最多 sample_size 个，连同它们所在行开头的 ASCII）检测。检测得到的编码先严格解码；遇到第一个无效字节时，与 convert() 一样，
+    从该字节起重新检测一次，此后无效字节交给 errors 处理。显式指定的编码从一开始就使用 errors。
+    """
+
+    def __init__(self, encoding: Optional[str], head: bytes, errors: str, sample_size: Optional[int],
+                 detected: bool = True):
+        self.errors = errors
+        self.sample_size = sample_size
+        self.strict = detected
+        self.encoding = None
+        self.codec = None
+        self.decoder = None
+        # Bytes from the first non-ASCII one on, while they are too few to detect from, and
+        # the ASCII start of their line, which the detector sees with them
+        self.held = None
+        self.context = b""
+        if detected and encoding == "ascii" and sample_size is not None:
+            return
+        self.encoding = encoding if encoding is not None else _stream_encoding(None, head)
+        self._start(_decoding_codec(self.encoding, head))
+
+    def _start(self, codec: str) -> None:
+        self.codec = codec
+        self.decoder = codecs.getincrementaldecoder(codec)(errors="strict" if self.strict else self.errors)
+
+    def _pin(self, data: bytes, final: bool) -> None:
+        started = instrument.clock()
+        sample = data if self.sample_size is None else data[:self.sample_size]
+        truncated = not final or len(sample) < len(data)
+        sample = self.context + sample
+        found = _usable(_detect_sample(sample, truncated), sample, not truncated)
+        # ASCII has passed through already, so e.g. BOM-less UTF-16 cannot be the answer
+        if found is not None and not _ascii_compatible(found):
+            found = None
+        self.encoding = _stream_encoding(found, sample)
+        instrument.emit("stream.detect", len(sample), started)
+        # A BOM is non-ASCII, so it cannot come after the ASCII already passed through
+        self._start(_decoding_codec(self.encoding, b""))
+
+    def _redetect(self, data: bytes, failed_at: int, final: bool) -> bool:
+        """Re-detect over the bytes from failed_at on; whether that gave another encoding."""
+        started = instrument.clock()
+        size = None if self.sample_size is None else max(self.sample_size, PROGRESSIVE_START)
+        window = data[failed_at:] if size is None else data[failed_at:failed_at + size]
+        truncated = not final or failed_at + len(window) < len(data)
+        found = _stream_encoding(_usable(_detect_sample(window, truncated), window, not truncated), window)
+        instrument.emit("stream.redetect", len(window), started, fallback="window")
+        if _canonical(found) == _canonical(self.encoding):
+            return False
+        self.encoding = found
+        return True
+
+    def setstate(self, state: Tuple[bytes, int]) -> None:
+        self.decoder.setstate(state)
+
+    def getstate(self) -> Optional[dict]:
+        """
+        A checkpoint of the pinned decoder, for from_state(); None while nothing is pinned yet.
+        已固定解码器的检查点，供 from_state() 使用；尚未固定编码时返回 None。
+        """
+        if self.decoder is None:
+            return None
+        pending, flag = self.decoder.getstate()
+        return {"encoding": self.encoding, "codec": self.codec, "strict": self.strict,
+                "pending": pending, "flag": flag}
+
+    @classmethod
+    def from_state(cls, state: dict, errors: str, sample_size: Optional[int]) -> "_StreamDecoder":
+        """
+        A decoder that goes on where the one that gave getstate() stopped.
+        从 getstate() 所记录之处继续解码的解码器。
+        """
+        decoder = cls(state["encoding"], b"", errors, sample_size, detected=False)
+        decoder.strict = state["strict"]
+        # The codec may differ from the encoding (a UTF-8 BOM at the start of the stream)
+        decoder._start(state["codec"])
+        decoder.decoder.setstate((state["pending"], state["flag"]))
+        return decoder
+
+    def decode(self, data: Union[bytes, memoryview], final: bool = False) -> str:
+        prefix = ""
+        if self.decoder is None:
+            if self.held is None:
+                match = _NON_ASCII_BYTE.search(data)
+                if match is None:
+                    self.context = _line_tail(self.context, data)
+                    return str(data, "ascii")
+                prefix = str(data[:match.start()], "ascii")
+                self.context = _line_tail(self.context, data[:match.start()])
+                self.held = bytes(data[match.start():])
+            else:
+                self.held += data
+            if not final and len(self.held) < self.sample_size:
+                return prefix
+            data, self.held = self.held, None
+            self._pin(data, final)
+        return prefix + self._decode(data, final)
+
+    def flush(self) -> str:
+        """
+        Pin the encoding from the bytes held back so far, without waiting for sample_size of them
+        (e.g. when a followed file stops growing). The stream itself goes on.
+        不等凑满 sample_size 个字节，立即用目前暂存的字节固定编码（例如被跟踪的文件不再增长时）。流本身并未结束。
+        """
+        if self.held is None:
+            return ""
+        data, self.held = self.held, None
+        self._pin(data, False)
+        return self._decode(data, False)
+
+    def _decode(self, data: Union[bytes, memoryview], final: bool) -> str:
+        if not self.strict:
+            return self.decoder.decode(data, final)
+        pending, flag = self.decoder.getstate()
+        try:
+            return self.decoder.decode(data, final)
+        except UnicodeDecodeError as e:
+            self.strict = False
+            # The error offset is into the bytes held back from the last block plus this one.
+            # A character cut by the end of the stream says nothing about the encoding.
+            held = pending + bytes(data)
+            if not (final and e.end == len(held)) and self._redetect(held, e.start, final):
+                # What comes before the error is valid in the old encoding, like the blocks already decoded
+                decoder = codecs.getincrementaldecoder(self.codec)()
+                decoder.setstate((b"", flag))
+                prefix = decoder.decode(held[:e.start])
+                self._start(_decoding_codec(self.encoding, b""))
+                return prefix + self.decoder.decode(held[e.start:], final)
+            self._start(self.codec)
+            self.decoder.setstate((pending, flag))
+            return self.decoder.decode(data, final)
+
+
+def iter_convert(
+    fileobj: BinaryIO,
+    chunk_size: Optional[int] = 1024 * 50,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    encoding: Optional[str] = None,
+    errors: str = "replace",
+    detection: Optional[dict] = None,
+) -> Iterator[str]:
+    """
+    Decode a binary stream chunk by chunk, yielding pieces of text.
+    逐块解码二进制流，依次产出文本片段。
+
+    Use Case (场景):
+    - When the file is too large to read into memory at once (multi-GB exports, logs).
+    - 当文件太大，无法一次性读入内存时（数 GB 的导出文件、日志）。
+    - The encoding is detected from a leading sample, then an incremental decoder
+      handles multibyte sequences split across chunk boundaries.
+    - 先用开头的样本检测编码，再用增量解码器处理跨块边界被切开的多字节序列。
+
+    An all-ASCII sample does not pin the encoding: it is detected at the first non-ASCII
+    bytes. A detected encoding is re-detected once at the first byte it cannot decode.
+    全是 ASCII 的样本不会固定编码：编码在遇到第一批非 ASCII 字节时才检测。
+    检测得到的编码在遇到第一个无法解码的字节时会重新检测一次。
+
+    Args:
+        fileobj: A binary file object opened for reading.
+                 以二进制模式打开的可读文件对象。
+        chunk_size: Bytes sampled from the head for detection. Defaults to 50KB. None reads the whole stream.
+                    检测时从开头采样的字节数。默认为 50KB。设置为 None 则读取整个流。
+        block_size: Bytes read per step after the sample. Defaults to 1MB.
+                    采样之后每次读取的字节数。默认为 1MB。
+        encoding: Skip detection and decode with this encoding.
+                  跳过检测，直接使用该编码解码。
+        errors: Error handler for undecodable bytes (default: replace).
+                无法解码字节的错误处理方式（默认：replace）。
+        detection: A result previously returned by detect() for this stream, used instead of
+                   detecting the sample; unlike encoding, it is not pinned.
+                   之前对该流调用 detect() 得到的结果，用来代替对样本的检测；与 encoding 不同，它不会被固定。
+
+    Yields:
+        Decoded text pieces, in order.
+        按顺序产出的解码文本片段。
+    """
+    sample = fileobj.read() if chunk_size is None else fileobj.read(chunk_size)
+
+    detected = encoding is None
+    if detected and detection is not None:
+        encoding = detection.get("encoding")
+    if detected and encoding is None:
+        encoding = _detect_sample(sample, chunk_size is not None and len(sample) == chunk_size)["encoding"]
+    decoder = _StreamDecoder(encoding, sample, errors, chunk_size, detected)
+
+    chunk = sample
+    while chunk:
+        started = instrument.clock()
+        text = decoder.decode(chunk)
+        instrument.emit("stream.decode", len(chunk), started)
+        if text:
+            yield text
+        chunk = fileobj.read(block_size)
+
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def convert_stream(
+    src: BinaryIO,
+    dst: TextIO,
+    chunk_size: Optional[int] = 1024 * 50,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    encoding: Optional[str] = None,
+    errors: str = "replace",
+    detection: Optional[dict] = None,
+) -> int:
+    """
+    Decode a binary stream and write the text to a text stream with constant memory.
+    解码二进制流并以恒定内存将文本写入文本流。
+
+    Use Case (场景):
+    - Converting a huge file: open the output with the target encoding and let this
+      function pump the text through, one block at a time.
+    - 转换超大文件：用目标编码打开输出文件，由本函数逐块搬运文本。
+
+    Args:
+        src: A binary file object to read from. (可读的二进制文件对象)
+        dst: A text stream to write to, e.g. open(path, "w", encoding=...) or sys.stdout.
+             要写入的文本流，例如 open(path, "w", encoding=...) 或 sys.stdout。
+        chunk_size, block_size, encoding, errors, detection: See iter_convert(). (参见 iter_convert())
+
+    Returns:
+        The number of characters written.
+        写入的字符数。
+    """
+    written = 0
+    for text in iter_convert(src, chunk_size=chunk_size, block_size=block_size, encoding=encoding, errors=errors,
+                             detection=detection):
+        dst.write(text)
+        written += len(text)
+    return written
+
+
+class _MappedFile:
+    """
+    Read-only memory map of a file, exposed as a memoryview (empty files cannot be mapped).
+    文件的只读内存映射，以 memoryview 形式提供（空文件无法映射）。
+
+    Pipes, FIFOs and devices cannot be mapped, and their size says nothing about their
+    content: for them view is None, and callers read the open file as a stream instead.
+    管道、FIFO 和设备无法映射，其大小也无法反映内容：此时 view 为 None，调用方改为以流的方式读取已打开的文件。
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.stat = os.fstat(self.file.fileno())
+        self._map = None
+        self.view = None
+        if not stat.S_ISREG(self.stat.st_mode):
+            return
+        if self.stat.st_size:
+            self._map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self._map)
+        else:
+            self.view = memoryview(b"")
+
+    def __enter__(self) -> "_MappedFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.view is not None:
+            self.view.release()
+        if self._map is not None:
+            self._map.close()
+        self.file.close()
+
+
+def detect_file(
+    path: str,
+    chunk_size: Optional[int] = 1024 * 50,
+    fast_path: bool = True,
+    strategy: str = "head",
+    margin: float = 0.2,
+    windows: int = STRATIFIED_WINDOWS,
+    cache: Optional[DetectionCache] = None,
+    candidates: Optional[Union[str, Iterable[str]]] = None,
+    exclude: Optional[Iterable[str]] = None,
+    language: Optional[str] = None,
+) -> dict:
+    """
+    Detect the encoding of a file through a memory map.
+    通过内存映射检测文件的编码。
+
+    Use Case (场景):
+    - Very large files: sample windows are sliced out of the mapping, so only the pages
+      that are sampled are ever read from disk.
+    - 超大文件：采样窗口直接从映射中切出，只有被采样的页面才会从磁盘读取。
+
+    Args:
+        path: Path to the file. (文件路径)
+        chunk_size, fast_path, strategy, margin, windows, candidates, exclude, language: See detect(). (参见 detect())
+        cache: A DetectionCache; files are keyed by path, size and mtime.
+               DetectionCache 缓存；文件按路径、大小和修改时间作为键。
+
+    Returns:
+        The same dictionary as detect(). (与 detect() 相同的字典)
+    """
+    with _MappedFile(path) as mapped:
+        if mapped.view is None:
+            # Read once, so only the head can be sampled, and there is nothing stable to cache by;
+            # one byte past the sample lets detect() trim a character cut by its end
+            sample = mapped.file.read() if chunk_size is None else mapped.file.read(chunk_size + 1)
+            return detect(sample, chunk_size=chunk_size, fast_path=fast_path, strategy=strategy, margin=margin,
+                          windows=windows, candidates=candidates, exclude=exclude, language=language)
+        key = None
+        if cache is not None:
+            policy = _policy(chunk_size, fast_path, strategy, margin, windows, _scope(candidates, exclude, language))
+            key = file_key(policy, os.path.realpath(path), mapped.stat.st_size, mapped.stat.st_mtime_ns)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        result = detect(mapped.view, chunk_size=chunk_size, fast_path=fast_path, strategy=strategy, margin=margin,
+                        windows=windows, candidates=candidates, exclude=exclude, language=language)
+    if key is not None:
+        cache.set(key, result)
+    return result
+
+
+def convert_file(
+    path: str,
+    dst: Union[str, TextIO],
+    target_encoding: str = "utf-8",
+    chunk_size: Optional[int] = 1024 * 50,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    encoding: Optional[str] = None,
+    errors: str = "replace",
+    strategy: str = "head",
+) -> int:
+    """
+    Convert a file through a memory map, decoding straight from the mapping block by block.
+    通过内存映射转换文件，逐块直接从映射中解码。
+
+    Use Case (场景):
+    - Converting multi-GB files without ever holding the input in Python heap memory.
+    - 转换数 GB 的文件，而不必把输入放进 Python 堆内存。
+
+    Args:
+        path: Path to the source file. (源文件路径)
+        dst: Output path (written with target_encoding) or a text stream.
+             输出路径（以 target_encoding 写入）或文本流。
+        target_encoding: Encoding of the output file when dst is a path (default: utf-8).
+                         dst 为路径时输出文件的编码（默认：utf-8）。
+        chunk_size, strategy: Passed to detect(). (传给 detect())
+        block_size, encoding, errors: See iter_convert(). (参见 iter_convert())
+
+    Returns:
+        The number of characters written.
+        写入的字符数。
+    """
+    with _MappedFile(path) as mapped:
+        view = mapped.view
+        detected = encoding is None
+        if detected and view is not None:
+            encoding = detect(view, chunk_size=chunk_size, strategy=strategy)["encoding"]
+
+        out = open(dst, "w", encoding=target_encoding) if isinstance(dst, str) else dst
+        try:
+            if view is None:
+                return convert_stream(mapped.file, out, chunk_size=chunk_size, block_size=block_size,
+                                      encoding=encoding, errors=errors)
+            decoder = _StreamDecoder(encoding, view[:PROGRESSIVE_START].tobytes(), errors, chunk_size, detected)
+            written = 0
+            for offset in range(0, len(view), block_size):
+                started = instrument.clock()
+                text = decoder.decode(view[offset:offset + block_size])
+                instrument.emit("stream.decode", min(block_size, len(view) - offset), started)
+                out.write(text)
+                written += len(text)
+            text = decoder.decode(b"", final=True)
+            out.write(text)
+            written += len(text)
+        finally:
+            if out is not dst:
+                out.close()
+    return written
+
+def _iter_blocks(src: Union[bytes, memoryview, BinaryIO], block_size: int) -> Iterator[Union[bytes, memoryview]]:
+    if hasattr(src, "read"):
+        block = src.read(block_size)
+        while block:
+            yield block
+            block = src.read(block_size)
+    else:
+        view = memoryview(src)
+        for offset in range(0, len(view), block_size):
+            yield view[offset:offset + block_size]
+
+
+def iter_transcode(
+    src: Union[bytes, memoryview, BinaryIO],
+    target_encoding: str = "utf-8",
+    chunk_size: Optional[int] = 1024 * 50,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    encoding: Optional[str] = None,
+    errors: str = "replace",
+    strategy: str = "head",
+) -> Iterator[bytes]:
+    """
+    Re-encode bytes to target_encoding block by block, yielding encoded bytes.
+    逐块把字节重新编码为 target_encoding，依次产出编码后的字节。
+
+    When the source already uses the target codec, blocks are only validated and passed
+    through unchanged; from the first invalid byte on, they are decoded and re-encoded.
+    As in iter_convert(), an all-ASCII sample does not pin the encoding, and a detected
+    encoding is re-detected once at the first byte it cannot decode.
+    如果源编码与目标编码相同，各块只做校验后原样输出；从第一个非法字节开始，才解码并重新编码。
+    与 iter_convert() 一样，全是 ASCII 的样本不会固定编码，检测得到的编码在遇到第一个无法解码的字节时会重新检测一次。
+
+    Args:
+        src: bytes, a memoryview, or a binary file object (read from its current position).
+             字节串、memoryview，或二进制文件对象（从当前位置开始读取）。
+        target_encoding: Encoding of the output (default: utf-8). (输出的编码，默认：utf-8)
+        chunk_size, strategy: Passed to detect(). (传给 detect())
+        block_size, encoding: See iter_convert(). (参见 iter_convert())
+        errors: Error handler for undecodable input and unencodable output (default: replace).
+                无法解码的输入和无法编码的输出的错误处理方式（默认：replace）。
+
+    Yields:
+        Encoded byte blocks, in order. (按顺序产出的编码后字节块)
+    """
+    detected = encoding is None
+    seekable = not hasattr(src, "read") or src.seekable()
+    if detected and seekable:
+        encoding = detect(src, chunk_size=chunk_size, strategy=strategy)["encoding"]
+    blocks = _iter_blocks(src, block_size)
+    first = next(blocks, b"")
+    if detected and not seekable:
+        # A pipe cannot be rewound after sampling, so the sample comes from the first block
+        encoding = detect(first, chunk_size=chunk_size, strategy=strategy)["encoding"]
+    decoder = _StreamDecoder(encoding, bytes(first[:PROGRESSIVE_START]), errors, chunk_size, detected)
+    encoder = codecs.getincrementalencoder(target_encoding)(errors=errors)
+    # Strict decoder used only to validate blocks that are copied through
+    validator = None
+    if decoder.codec is not None and codecs.lookup(decoder.codec).name == codecs.lookup(target_encoding).name:
+        validator = codecs.getincrementaldecoder(decoder.codec)()
+
+    block = first
+    while block:
+        started = instrument.clock()
+        if validator is not None:
+            pending, flag = validator.getstate()
+            try:
+                validator.decode(block)
+            except UnicodeDecodeError:
+                # Re-decode from the last byte that was copied out (re-detecting a detected encoding)
+                decoder.setstate((pending, flag))
+                validator = None
+            else:
+                # Bytes of a character cut by the block edge are held back with the validator state
+                held = len(validator.getstate()[0])
+                data = pending + bytes(block) if pending else bytes(block)
+                yield data[:len(data) - held] if held else data
+                instrument.emit("transcode.copy", len(block), started)
+                block = next(blocks, b"")
+                continue
+        data = encoder.encode(decoder.decode(block))
+        if data:
+            yield data
+        instrument.emit("transcode.recode", len(block), started)
+        block = next(blocks, b"")
+
+    if validator is not None:
+        pending = validator.getstate()[0]
+        if not pending:
+            return
+        # The input ends inside a character
+        decoder.setstate(validator.getstate())
+    tail = encoder.encode(decoder.decode(b"", final=True), final=True)
+    if tail:
+        yield tail
+
+
+def transcode(
+    src: Union[bytes, memoryview, BinaryIO],
+    target_encoding: str = "utf-8",
+    dst: Optional[BinaryIO] = None,
+    chunk_size: Optional[int] = 1024 * 50,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    encoding: Optional[str] = None,
+    errors: str = "replace",
+    strategy: str = "head",
+) -> Union[bytes, int]:
+    """
+    Convert bytes in any encoding to bytes in target_encoding, without building the whole text.
+    把任意编码的字节转换为 target_encoding 编码的字节，而不构建完整的文本。
+
+    Use Case (场景):
+    - Pipelines that only need "any encoding in, UTF-8 or GB18030 out": no intermediate str
+      for the whole file, and no re-encoding at all when the source already is the target.
+    - 只需要“任意编码进，UTF-8 或 GB18030 出”的流水线：不为整个文件构建中间字符串，
+      源编码已经是目标编码时完全不重新编码。
+
+    Args:
+        src: bytes, a memoryview, or a binary file object. (字节串、memoryview 或二进制文件对象)
+        target_encoding: Encoding of the output (default: utf-8). (输出的编码，默认：utf-8)
+        dst: A binary stream to write to, e.g. sys.stdout.buffer. None returns the bytes.
+             要写入的二进制流，例如 sys.stdout.buffer。为 None 时返回字节串。
+        chunk_size, block_size, encoding, errors, strategy: See iter_transcode(). (参见 iter_transcode())
+
+    Returns:
+        The encoded bytes, or the number of bytes written when dst is given.
+        编码后的字节串；给定 dst 时返回写入的字节数。
+    """
+    blocks = iter_transcode(src, target_encoding, chunk_size=chunk_size, block_size=block_size,
+                            encoding=encoding, errors=errors, strategy=strategy)
+    if dst is None:
+        return b"".join(blocks)
+    written = 0
+    for data in blocks:
+        dst.write(data)
+        written += len(data)
+    return written
+
+
+def transcode_file(
+    path: str,
+    dst: Union[str, BinaryIO],
+    target_encoding: str = "utf-8",
+    chunk_size: Optional[int] = 1024 * 50,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    encoding: Optional[str] = None,
+    errors: str = "replace",
+    strategy: str = "head",
+) -> int:
+    """
+    Transcode a file through a memory map into a binary file or stream.
+    通过内存映射把文件转码写入二进制文件或流。
+
+    Args:
+        path: Path to the source file. (源文件路径)
+        dst: Output path or a binary stream such as sys.stdout.buffer. (输出路径或二进制流，例如 sys.stdout.buffer)
+        target_encoding, chunk_size, block_size, encoding, errors, strategy: See transcode(). (参见 transcode())
+
+    Returns:
+        The number of bytes written.
+        写入的字节数。
+    """
+    with _MappedFile(path) as mapped:
+        out = open(dst, "wb") if isinstance(dst, str) else dst
+        try:
+            return transcode(mapped.file if mapped.view is None else mapped.view, target_encoding, out, chunk_size=chunk_size, block_size=block_size,
+                             encoding=encoding, errors=errors, strategy=strategy)
+        finally:
+            if out is not dst:
+                out.close()
@@ -0,0 +1,154 @@
+import contextlib
+import threading
+import time
+from typing import Callable, Iterator, List, Optional
+
+# Upper bounds (ns) of the latency histogram buckets; the last bucket is open-ended
+HISTOGRAM_BOUNDS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000, 1_000_000_000)
+_BUCKET_NAMES = ("<=1us", "<=10us", "<=100us", "<=1ms", "<=10ms", "<=100ms", "<=1s", ">1s")
+
+_listeners = ()
+_listeners_lock = threading.Lock()
+
+# True while anyone is listening; instrumented code does nothing else when it is False
+_active = False
+
+
+class Stats:
+    """
+    Process-wide cumulative counters and latency histograms, per stage.
+    进程级的累计计数器和延迟直方图，按阶段统计。
+
+    Use Case (场景):
+    - Finding which stage (detection, decode, a fallback) takes the time in production,
+      without attaching a profiler (charset-util --stats ...).
+    - 在生产环境中找出时间花在哪个阶段（检测、解码、某个回退），而无需挂上性能分析器（charset-util --stats ...）。
+
+    Disabled by default; use the module-level `stats` instance.
+    默认关闭；使用模块级的 `stats` 实例。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._fallbacks = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+        _update_active()
+
+    def disable(self) -> None:
+        self.enabled = False
+        _update_active()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._fallbacks.clear()
+
+    def record(self, event: dict) -> None:
+        """Add one event to the counters. (把一个事件计入计数器)"""
+        elapsed = event["elapsed_ns"]
+        bucket = 0
+        while bucket < len(HISTOGRAM_BOUNDS) and elapsed > HISTOGRAM_BOUNDS[bucket]:
+            bucket += 1
+        with self._lock:
+            stage = self._stages.get(event["stage"])
+            if stage is None:
+                stage = self._stages[event["stage"]] = {"count": 0, "bytes": 0, "elapsed_ns": 0, "histogram": [0] * len(_BUCKET_NAMES)}
+            stage["count"] += 1
+            stage["bytes"] += event["bytes"]
+            stage["elapsed_ns"] += elapsed
+            stage["histogram"][bucket] += 1
+            if event["fallback"] is not None:
+                name = f"{event['stage']}:{event['fallback']}"
+                self._fallbacks[name] = self._fallbacks.get(name, 0) + 1
+
+    def snapshot(self) -> dict:
+        """
+        Copy of the counters: {'stages': {stage: {count, bytes, elapsed_ns, histogram}}, 'fallbacks': {'stage:fallback': count}}.
+        计数器的副本。
+        """
+        with self._lock:
+            stages = {
+                name: dict(stage, histogram=dict(zip(_BUCKET_NAMES, stage["histogram"])))
+                for name, stage in sorted(self._stages.items())
+            }
+            return {"stages": stages, "fallbacks": dict(sorted(self._fallbacks.items()))}
+
+
+stats = Stats()
+
+
+def _update_active() -> None:
+    global _active
+    _active = stats.enabled or bool(_listeners)
+
+
+def add_listener(listener: Callable[[dict], None]) -> None:
+    """
+    Register a callback that receives every event, from any thread.
+    注册一个回调，接收（来自任意线程的）每个事件。
+
+    Events are dicts with 'stage' (e.g. 'detect.statistical', 'convert.fallback'), 'bytes'
+    (characters for the text stages 'repair.*' and 'decode_escapes'), 'elapsed_ns' and
+    'fallback' (which fallback fired, or None).
+    事件是字典，包含 'stage'（例如 'detect.statistical'、'convert.fallback'）、'bytes'
+    （对文本阶段 'repair.*' 和 'decode_escapes' 为字符数）、'elapsed_ns' 和 'fallback'（触发了哪个回退，没有则为 None）。
+    """
+    global _listeners
+    with _listeners_lock:
+        _listeners = _listeners + (listener,)
+        _update_active()
+
+
+def remove_listener(listener: Callable[[dict], None]) -> None:
+    """Unregister a callback added with add_listener(). (注销用 add_listener() 注册的回调)"""
+    global _listeners
+    with _listeners_lock:
+        listeners = list(_listeners)
+        listeners.remove(listener)
+        _listeners = tuple(listeners)
+        _update_active()
+
+
+@contextlib.contextmanager
+def capture() -> Iterator[List[dict]]:
+    """
+    Collect the events emitted inside the block into a list.
+    把代码块内产生的事件收集到一个列表中。
+
+    The listener is process-wide, so events from other threads running at the same time are collected too.
+    监听是进程级的，因此同时运行的其他线程产生的事件也会被收集。
+    """
+    events = []
+    add_listener(events.append)
+    try:
+        yield events
+    finally:
+        remove_listener(events.append)
+
+
+def clock() -> int:
+    """Start time for emit(), or 0 when nobody is listening. (emit() 的起始时间；无人监听时为 0)"""
+    return time.perf_counter_ns() if _active else 0
+
+
+def emit(stage: str, nbytes: int, started: int, fallback: Optional[str] = None) -> None:
+    """
+    Report a finished stage that began at clock(). Costs one check when nobody is listening.
+    报告一个从 clock() 开始、已经完成的阶段。无人监听时只有一次判断的开销。
+    """
+    if not _active:
+        return
+    event = {
+        "stage": stage,
+        "bytes": nbytes,
+        "elapsed_ns": time.perf_counter_ns() - started if started else 0,
+        "fallback": fallback,
+    }
+    if stats.enabled:
+        stats.record(event)
+    for listener in _listeners:
+        listener(event)
@@ -0,0 +1,321 @@
+import codecs
+import re
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+from . import instrument
+from .encoding import DEFAULT_BLOCK_SIZE, PROGRESSIVE_START, _decoding_codec, _MappedFile, detect
+
+# Encoding of legacy lines that are not GB18030 and that nothing could be detected for
+SINGLE_BYTE_FALLBACK = "cp1252"
+
+# Bytes scanned per step when looking for the next encoding change
+SEGMENT_BLOCK_SIZE = 1024 * 64
+
+_ASCII = rb"[\x00-\x09\x0b-\x7f]"
+_UTF8_MULTIBYTE = (
+    rb"(?:[\xc2-\xdf][\x80-\xbf]|\xe0[\xa0-\xbf][\x80-\xbf]|[\xe1-\xec\xee\xef][\x80-\xbf]{2}"
+    rb"|\xed[\x80-\x9f][\x80-\xbf]|\xf0[\x90-\xbf][\x80-\xbf]{2}|[\xf1-\xf3][\x80-\xbf]{3}|\xf4[\x80-\x8f][\x80-\xbf]{2})"
+)
+
+# A whole line that is valid UTF-8 and not pure ASCII. The pattern is unambiguous, so a
+# failing line costs linear time, and the search runs in C over a whole legacy region.
+_UTF8_LINE = re.compile(rb"^" + _ASCII + rb"*(?:" + _UTF8_MULTIBYTE + _ASCII + rb"*)+$", re.M)
+
+# memoryview has no find(); regex searches work on any buffer
+_NEWLINE = re.compile(rb"\n")
+
+
+def _line_start(view: memoryview, start: int, offset: int) -> int:
+    """Start of the line containing offset (not before start)."""
+    while offset > start and view[offset - 1] != 0x0A:
+        offset -= 1
+    return offset
+
+
+def _window_end(view: memoryview, start: int, size: int) -> int:
+    """End of a window of about size bytes from start, moved forward to a line end."""
+    end = start + size
+    if end >= len(view):
+        return len(view)
+    newline = _NEWLINE.search(view, end)
+    return newline.end() if newline else len(view)
+
+
+def _utf8_end(view: memoryview, start: int, block_size: int) -> int:
+    """Offset of the first invalid UTF-8 byte at or after start (len(view) if there is none)."""
+    pos = start
+    while pos < len(view):
+        try:
+            _, consumed = codecs.utf_8_decode(view[pos:pos + block_size], "strict", False)
+        except UnicodeDecodeError as e:
+            return pos + e.start
+        if consumed == 0:
+            # A sequence cut by the end of the input
+            return pos
+        pos += consumed
+    return pos
+
+
+def _legacy_end(view: memoryview, start: int, block_size: int) -> int:
+    """Start of the first non-ASCII UTF-8 line at or after start (len(view) if there is none)."""
+    pos = start
+    while pos < len(view):
+        end = _window_end(view, pos, block_size)
+        match = _UTF8_LINE.search(view, pos, end)
+        if match:
+            return match.start()
+        pos = end
+    return pos
+
+
+def _decodes_strict(data: Union[bytes, memoryview], encoding: str, block_size: int = DEFAULT_BLOCK_SIZE) -> bool:
+    """Whether data decodes strictly with encoding, checked block by block so no full copy is made."""
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        for offset in range(0, len(data), block_size):
+            decoder.decode(data[offset:offset + block_size])
+        decoder.decode(b"", final=True)
+        return True
+    except (UnicodeDecodeError, LookupError):
+        return False
+
+
+def _detected(result: dict, data: memoryview) -> Optional[str]:
+    """The detected encoding, unless there is none or it cannot decode data."""
+    encoding = result["encoding"]
+    return encoding if encoding is not None and _decodes_strict(data, encoding) else None
+
+
+def _split_legacy(view: memoryview, start: int, end: int) -> List[Tuple[int, int, bool]]:
+    """
+    Split a legacy region into groups of lines that do or do not decode strictly as GB18030.
+    把传统编码区域切分为若干组连续的行：能或不能严格按 GB18030 解码。
+    """
+    groups = []
+    pos = start
+    while pos < end:
+        newline = _NEWLINE.search(view, pos, end)
+        line_end = newline.end() if newline else end
+        gb18030 = _decodes_strict(view[pos:line_end], "gb18030")
+        if groups and groups[-1][2] == gb18030:
+            groups[-1] = (groups[-1][0], line_end, gb18030)
+        else:
+            groups.append((pos, line_end, gb18030))
+        pos = line_end
+    return groups
+
+
+def _legacy_runs(view: memoryview, start: int, end: int, chunk_size: Optional[int]) -> List[dict]:
+    """
+    Runs for a legacy region: one detection, or, when it gives no codec that decodes the whole
+    region, one per group of lines.
+    传统编码区域的段：检测一次；没有得到能解码整个区域的编码时，按行分组分别处理。
+
+    A detected codec that decodes the region is kept whatever its confidence: charset_normalizer
+    reports 0.0 for correct Shift-JIS or EUC-KR answers, whose lines mostly decode as GB18030 too.
+    Adjacent GBK and cp1252 lines defeat a single detection. Lines that decode strictly as
+    GB18030 are taken as GB18030, as convert() does when nothing was detected; the other lines
+    are detected on their own, and fall back to SINGLE_BYTE_FALLBACK (method 'fallback').
+    能解码该区域的检测结果无论置信度如何都会保留：charset_normalizer 对正确的 Shift-JIS 或 EUC-KR 结果
+    也会给出 0.0，而这些行大多也能按 GB18030 解码。
+    相邻的 GBK 行和 cp1252 行会让单次检测失败。能严格按 GB18030 解码的行按 GB18030 处理，
+    与 convert() 未检测到编码时一致；其余行单独检测，检测不出时使用 SINGLE_BYTE_FALLBACK（method 为 'fallback'）。
+    """
+    result = detect(view[start:end], chunk_size=chunk_size)
+    if _detected(result, view[start:end]) is not None:
+        return [{"start": start, "end": end, "encoding": result["encoding"],
+                 "confidence": result["confidence"], "method": result["method"]}]
+    runs = []
+    for group_start, group_end, gb18030 in _split_legacy(view, start, end):
+        if gb18030:
+            runs.append({"start": group_start, "end": group_end, "encoding": "gb18030",
+                         "confidence": 0.0, "method": "gb18030-strict"})
+            continue
+        result = detect(view[group_start:group_end], chunk_size=chunk_size)
+        if _detected(result, view[group_start:group_end]) is None:
+            result = {"encoding": SINGLE_BYTE_FALLBACK, "confidence": 0.0, "method": "fallback"}
+        runs.append({"start": group_start, "end": group_end, "encoding": result["encoding"],
+                     "confidence": result["confidence"], "method": result["method"]})
+    return runs
+
+
+def segment_detect(
+    content: Union[bytes, memoryview],
+    block_size: int = SEGMENT_BLOCK_SIZE,
+    chunk_size: Optional[int] = 1024 * 50,
+) -> List[dict]:
+    """
+    Split content that mixes encodings (e.g. concatenated logs) into runs of one encoding each.
+    把混合了多种编码的内容（例如拼接的日志）切分为若干段，每段只有一种编码。
+
+    Use Case (场景):
+    - Log aggregates where UTF-8 lines sit next to GBK or cp1252 lines: detect() can only
+      give one answer for the whole sample, so convert() mangles part of the file.
+    - UTF-8 行与 GBK、cp1252 行混在一起的日志汇总：detect() 只能对整个样本给出一个答案，
+      convert() 因此会弄乱文件的一部分。
+
+    UTF-8 regions are found with a strict decode, and legacy regions with a C regex search for
+    the next valid non-ASCII UTF-8 line, so the scan runs at C speed and boundaries fall on
+    line starts. Only the legacy runs go through the statistical detector, on a sample of
+    chunk_size bytes each. The cost grows with the number of encoding changes, not with the
+    number of lines. A legacy run without a coherent answer (e.g. GBK lines next to cp1252
+    lines) is split into lines that decode as GB18030 and lines that are detected on their own.
+    UTF-8 区域通过严格解码找出，传统编码区域则用 C 实现的正则搜索下一个合法的非 ASCII UTF-8 行，
+    因此扫描以 C 的速度进行，边界总是落在行首。只有传统编码的段会交给统计检测器，
+    每段只采样 chunk_size 字节。开销随编码切换的次数增长，而不是随行数增长。
+    没有可信检测结果的传统编码段（例如 GBK 行与 cp1252 行相邻）会被拆分为能按 GB18030 解码的行
+    和需要单独检测的行。
+
+    Args:
+        content: The bytes to analyse (a memoryview, e.g. of a memory map, is not copied).
+                 要分析的字节（memoryview，例如内存映射，不会被复制）。
+        block_size: Bytes scanned per step. (每步扫描的字节数)
+        chunk_size: Bytes sampled from each legacy run for detection. (每个传统编码段用于检测的采样字节数)
+
+    Returns:
+        Runs in order, each a dict with 'start', 'end', 'encoding', 'confidence' and 'method'
+        ('ascii', 'utf8-strict', 'gb18030-strict', 'fallback', or the method detect() used for a
+        legacy run).
+        按顺序排列的段，每段是包含 'start'、'end'、'encoding'、'confidence' 和 'method'
+        （'ascii'、'utf8-strict'、'gb18030-strict'、'fallback'，或 detect() 对传统编码段使用的方法）的字典。
+    """
+    view = memoryview(content).cast("B")
+
+    if b"\x00" in bytes(view[:PROGRESSIVE_START]):
+        # UTF-16/32 is not ASCII-compatible and cannot be split by lines
+        result = detect(view, chunk_size=chunk_size)
+        return [{"start": 0, "end": len(view), "encoding": result["encoding"],
+                 "confidence": result["confidence"], "method": result["method"]}] if len(view) else []
+
+    runs = []
+    pos = 0
+    while pos < len(view):
+        started = instrument.clock()
+        end = _line_start(view, pos, _utf8_end(view, pos, block_size))
+        if end > pos:
+            ascii_only = bytes(view[pos:end]).isascii()
+            runs.append({"start": pos, "end": end, "encoding": "ascii" if ascii_only else "utf_8",
+                         "confidence": 1.0, "method": "ascii" if ascii_only else "utf8-strict"})
+            instrument.emit("segment.utf8", end - pos, started)
+            pos = end
+            if pos >= len(view):
+                break
+
+        started = instrument.clock()
+        end = _legacy_end(view, pos, block_size)
+        if end == pos:
+            # Always move forward by at least one line
+            end = _window_end(view, pos, 0)
+        runs.extend(_legacy_runs(view, pos, end, chunk_size))
+        instrument.emit("segment.legacy", end - pos, started)
+        pos = end
+
+    # Neighbouring runs can share an encoding, e.g. two legacy runs around a one-line false UTF-8 match
+    merged = []
+    for run in runs:
+        if merged and merged[-1]["encoding"] == run["encoding"]:
+            merged[-1]["end"] = run["end"]
+        else:
+            merged.append(run)
+    return merged
+
+
+def iter_convert_mixed(
+    content: Union[bytes, memoryview],
+    runs: Optional[List[dict]] = None,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    errors: str = "replace",
+) -> Iterator[str]:
+    """
+    Decode each run with its own codec, block by block, yielding pieces of text.
+    用各段自己的编解码器逐块解码，依次产出文本片段。
+
+    Args:
+        content: The bytes to decode. (要解码的字节)
+        runs: Output of segment_detect() for this content (computed when omitted).
+              该内容的 segment_detect() 结果（省略时自动计算）。
+        block_size: Bytes decoded per step. (每步解码的字节数)
+        errors: Error handler for undecodable bytes (default: replace). (无法解码字节的错误处理方式，默认：replace)
+
+    Yields:
+        Decoded text pieces, in order. (按顺序产出的解码文本片段)
+    """
+    view = memoryview(content).cast("B")
+    if runs is None:
+        runs = segment_detect(view)
+    for run in runs:
+        start, end = run["start"], run["end"]
+        codec = _decoding_codec(run["encoding"], bytes(view[start:start + 4]))
+        decoder = codecs.getincrementaldecoder(codec)(errors=errors)
+        for offset in range(start, end, block_size):
+            text = decoder.decode(view[offset:min(offset + block_size, end)])
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+def convert_mixed(
+    content: Union[bytes, memoryview],
+    block_size: int = SEGMENT_BLOCK_SIZE,
+    chunk_size: Optional[int] = 1024 * 50,
+    errors: str = "replace",
+) -> Tuple[str, List[dict]]:
+    """
+    Convert content that mixes encodings, decoding each run with its own codec.
+    转换混合了多种编码的内容，每段用自己的编解码器解码。
+
+    Args:
+        content: The bytes to convert. (要转换的字节)
+        block_size, chunk_size: See segment_detect(). (参见 segment_detect())
+        errors: Error handler for undecodable bytes (default: replace). (无法解码字节的错误处理方式，默认：replace)
+
+    Returns:
+        The decoded string and the runs (see segment_detect()).
+        解码后的字符串，以及各段信息（见 segment_detect()）。
+    """
+    runs = segment_detect(content, block_size=block_size, chunk_size=chunk_size)
+    return "".join(iter_convert_mixed(content, runs, errors=errors)), runs
+
+
+def transcode_mixed_file(
+    path: str,
+    dst: Union[str, BinaryIO],
+    target_encoding: str = "utf-8",
+    block_size: int = SEGMENT_BLOCK_SIZE,
+    chunk_size: Optional[int] = 1024 * 50,
+    errors: str = "replace",
+) -> List[dict]:
+    """
+    Transcode a file that mixes encodings through a memory map into a binary file or stream.
+    通过内存映射把混合了多种编码的文件转码写入二进制文件或流。
+
+    Runs are found by looking back and ahead, so a pipe or FIFO is read into memory first.
+    各段需要前后查看才能确定，因此管道或 FIFO 会先被整个读入内存。
+
+    Args:
+        path: Path to the source file. (源文件路径)
+        dst: Output path or a binary stream such as sys.stdout.buffer. (输出路径或二进制流，例如 sys.stdout.buffer)
+        target_encoding: Encoding of the output; unencodable characters are replaced. (输出编码；无法编码的字符会被替换)
+        block_size, chunk_size: See segment_detect(). (参见 segment_detect())
+        errors: Error handler for undecodable bytes (default: replace). (无法解码字节的错误处理方式，默认：replace)
+
+    Returns:
+        The runs (see segment_detect()).
+        各段信息（见 segment_detect()）。
+    """
+    with _MappedFile(path) as mapped:
+        view = mapped.view if mapped.view is not None else memoryview(mapped.file.read())
+        runs = segment_detect(view, block_size=block_size, chunk_size=chunk_size)
+        encoder = codecs.getincrementalencoder(target_encoding)(errors="replace")
+        out = open(dst, "wb") if isinstance(dst, str) else dst
+        try:
+            for text in iter_convert_mixed(view, runs, errors=errors):
+                out.write(encoder.encode(text))
+            # Stateful targets (e.g. UTF-16, ISO-2022) may still hold bytes to end the output
+            out.write(encoder.encode("", final=True))
+        finally:
+            if out is not dst:
+                out.close()
+    return runs
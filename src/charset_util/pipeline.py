@@ -0,0 +1,145 @@
+import codecs
+import time
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .encoding import DEFAULT_BLOCK_SIZE, iter_convert
+from .recovery import iter_decode_unicode_escapes, iter_repair_mojibake
+
+# Text stages, by step name; 'convert' (decoding) is always the first stage
+TEXT_STAGES: Dict[str, Callable[[Iterable[str]], Iterator[str]]] = {
+    "repair": iter_repair_mojibake,
+    "unescape": iter_decode_unicode_escapes,
+}
+STEPS = ("convert",) + tuple(TEXT_STAGES)
+
+
+class Pipeline:
+    """
+    Decode a byte stream and run it through text stages, chunk by chunk, in one read.
+    解码字节流并让它逐块流过各个文本阶段，只读取一遍。
+
+    Use Case (场景):
+    - Cleaning a large export in one go (decode, repair mojibake, decode escapes) without
+      a full read, a whole-file string and a temporary file per step.
+    - 一次性清洗大型导出文件（解码、修复乱码、解码转义），而不必每一步都完整读取一遍、
+      生成整个文件的字符串和临时文件。
+
+    Every stage is a generator over text chunks that holds back what it cannot finish yet
+    (a partial line, a cut escape), so memory stays bounded by the block size and the output
+    equals running the steps one after another on the whole file.
+    每个阶段都是处理文本块的生成器，会把暂时无法处理完的部分（不完整的行、被切开的转义）留到下一块，
+    因此内存受块大小限制，输出与对整个文件依次执行各步骤的结果相同。
+
+    Args:
+        steps: Step names in order, from STEPS. 'convert' may be omitted: decoding always comes first.
+               按顺序排列的步骤名，取自 STEPS。'convert' 可以省略：解码总是第一步。
+        target_encoding: Encoding of the output bytes (default: utf-8). (输出字节的编码，默认：utf-8)
+        chunk_size, block_size, encoding, errors: See iter_convert(). (参见 iter_convert())
+    """
+
+    def __init__(
+        self,
+        steps: Sequence[str] = STEPS,
+        target_encoding: str = "utf-8",
+        chunk_size: Optional[int] = 1024 * 50,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        encoding: Optional[str] = None,
+        errors: str = "replace",
+    ):
+        steps = list(steps)
+        if steps and steps[0] == "convert":
+            steps = steps[1:]
+        for step in steps:
+            if step not in TEXT_STAGES:
+                if step == "convert":
+                    raise ValueError("'convert' can only be the first step")
+                raise ValueError(f"Unknown step: {step!r} (expected one of {', '.join(STEPS)})")
+        codecs.lookup(target_encoding)
+        self.steps = ["convert"] + steps
+        self.target_encoding = target_encoding
+        self.chunk_size = chunk_size
+        self.block_size = block_size
+        self.encoding = encoding
+        self.errors = errors
+        self._cumulative: Dict[str, List[int]] = {}
+
+    def _timed(self, name: str, chunks: Iterator, size: Callable = len) -> Iterator:
+        """Yield from chunks, adding the time spent producing each one (upstream included) to name."""
+        totals = self._cumulative[name] = [0, 0]
+        while True:
+            started = time.perf_counter_ns()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                totals[0] += time.perf_counter_ns() - started
+                return
+            totals[0] += time.perf_counter_ns() - started
+            totals[1] += size(chunk)
+            yield chunk
+
+    def iter_text(self, src: BinaryIO) -> Iterator[str]:
+        """
+        Decode src and yield the text coming out of the last stage.
+        解码 src，产出最后一个阶段输出的文本。
+        """
+        self._cumulative = {}
+        chunks = self._timed("convert", iter_convert(
+            src, chunk_size=self.chunk_size, block_size=self.block_size, encoding=self.encoding, errors=self.errors,
+        ))
+        for step in self.steps[1:]:
+            chunks = self._timed(step, TEXT_STAGES[step](chunks))
+        return chunks
+
+    def iter_bytes(self, src: BinaryIO) -> Iterator[bytes]:
+        """
+        Like iter_text(), then encoded to target_encoding.
+        与 iter_text() 相同，再编码为 target_encoding。
+        """
+        encoder = codecs.getincrementalencoder(self.target_encoding)(errors="replace")
+
+        def encode(chunks: Iterator[str]) -> Iterator[bytes]:
+            for text in chunks:
+                data = encoder.encode(text)
+                if data:
+                    yield data
+            tail = encoder.encode("", final=True)
+            if tail:
+                yield tail
+
+        return self._timed("encode", encode(self.iter_text(src)))
+
+    def run(self, src: BinaryIO, dst: BinaryIO) -> int:
+        """
+        Stream src through the pipeline into dst.
+        让 src 流过整个流水线，写入 dst。
+
+        Args:
+            src: A binary file object to read from. (可读的二进制文件对象)
+            dst: A binary file object to write to, e.g. sys.stdout.buffer. (可写的二进制文件对象，例如 sys.stdout.buffer)
+
+        Returns:
+            The number of bytes written. (写入的字节数)
+        """
+        written = 0
+        for data in self.iter_bytes(src):
+            dst.write(data)
+            written += len(data)
+        return written
+
+    def timings(self) -> Dict[str, dict]:
+        """
+        Per-stage time of the last run: {stage: {'elapsed_ns', 'output'}}, where 'output' counts
+        characters ('encode': bytes) and 'convert' includes reading the source.
+        上一次运行中每个阶段的耗时：{阶段: {'elapsed_ns', 'output'}}，其中 'output' 为字符数
+        （'encode' 为字节数），'convert' 包含读取源文件的时间。
+        """
+        result = {}
+        upstream = 0
+        for name in self.steps + ["encode"]:
+            if name not in self._cumulative:
+                continue
+            elapsed, output = self._cumulative[name]
+            # Each stage pulls from the one before it, so its own time is the difference
+            result[name] = {"elapsed_ns": max(elapsed - upstream, 0), "output": output}
+            upstream = elapsed
+        return result
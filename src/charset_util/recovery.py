@@ -1,23 +1,259 @@
-import ftfy
+import codecs
 import re
-from typing import List
+from typing import Iterable, Iterator, List, Pattern, Tuple
 
-def repair_mojibake(text: str) -> str:
+from . import instrument
+
+# Maximum characters sent to ftfy in one piece (and to one worker)
+DEFAULT_SEGMENT_SIZE = 64 * 1024
+
+# What UTF-8 looks like after being mis-decoded as Latin-1/cp1252: a lead byte (U+00C2-U+00F4)
+# followed by a continuation byte (U+0080-U+00BF, or its cp1252 picture such as € ™ œ),
+# or a stray C1 control character.
+_CP1252_CONTINUATION = (
+    '\u0080-\u00bf\u0152\u0153\u0160\u0161\u0178\u017d\u017e\u0192\u02c6\u02dc'
+    '\u2013\u2014\u2018-\u201a\u201c-\u201e\u2020-\u2022\u2026\u2030\u2039\u203a\u20ac\u2122'
+)
+_MOJIBAKE_SUSPECT = re.compile('[\u00c2-\u00f4][' + _CP1252_CONTINUATION + ']|[\u0080-\u009f]')
+
+# HTML entities such as "&lt;" or "&#233;", which ftfy also decodes
+_HTML_ENTITY = '&(?:[a-zA-Z][a-zA-Z0-9]*|#[0-9]+|#[xX][0-9a-fA-F]+);'
+
+# The full pre-screen, built on first use (it needs ftfy)
+_screen = None
+
+
+def _screen_patterns() -> Tuple[Pattern, Pattern, Pattern]:
+    """
+    The pre-screen: the Latin-1/cp1252 pattern above or an HTML entity (group 'sure'), or any
+    non-ASCII character; the 'sure' part alone; and ftfy's badness heuristic. The heuristic
+    also catches cp1251, cp1253, mac_roman and box-drawing (cp437) mojibake, but it is about ten
+    times slower, so it only runs on lines holding a non-ASCII character.
+    预筛模式：上面的 Latin-1/cp1252 模式或 HTML 实体（分组 'sure'），或任一非 ASCII 字符；
+    'sure' 部分本身；以及 ftfy 的 badness 启发式规则。它还能识别 cp1251、cp1253、mac_roman 和制表符（cp437）乱码，
+    但要慢十倍左右，因此只在包含非 ASCII 字符的行上运行。
+    """
+    global _screen
+    if _screen is None:
+        from ftfy.badness import BADNESS_RE
+        sure = _MOJIBAKE_SUSPECT.pattern + '|' + _HTML_ENTITY
+        screen = re.compile('(?P<sure>' + sure + ')|[^\x00-\x7f]')
+        _screen = screen, re.compile(sure), BADNESS_RE
+    return _screen
+
+
+def _suspect_segments(text: str, segment_size: int) -> List[Tuple[int, int]]:
+    """
+    Find the line-aligned spans of text that may contain mojibake.
+    找出可能包含乱码的、按行对齐的文本区间。
+
+    Each hit of the pre-screen pattern is widened to its whole line; adjacent lines
+    are merged into segments of at most about segment_size characters.
+    预筛模式的每个命中都会扩展到整行；相邻的行会合并为大约不超过 segment_size 个字符的片段。
+    """
+    screen, sure, badness = _screen_patterns()
+    segments = []
+    pos = 0
+    match = screen.search(text)
+    while match:
+        start = text.rfind('\n', 0, match.start()) + 1
+        end = text.find('\n', match.end())
+        end = len(text) if end == -1 else end + 1
+        if match.group('sure') is None and not (sure.search(text, match.end(), end) or badness.search(text[start:end])):
+            match = screen.search(text, end)
+            continue
+        if segments and segments[-1][1] == start and end - segments[-1][0] <= segment_size:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+        pos = end
+        match = screen.search(text, pos)
+    return segments
+
+
+def _line_segments(text: str, segment_size: int) -> List[Tuple[int, int]]:
+    """Split the whole text into line-aligned segments of about segment_size characters."""
+    segments = []
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start + segment_size)
+        end = len(text) if end == -1 else end + 1
+        segments.append((start, end))
+        start = end
+    return segments
+
+
+def repair_mojibake_report(
+    text: str,
+    workers: int = 1,
+    segment_size: int = DEFAULT_SEGMENT_SIZE,
+    prescreen: bool = True,
+) -> Tuple[str, dict]:
+    """
+    Repair mojibake like repair_mojibake(), and report what was done.
+    与 repair_mojibake() 一样修复乱码，并报告处理情况。
+
+    A cheap regex pre-screen finds the lines that look like mis-decoded UTF-8 (Latin-1/cp1252
+    mojibake such as "Ã©" or "â€™", C1 control characters, whatever ftfy's badness heuristic
+    flags, e.g. "РџСЂРёРІРµС‚" or "Gr√º√üe") or that hold HTML entities. Only those lines are
+    sent to ftfy; clean text passes through untouched, including the quote, width and
+    line-break normalisations ftfy would otherwise apply.
+    廉价的正则预筛会找出看起来像被错误解码的 UTF-8 的行（如 "Ã©"、"â€™" 这样的 Latin-1/cp1252 乱码、
+    C1 控制字符，以及 ftfy 的 badness 启发式规则标记的内容，例如 "РџСЂРёРІРµС‚" 或 "Gr√º√üe"），
+    或包含 HTML 实体的行。只有这些行会交给 ftfy；干净的文本原样保留，ftfy 原本会做的引号、全角半角和换行规范化也不会发生。
+
+    Args:
+        text: The string containing potential mojibake. (包含潜在乱码的字符串)
+        workers: Processes used to repair segments in parallel (default: 1, in this process).
+                 并行修复片段所用的进程数（默认：1，在当前进程中）。
+        segment_size: Approximate characters per segment; segments always end at a line break.
+                      每个片段大约的字符数；片段总是在换行处结束。
+        prescreen: Set to False to send the whole text to ftfy (still segmented).
+                   设置为 False 则把整个文本都交给 ftfy（仍然分片段）。
+
+    Returns:
+        The fixed string, and a report with 'segments' (sent to ftfy), 'changed' (segments
+        ftfy modified), 'chars_screened' and 'chars_repaired'.
+        修复后的字符串，以及包含 'segments'（交给 ftfy 的片段数）、'changed'（被 ftfy 修改的片段数）、
+        'chars_screened'（筛查的字符数）和 'chars_repaired'（交给 ftfy 的字符数）的报告。
+    """
+    # Imported here: ftfy is slow to load and unescaping never needs it
+    import ftfy
+
+    started = instrument.clock()
+    if prescreen:
+        segments = _suspect_segments(text, segment_size)
+    else:
+        segments = _line_segments(text, segment_size)
+    pieces = [text[start:end] for start, end in segments]
+    instrument.emit("repair.screen", len(text), started)
+
+    started = instrument.clock()
+    if workers > 1 and len(pieces) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            fixed = list(pool.map(ftfy.fix_text, pieces))
+    else:
+        fixed = [ftfy.fix_text(piece) for piece in pieces]
+    instrument.emit("repair.fix", sum(len(piece) for piece in pieces), started)
+
+    output = []
+    pos = 0
+    changed = 0
+    for (start, end), before, after in zip(segments, pieces, fixed):
+        output.append(text[pos:start])
+        output.append(after)
+        pos = end
+        if after != before:
+            changed += 1
+    output.append(text[pos:])
+
+    report = {
+        "segments": len(segments),
+        "changed": changed,
+        "chars_screened": len(text),
+        "chars_repaired": sum(len(piece) for piece in pieces),
+    }
+    return "".join(output), report
+
+
+def repair_mojibake(text: str, workers: int = 1) -> str:
     """
     Fix text that is broken due to encoding mix-ups (mojibake).
     修复因编码混淆（乱码）导致的损坏文本。
     
     This function uses ftfy (Fixes Text For You) to repair strings that were 
     decoded with the wrong encoding (e.g., utf-8 decoded as latin-1).
+    Only lines that look like mojibake are sent to ftfy; see repair_mojibake_report().
     此函数使用 ftfy 库来修复被错误解码的字符串（例如：将 UTF-8 误认为 Latin-1 解码）。
+    只有看起来像乱码的行才会交给 ftfy；参见 repair_mojibake_report()。
     
     Args:
         text: The string containing potential mojibake. (包含潜在乱码的字符串)
+        workers: Processes used for large inputs (default: 1). (处理大文本时使用的进程数，默认：1)
         
     Returns:
         The fixed string. (修复后的字符串)
     """
-    return ftfy.fix_text(text)
+    return repair_mojibake_report(text, workers=workers)[0]
+
+
+def iter_repair_mojibake(
+    chunks: Iterable[str],
+    segment_size: int = DEFAULT_SEGMENT_SIZE,
+    prescreen: bool = True,
+) -> Iterator[str]:
+    """
+    Streaming version of repair_mojibake() for text that arrives in chunks.
+    repair_mojibake() 的流式版本，用于分块到达的文本。
+
+    Repairs work line by line, so a partial last line is held back until the next chunk
+    completes it. A line longer than segment_size is cut after its last space so far.
+    修复按行进行，因此末尾不完整的行会留到下一块补全后再处理。
+    超过 segment_size 的行会在目前最后一个空格之后切开。
+
+    Args:
+        chunks: An iterable of text chunks. (文本块的可迭代对象)
+        segment_size, prescreen: See repair_mojibake_report(). (参见 repair_mojibake_report())
+
+    Yields:
+        Repaired text pieces, in order. (按顺序产出的修复后文本片段)
+    """
+    carry = ""
+    for chunk in chunks:
+        buffer = carry + chunk if carry else chunk
+        cut = buffer.rfind('\n') + 1
+        if not cut and len(buffer) >= segment_size:
+            # A very long line: cut after a space, which is never part of a mis-decoded sequence
+            cut = buffer.rfind(' ') + 1 or len(buffer)
+        if cut:
+            yield repair_mojibake_report(buffer[:cut], segment_size=segment_size, prescreen=prescreen)[0]
+        carry = buffer[cut:]
+    if carry:
+        yield repair_mojibake_report(carry, segment_size=segment_size, prescreen=prescreen)[0]
+
+# A run of consecutive escapes is decoded in one go (the shared leading backslash lets
+# the regex engine skip ahead to candidates quickly):
+#   group 1: \uXXXX run (UTF-16 code units, so surrogate pairs combine)
+#   group 2: \xNN run (bytes, decoded as UTF-8 where valid, Latin-1 otherwise)
+#   group 3: \UXXXXXXXX (a full code point)
+# Only the backslash right before the escape letter is consumed, so "\\u0041" becomes "\A".
+_ESCAPE_RUN = re.compile(
+    r'\\(?:'
+    r'u([0-9a-fA-F]{4}(?:\\u[0-9a-fA-F]{4})*)'
+    r'|x([0-9a-fA-F]{2}(?:\\x[0-9a-fA-F]{2})*)'
+    r'|U([0-9a-fA-F]{8})'
+    r')'
+)
+
+# An escape cut off by the end of a chunk
+_PARTIAL_ESCAPE = re.compile(r'\\(?:u[0-9a-fA-F]{0,3}|x[0-9a-fA-F]?|U[0-9a-fA-F]{0,7})?\Z')
+_HEX2 = re.compile(r'[0-9a-fA-F]{2}\Z')
+_HEX4 = re.compile(r'[0-9a-fA-F]{4}\Z')
+
+
+def _latin1_fallback(error: UnicodeDecodeError):
+    # Bytes that are not valid UTF-8 stand for the Latin-1 character with the same value
+    return error.object[error.start:error.end].decode('latin-1'), error.end
+
+
+codecs.register_error('charset_util.latin1_fallback', _latin1_fallback)
+
+
+def _decode_run(match) -> str:
+    run = match.group(1)
+    if run is not None:
+        if len(run) == 4:
+            return chr(int(run, 16))
+        return bytes.fromhex(run.replace('\\u', '')).decode('utf-16-be', 'surrogatepass')
+    run = match.group(2)
+    if run is not None:
+        if len(run) == 2 and run < '80':
+            return chr(int(run, 16))
+        return bytes.fromhex(run.replace('\\x', '')).decode('utf-8', 'charset_util.latin1_fallback')
+    code_point = int(match.group(3), 16)
+    return chr(code_point) if code_point <= 0x10FFFF else match.group(0)
+
 
 def decode_unicode_escapes(text: str) -> str:
     """
@@ -27,6 +263,13 @@ def decode_unicode_escapes(text: str) -> str:
     
     This is useful for texts that contain raw unicode escapes mixed with other content.
     对于混合了原始 Unicode 转义符和其他内容的文本非常有用。
+
+    Supported escapes (支持的转义):
+    - \\uXXXX: UTF-16 code units; surrogate pairs like \\uD83D\\uDE00 become one character.
+      UTF-16 码元；\\uD83D\\uDE00 这样的代理对会合并为一个字符。
+    - \\UXXXXXXXX: a full code point. (完整码点)
+    - \\xNN: bytes; runs that form valid UTF-8 are decoded as UTF-8, other bytes as Latin-1.
+      字节；能组成合法 UTF-8 的连续字节按 UTF-8 解码，其余字节按 Latin-1 解码。
     
     Args:
         text: Input string containing potential unicode escapes.
@@ -34,26 +277,71 @@ def decode_unicode_escapes(text: str) -> str:
     Returns:
         String with unicode escapes decoded.
     """
-    # Pattern to match \u followed by 4 hex digits
-    # We use a lambda in sub to decode each match individually
-    
-    # Logic:
-    # 1. Match literal \u followed by 4 hex digits.
-    # 2. Convert hex to char.
-    # 3. Replace in string.
-    
-    def replace_match(match):
-        escape_seq = match.group(0) # e.g. \u4f60
-        try:
-            # We encode to ascii (escaping non-ascii) then decode using unicode_escape
-            # But simpler: just take the hex part and chr() it.
-            hex_val = match.group(1)
-            return chr(int(hex_val, 16))
-        except:
-            return escape_seq
-
-    # Pattern: backslash u followed by 4 hex chars
-    # We allow 1 or 2 backslashes to handle double-escaped sequences (common in some JSON dumps)
-    pattern = re.compile(r'\\{1,2}u([0-9a-fA-F]{4})')
-    
-    return pattern.sub(replace_match, text)
+    if '\\' not in text:
+        return text
+    started = instrument.clock()
+    # Consecutive escapes are matched as one run and decoded with a single codec call
+    decoded = _ESCAPE_RUN.sub(_decode_run, text)
+    instrument.emit("decode_escapes", len(text), started)
+    return decoded
+
+
+def _safe_cut(buffer: str) -> int:
+    """
+    Where to split a chunk so that no escape, surrogate pair or UTF-8 byte sequence is cut in half.
+    计算块的切分位置，保证不会切断转义序列、代理对或 UTF-8 字节序列。
+    """
+    cut = len(buffer)
+    last = buffer.rfind('\\', max(0, cut - 9))
+    if last != -1 and _PARTIAL_ESCAPE.match(buffer, last):
+        cut = last
+
+    # A high surrogate waits for its low surrogate
+    if cut >= 6 and buffer[cut - 6:cut - 4] == '\\u' and _HEX4.match(buffer, cut - 4, cut):
+        if 0xD800 <= int(buffer[cut - 4:cut], 16) <= 0xDBFF:
+            return cut - 6
+
+    # An unfinished UTF-8 sequence in a \xNN run waits for its continuation bytes
+    tail = []
+    pos = cut
+    while len(tail) < 3 and pos >= 4 and buffer[pos - 4:pos - 2] == '\\x' and _HEX2.match(buffer, pos - 2, pos):
+        pos -= 4
+        tail.insert(0, (pos, int(buffer[pos + 2:pos + 4], 16)))
+    for i in range(len(tail) - 1, -1, -1):
+        start, byte = tail[i]
+        if byte >= 0xC0:
+            needed = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            if len(tail) - i < needed:
+                return start
+            break
+        if byte < 0x80:
+            break
+    return cut
+
+
+def iter_decode_unicode_escapes(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Streaming version of decode_unicode_escapes() for text that arrives in chunks.
+    decode_unicode_escapes() 的流式版本，用于分块到达的文本。
+
+    Escapes, surrogate pairs and \\xNN UTF-8 sequences split across chunk boundaries are
+    held back until the next chunk, so the joined output equals decode_unicode_escapes()
+    of the joined input.
+    跨块边界被切开的转义序列、代理对和 \\xNN UTF-8 序列会留到下一块再处理，
+    因此拼接后的输出与对拼接后的输入调用 decode_unicode_escapes() 的结果相同。
+
+    Args:
+        chunks: An iterable of text chunks. (文本块的可迭代对象)
+
+    Yields:
+        Decoded text pieces, in order. (按顺序产出的解码文本片段)
+    """
+    carry = ""
+    for chunk in chunks:
+        buffer = carry + chunk if carry else chunk
+        cut = _safe_cut(buffer)
+        if cut:
+            yield decode_unicode_escapes(buffer[:cut])
+        carry = buffer[cut:]
+    if carry:
+        yield decode_unicode_escapes(carry)
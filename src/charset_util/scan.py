@@ -0,0 +1,203 @@
+import glob
+import itertools
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Iterator, Optional
+
+from .cache import SQLiteCache
+from .encoding import detect, convert_stream
+
+# Futures kept in flight per worker, so huge trees are not all queued at once
+PENDING_PER_JOB = 4
+
+# One persistent cache connection per process and path
+_caches = {}
+
+
+def _open_cache(path: str) -> SQLiteCache:
+    if path not in _caches:
+        _caches[path] = SQLiteCache(path)
+    return _caches[path]
+
+
+def iter_paths(spec: str) -> Iterator[str]:
+    """
+    Expand a scan target into file paths.
+    把扫描目标展开为文件路径。
+
+    Args:
+        spec: A directory (walked recursively), a glob pattern (** is recursive),
+              '@list.txt' (one path per line) or a single file.
+              目录（递归遍历）、glob 模式（** 表示递归）、'@list.txt'（每行一个路径）或单个文件。
+
+    Yields:
+        File paths, lazily. (惰性产出的文件路径)
+    """
+    if spec.startswith("@"):
+        with open(spec[1:], "r", encoding="utf-8") as f:
+            for line in f:
+                path = line.rstrip("\r\n")
+                if path:
+                    yield path
+    elif os.path.isdir(spec):
+        for dirpath, dirnames, filenames in os.walk(spec):
+            dirnames.sort()
+            for name in sorted(filenames):
+                yield os.path.join(dirpath, name)
+    elif glob.has_magic(spec):
+        for path in glob.iglob(spec, recursive=True):
+            if os.path.isfile(path):
+                yield path
+    else:
+        yield spec
+
+
+def _mirror_path(path: str, root: Optional[str], output_dir: str) -> str:
+    """Place path under output_dir, keeping its layout relative to root."""
+    rel = os.path.relpath(path, root) if root else path
+    if rel.startswith(os.pardir) or os.path.isabs(rel):
+        rel = os.path.splitdrive(os.path.abspath(path))[1].lstrip(os.sep)
+    return os.path.join(output_dir, rel)
+
+
+def scan_file(
+    path: str,
+    convert_to: Optional[str] = None,
+    output_dir: Optional[str] = None,
+    root: Optional[str] = None,
+    chunk_size: Optional[int] = 1024 * 50,
+    strategy: str = "head",
+    cache_path: Optional[str] = None,
+) -> dict:
+    """
+    Detect (and optionally convert) one file, never raising.
+    检测（并可选转换）单个文件，从不抛出异常。
+
+    Args:
+        path: The file to scan. (要扫描的文件)
+        convert_to: Also convert the file to this encoding under output_dir.
+                    同时把文件转换为该编码，写入 output_dir。
+        output_dir: Mirror directory for converted files. (转换后文件的镜像目录)
+        root: Directory that output paths are made relative to. (输出路径相对的根目录)
+        chunk_size, strategy: Passed to detect(). (传给 detect())
+        cache_path: SQLite detection cache shared by all workers. (所有工作进程共享的 SQLite 检测缓存)
+
+    Returns:
+        A record with 'path', 'encoding', 'confidence', 'language', 'size' and 'elapsed'
+        (seconds), plus 'output' when converted, or 'path', 'error' and 'elapsed' on failure.
+        包含 'path'、'encoding'、'confidence'、'language'、'size' 和 'elapsed'（秒）的记录，
+        转换时还有 'output'；失败时为 'path'、'error' 和 'elapsed'。
+    """
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as src:
+            cache = _open_cache(cache_path) if cache_path else None
+            result = detect(src, chunk_size=chunk_size, strategy=strategy, cache=cache)
+            record = {
+                "path": path,
+                "encoding": result["encoding"],
+                "confidence": result["confidence"],
+                "language": result["language"],
+                "size": os.fstat(src.fileno()).st_size,
+            }
+            if convert_to:
+                target = _mirror_path(path, root, output_dir)
+                os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+                # Written aside and renamed, so a failure never leaves a truncated file at target
+                temp = f"{target}.{os.getpid()}.tmp"
+                try:
+                    with open(temp, "w", encoding=convert_to) as dst:
+                        convert_stream(src, dst, chunk_size=chunk_size, detection=result)
+                    os.replace(temp, target)
+                except BaseException:
+                    if os.path.exists(temp):
+                        os.remove(temp)
+                    raise
+                record["output"] = target
+    except Exception as e:
+        record = {"path": path, "error": f"{type(e).__name__}: {e}"}
+    record["elapsed"] = round(time.perf_counter() - start, 6)
+    return record
+
+
+def _finished(pending: dict) -> Iterator[dict]:
+    """Wait for at least one of pending ({future: (path, submitted)}), remove the done ones and yield their records."""
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        path, submitted = pending.pop(future)
+        try:
+            yield future.result()
+        except BrokenProcessPool as e:
+            # A worker died (e.g. killed for memory) while this file was in flight
+            yield {"path": path, "error": f"{type(e).__name__}: {e}", "elapsed": round(time.perf_counter() - submitted, 6)}
+
+
+def scan(
+    paths: Iterable[str],
+    jobs: Optional[int] = None,
+    convert_to: Optional[str] = None,
+    output_dir: Optional[str] = None,
+    root: Optional[str] = None,
+    chunk_size: Optional[int] = 1024 * 50,
+    strategy: str = "head",
+    cache_path: Optional[str] = None,
+) -> Iterator[dict]:
+    """
+    Scan many files on a process pool, yielding records in completion order.
+    在进程池上扫描大量文件，按完成顺序产出记录。
+
+    Use Case (场景):
+    - Auditing a whole tree of files without paying interpreter startup per file.
+    - 审计整棵目录树中的文件，而不必为每个文件付出解释器启动的开销。
+
+    Args:
+        paths: File paths, e.g. from iter_paths(). (文件路径，例如来自 iter_paths())
+        jobs: Worker processes (default: CPU count). 1 scans in this process.
+              工作进程数（默认：CPU 核数）。为 1 时在当前进程中扫描。
+        convert_to, output_dir, root, chunk_size, strategy, cache_path: See scan_file(). (参见 scan_file())
+
+    Yields:
+        One record per file, see scan_file(). Failures are reported, not raised; that includes
+        a worker process dying, after which the remaining files go to a fresh pool.
+        每个文件一条记录，见 scan_file()。失败会被记录而不是抛出；工作进程意外退出也会被记录，
+        其余文件交给新的进程池处理。
+    """
+    if convert_to and not output_dir:
+        raise ValueError("output_dir is required with convert_to")
+
+    options = dict(
+        convert_to=convert_to,
+        output_dir=output_dir,
+        root=root,
+        chunk_size=chunk_size,
+        strategy=strategy,
+        cache_path=cache_path,
+    )
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        for path in paths:
+            yield scan_file(path, **options)
+        return
+
+    remaining = iter(paths)
+    while True:
+        unsent = None
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            pending = {}
+            for path in remaining:
+                try:
+                    pending[pool.submit(scan_file, path, **options)] = (path, time.perf_counter())
+                except BrokenProcessPool:
+                    # This file never ran: it goes to a fresh pool with the rest
+                    unsent = path
+                    break
+                if len(pending) >= jobs * PENDING_PER_JOB:
+                    yield from _finished(pending)
+            while pending:
+                yield from _finished(pending)
+        if unsent is None:
+            return
+        remaining = itertools.chain([unsent], remaining)
@@ -0,0 +1,253 @@
+import asyncio
+import base64
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, BinaryIO, Callable, Optional
+
+from .cache import DetectionCache
+from .encoding import convert, detect, detect_file
+from .recovery import decode_unicode_escapes, repair_mojibake_report
+
+# Requests in flight per worker; reading stops until one finishes, so a fast client cannot queue unbounded work
+PENDING_PER_JOB = 4
+
+# Longest request line accepted (base64 payloads are inline)
+MAX_REQUEST_SIZE = 64 * 1024 * 1024
+
+# Bytes read per step when skipping the rest of a line that is too long
+_SKIP_BLOCK = 1024 * 1024
+
+OPERATIONS = ("detect", "convert", "repair", "decode-escapes")
+
+# Options that only detect() understands; everything else in 'options' goes to convert() as well
+_DETECT_ONLY = ("fast_path", "margin", "windows")
+_DETECT_OPTIONS = _DETECT_ONLY + ("chunk_size", "strategy", "candidates", "exclude", "language")
+
+
+def _payload(request: dict) -> bytes:
+    if "data" in request:
+        return base64.b64decode(request["data"])
+    if "path" in request:
+        with open(request["path"], "rb") as f:
+            return f.read()
+    raise ValueError("request needs 'data' (base64) or 'path'")
+
+
+def _convert(content: bytes, cache: Optional[DetectionCache], options: dict) -> str:
+    """convert() with detection going through the shared cache."""
+    convert_options = {k: v for k, v in options.items() if k not in _DETECT_ONLY}
+    if "encoding" not in options:
+        detect_options = {k: v for k, v in options.items() if k in _DETECT_OPTIONS}
+        convert_options["detection"] = detect(content, cache=cache, **detect_options)
+    return convert(content, **convert_options)
+
+
+def _text(request: dict, cache: Optional[DetectionCache], options: dict) -> str:
+    if "text" in request:
+        return request["text"]
+    return _convert(_payload(request), cache, options)
+
+
+def handle_request(request: dict, cache: Optional[DetectionCache] = None) -> Any:
+    """
+    Run one request and return its result; errors are raised.
+    执行一个请求并返回结果；出错时抛出异常。
+
+    Args:
+        request: {'op': one of OPERATIONS, 'data': base64 bytes | 'path': file | 'text': str (repair and
+                 decode-escapes only), 'options': keyword arguments for detect() and convert()}.
+                 {'op': OPERATIONS 之一, 'data': base64 字节 | 'path': 文件 | 'text': 字符串（仅 repair 和
+                 decode-escapes）, 'options': 传给 detect() 和 convert() 的关键字参数}。
+        cache: Detection cache shared by all requests. (所有请求共享的检测缓存)
+
+    Returns:
+        detect: the detect() dictionary. convert and decode-escapes: {'text'}. repair: {'text', 'report'}.
+        detect：detect() 的字典。convert 和 decode-escapes：{'text'}。repair：{'text', 'report'}。
+    """
+    op = request.get("op")
+    options = request.get("options") or {}
+    if op == "detect":
+        if "path" in request and "data" not in request:
+            return detect_file(request["path"], cache=cache, **options)
+        return detect(_payload(request), cache=cache, **options)
+    if op == "convert":
+        return {"text": _convert(_payload(request), cache, options)}
+    if op == "repair":
+        text, report = repair_mojibake_report(_text(request, cache, options))
+        return {"text": text, "report": report}
+    if op == "decode-escapes":
+        return {"text": decode_unicode_escapes(_text(request, cache, options))}
+    raise ValueError(f"Unknown op: {op!r} (expected one of {', '.join(OPERATIONS)})")
+
+
+class _Server:
+    """
+    Dispatches request lines from any number of connections to one worker pool and cache.
+
+    The pool is threads: detection and conversion hold the GIL, so more workers overlap file
+    reads and client I/O but do not run requests in parallel. A request slot is freed when its
+    call returns in its thread, not when it times out, so stuck calls stop reading new requests.
+    """
+
+    def __init__(self, jobs: int, timeout: Optional[float], cache: DetectionCache):
+        self.jobs = jobs
+        self.timeout = timeout
+        self.cache = cache
+        self.pool = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="charset-util-serve")
+
+    async def _answer(self, line: bytes, write: Callable[[bytes], Awaitable[None]], slots: asyncio.Semaphore) -> None:
+        request_id = None
+        submitted = False
+        try:
+            if len(line) >= MAX_REQUEST_SIZE and not line.endswith(b"\n"):
+                raise ValueError(f"request line longer than {MAX_REQUEST_SIZE} bytes")
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            request_id = request.get("id")
+            timeout = request.get("timeout", self.timeout)
+            loop = asyncio.get_running_loop()
+            call = self.pool.submit(handle_request, request, self.cache)
+            # A timed-out call cannot be interrupted: it finishes in its thread and the result is
+            # dropped. Its slot stays taken until then, so stuck calls cannot pile up in the pool.
+            call.add_done_callback(lambda _: _release_soon(loop, slots))
+            submitted = True
+            result = await asyncio.wait_for(asyncio.wrap_future(call), timeout)
+            response = {"id": request_id, "ok": True, "result": result}
+        except asyncio.TimeoutError:
+            response = {"id": request_id, "ok": False, "error": f"timed out after {timeout}s"}
+        except Exception as e:
+            response = {"id": request_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+        finally:
+            if not submitted:
+                slots.release()
+        await write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    async def run(self, readline: Callable[[], Awaitable[bytes]], write: Callable[[bytes], Awaitable[None]]) -> None:
+        """Answer request lines until EOF; responses go out as they complete, tagged with the request id."""
+        slots = asyncio.Semaphore(self.jobs * PENDING_PER_JOB)
+        tasks = set()
+        while True:
+            await slots.acquire()
+            line = await readline()
+            if not line:
+                slots.release()
+                break
+            if not line.strip():
+                slots.release()
+                continue
+            task = asyncio.ensure_future(self._answer(line, write, slots))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+def _release_soon(loop: asyncio.AbstractEventLoop, slots: asyncio.Semaphore) -> None:
+    """Release a request slot from a worker thread."""
+    try:
+        loop.call_soon_threadsafe(slots.release)
+    except RuntimeError:
+        # The server has stopped and its loop is closed
+        pass
+
+
+def _skip_line(stream: BinaryIO) -> None:
+    """Read up to and including the next newline (or EOF)."""
+    while True:
+        part = stream.readline(_SKIP_BLOCK)
+        if not part or part.endswith(b"\n"):
+            return
+
+
+async def _serve_stdio(server: _Server) -> None:
+    loop = asyncio.get_running_loop()
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    # Blocking reads get their own thread, so a pipe, a tty or a redirected file all work
+    with ThreadPoolExecutor(max_workers=1) as reader:
+        async def readline() -> bytes:
+            line = await loop.run_in_executor(reader, stdin.readline, MAX_REQUEST_SIZE)
+            if len(line) >= MAX_REQUEST_SIZE and not line.endswith(b"\n"):
+                # Cut at the limit: the rest is skipped, so the line is answered with one error
+                # instead of its pieces being parsed as requests of their own
+                await loop.run_in_executor(reader, _skip_line, stdin)
+            return line
+
+        async def write(data: bytes) -> None:
+            stdout.write(data)
+            stdout.flush()
+
+        await server.run(readline, write)
+
+
+async def _serve_socket(server: _Server, path: str) -> None:
+    async def connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        lock = asyncio.Lock()
+
+        async def write(data: bytes) -> None:
+            async with lock:
+                writer.write(data)
+                await writer.drain()
+
+        try:
+            await server.run(reader.readline, write)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    unix_server = await asyncio.start_unix_server(connection, path, limit=MAX_REQUEST_SIZE)
+    try:
+        async with unix_server:
+            await unix_server.serve_forever()
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def serve(
+    socket_path: Optional[str] = None,
+    jobs: Optional[int] = None,
+    timeout: Optional[float] = None,
+    cache: Optional[DetectionCache] = None,
+) -> None:
+    """
+    Keep the library warm and answer JSON-lines requests until stdin closes (or forever on a socket).
+    保持库处于预热状态，应答 JSON lines 请求，直到 stdin 关闭（使用套接字时一直运行）。
+
+    Use Case (场景):
+    - Shell pipelines and non-Python services that would otherwise start the CLI once per file,
+      paying interpreter startup and dependency imports every time.
+    - Shell 流水线和非 Python 服务原本要为每个文件启动一次命令行，每次都要付出解释器启动和依赖导入的开销。
+
+    Each request line is a JSON object (see handle_request()) with an optional 'id' and 'timeout'
+    (seconds). Requests are pipelined: they run on a thread pool and each response line
+    {'id', 'ok', 'result' | 'error'} is written as soon as it is ready, so order may differ from the requests.
+    The work itself holds the GIL, so extra threads only overlap I/O (file reads, slow clients);
+    for CPU parallelism run several servers. A timed-out request is answered at once, but its
+    thread runs on and keeps its slot until the call returns.
+    每行请求是一个 JSON 对象（见 handle_request()），可带 'id' 和 'timeout'（秒）。
+    请求以流水线方式处理：在线程池上运行，每个响应行 {'id', 'ok', 'result' | 'error'} 一旦就绪就写出，
+    顺序可能与请求不同。实际的计算持有 GIL，因此多个线程只能让 I/O（读文件、慢速客户端）重叠进行；
+    需要利用多核时请运行多个服务进程。超时的请求会立即得到应答，但它的线程会继续运行，
+    在调用返回之前一直占用其名额。
+
+    Args:
+        socket_path: Listen on this Unix domain socket instead of stdin/stdout. (改为监听该 Unix 域套接字)
+        jobs: Worker threads, for overlapping I/O (default: CPU count). (工作线程数，用于重叠 I/O；默认：CPU 核数)
+        timeout: Default per-request timeout in seconds (default: none). (默认的单个请求超时，秒；默认不限)
+        cache: Detection cache shared by all requests (default: a new in-memory DetectionCache).
+               所有请求共享的检测缓存（默认：新的内存 DetectionCache）。
+    """
+    server = _Server(jobs or os.cpu_count() or 1, timeout, cache if cache is not None else DetectionCache())
+    try:
+        if socket_path:
+            asyncio.run(_serve_socket(server, socket_path))
+        else:
+            asyncio.run(_serve_stdio(server))
+    finally:
+        server.pool.shutdown(wait=False)
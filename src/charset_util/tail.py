@@ -0,0 +1,240 @@
+import base64
+import json
+import os
+import time
+from typing import BinaryIO, Iterator, Optional
+
+from . import instrument
+from .encoding import DEFAULT_BLOCK_SIZE, _StreamDecoder
+
+# Seconds between polls when the file has not grown
+POLL_INTERVAL = 1.0
+
+
+class _Follower:
+    """
+    Position, pinned encoding and decoder of the file being followed, and their checkpoint.
+    被跟踪文件的位置、固定的编码和解码器，以及它们的检查点。
+    """
+
+    def __init__(self, path: str, state_path: Optional[str], encoding: Optional[str],
+                 errors: str, chunk_size: Optional[int], block_size: int):
+        self.path = path
+        self.state_path = state_path
+        self.encoding = encoding
+        # An encoding we detected (as opposed to one given) is decoded strictly and re-detected once
+        self.detected = encoding is None
+        self.errors = errors
+        self.chunk_size = chunk_size
+        self.block_size = block_size
+        self.file: Optional[BinaryIO] = None
+        self.identity = None
+        self.offset = 0
+        self.decoder: Optional[_StreamDecoder] = None
+
+    def load(self) -> None:
+        """Resume from the state file if it describes the file now at path."""
+        self._open()
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if self.encoding is None:
+            self.encoding = state.get("encoding")
+        size = os.fstat(self.file.fileno()).st_size
+        # Another file (rotated since) or a shorter one (truncated since): start it from the beginning
+        if tuple(state.get("identity") or ()) != self.identity or state["offset"] > size:
+            return
+        self.offset = state["offset"]
+        self.file.seek(self.offset)
+        if state.get("codec"):
+            checkpoint = {
+                "encoding": self.encoding,
+                "codec": state["codec"],
+                "strict": state.get("strict", False),
+                "pending": base64.b64decode(state["pending"]),
+                "flag": state["flag"],
+            }
+            self.decoder = _StreamDecoder.from_state(checkpoint, self.errors, self._sample_size())
+
+    def save(self) -> None:
+        if not self.state_path:
+            return
+        # read() flushes what the decoder holds back, so it is pinned (or not started) here
+        checkpoint = self.decoder.getstate() if self.decoder is not None else None
+        if checkpoint is None:
+            checkpoint = {"codec": None, "strict": False, "pending": b"", "flag": 0}
+        state = {
+            "path": self.path,
+            "identity": list(self.identity),
+            "offset": self.offset,
+            "encoding": self.encoding,
+            "codec": checkpoint["codec"],
+            "strict": checkpoint["strict"],
+            "pending": base64.b64encode(checkpoint["pending"]).decode("ascii"),
+            "flag": checkpoint["flag"],
+        }
+        # Written aside and renamed, so a crash never leaves a half-written state file
+        temp = self.state_path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temp, self.state_path)
+
+    def _open(self) -> None:
+        self.file = open(self.path, "rb")
+        stat = os.fstat(self.file.fileno())
+        self.identity = (stat.st_dev, stat.st_ino)
+        self.offset = 0
+        self.decoder = None
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def rotated(self) -> bool:
+        """Whether path now names another file (e.g. logrotate moved the old one away)."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            # Between the move and the creation of the new file
+            return False
+        return (stat.st_dev, stat.st_ino) != self.identity
+
+    def reopen(self) -> None:
+        self.close()
+        self._open()
+
+    def truncated(self) -> bool:
+        return os.fstat(self.file.fileno()).st_size < self.offset
+
+    def rewind(self) -> None:
+        self.file.seek(0)
+        self.offset = 0
+        self.decoder = None
+
+    def _sample_size(self) -> int:
+        return self.chunk_size if self.chunk_size is not None else self.block_size
+
+    def _decode(self, data: bytes) -> str:
+        if self.decoder is None:
+            # A UTF-8 BOM can only be at the start of the file
+            head = data if self.offset == len(data) else b""
+            if self.encoding is None:
+                # Nothing is pinned until non-ASCII bytes arrive; until then pure ASCII is decoded
+                # as ASCII, which every ASCII-compatible encoding agrees with
+                self.decoder = _StreamDecoder("ascii", head, self.errors, self._sample_size())
+            else:
+                self.decoder = _StreamDecoder(self.encoding, head, self.errors, self._sample_size(),
+                                              detected=self.detected)
+        text = self.decoder.decode(data)
+        self._track()
+        return text
+
+    def _track(self) -> None:
+        """Remember the encoding the decoder pinned (or re-detected), for rotation and the state file."""
+        if self.decoder.encoding is not None:
+            self.encoding = self.decoder.encoding
+
+    def read(self) -> str:
+        """
+        Decode everything appended since the last read; a character cut at EOF waits in the decoder.
+
+        Non-ASCII bytes are held back for detection until chunk_size of them have arrived or the
+        reader catches up with the end of the file: a live log cannot wait for more.
+        """
+        pieces = []
+        while True:
+            data = self.file.read(self.block_size)
+            if not data:
+                break
+            started = instrument.clock()
+            self.offset += len(data)
+            pieces.append(self._decode(data))
+            instrument.emit("tail.decode", len(data), started)
+        if self.decoder is not None:
+            pieces.append(self.decoder.flush())
+            self._track()
+        return "".join(pieces)
+
+    def finish(self) -> str:
+        """Flush a character left unfinished when the file was rotated away."""
+        if self.decoder is None:
+            return ""
+        text = self.decoder.decode(b"", final=True)
+        self._track()
+        return text
+
+
+def tail_convert(
+    path: str,
+    state_path: Optional[str] = None,
+    encoding: Optional[str] = None,
+    errors: str = "replace",
+    chunk_size: Optional[int] = 1024 * 50,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    follow: bool = True,
+    poll_interval: float = POLL_INTERVAL,
+) -> Iterator[str]:
+    """
+    Decode a growing file (e.g. a live log), yielding only the text of newly appended bytes.
+    解码一个不断增长的文件（例如正在写入的日志），只产出新追加字节的文本。
+
+    Use Case (场景):
+    - Normalising live application logs without re-running detection and decoding from
+      byte 0 every time: each poll costs one stat and a read of the appended bytes.
+    - 规范化正在写入的应用日志，而不必每次都从第 0 个字节重新检测和解码：每次轮询只需一次 stat 和读取新追加的字节。
+
+    The encoding is detected once, as iter_convert() does: from the first non-ASCII bytes (up
+    to chunk_size of them, or what has arrived when the end of file is reached), ignoring a
+    guess without any coherence, and re-detected once at the first byte it cannot decode.
+    A multibyte character cut by the current end of file waits in the incremental decoder for the rest.
+    When path is replaced by a new file (rotation), the old file is read to its end and the
+    new one is followed from its start; when the file shrinks (truncation), it is followed
+    from its start again. With state_path, the offset, encoding and decoder state are
+    checkpointed after each batch of text is handed over, so a restart resumes there.
+    编码与 iter_convert() 一样只检测一次：依据第一批非 ASCII 字节（最多 chunk_size 个，或读到文件末尾时已有的字节），
+    忽略没有任何一致性的猜测，并在遇到第一个无法解码的字节时重新检测一次。被当前文件末尾切开的多字节字符
+    会在增量解码器中等待剩余字节。path 被新文件替换（轮转）时，先把旧文件读到末尾，再从头跟踪新文件；
+    文件变短（截断）时，从头重新跟踪。提供 state_path 时，每批文本交出后都会保存偏移量、编码和解码器状态，
+    重启后从那里继续。
+
+    Args:
+        path: The file to follow. (要跟踪的文件)
+        state_path: JSON checkpoint file, read at start and rewritten as text is handed over.
+                    JSON 检查点文件，启动时读取，每交出一批文本后重写。
+        encoding: Pin this encoding instead of detecting it. (直接固定为该编码，而不检测)
+        errors: Error handler for undecodable bytes (default: replace). (无法解码字节的错误处理方式，默认：replace)
+        chunk_size: Bytes sampled for detection. (检测时采样的字节数)
+        block_size: Bytes read per step. (每次读取的字节数)
+        follow: Keep polling for new bytes; False stops at the current end of file (e.g. one
+                incremental run from cron).
+                持续轮询新字节；为 False 时读到当前文件末尾就停止（例如由 cron 做一次增量运行）。
+        poll_interval: Seconds to wait when nothing was appended. (没有新字节时等待的秒数)
+
+    Yields:
+        Decoded text, in order. (按顺序产出的解码文本)
+    """
+    follower = _Follower(path, state_path, encoding, errors, chunk_size, block_size)
+    follower.load()
+    try:
+        while True:
+            if follower.truncated():
+                follower.rewind()
+            text = follower.read()
+            if follower.rotated():
+                # Drain what was written to the old file up to the rotation; the rest of a
+                # character cut there will never come
+                text += follower.read() + follower.finish()
+                follower.reopen()
+                text += follower.read()
+            if text:
+                yield text
+                # Checkpointed once the caller asks for more, i.e. after it has taken the text
+                follower.save()
+            elif follow:
+                time.sleep(poll_interval)
+            else:
+                break
+    finally:
+        follower.close()
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from charset_util import aio
+
+class TestAio(unittest.TestCase):
+
+    def tearDown(self):
+        aio.configure()
+
+    def test_small_payloads_run_inline(self):
+        """Test that payloads under the threshold run on the event loop thread"""
+        seen = []
+
+        def fake_detect(content, **kwargs):
+            seen.append(threading.current_thread())
+            return {"encoding": "ascii"}
+
+        with mock.patch.object(aio, "detect", fake_detect):
+            asyncio.run(aio.adetect(b"tiny"))
+        self.assertIs(seen[0], threading.current_thread())
+
+    def test_offloaded_results(self):
+        """Test the async wrappers when every call is offloaded"""
+        aio.configure(executor=ThreadPoolExecutor(2), inline_threshold=0)
+        gbk = "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。".encode('gbk')
+
+        async def run():
+            return await asyncio.gather(
+                aio.adetect(gbk),
+                aio.aconvert(gbk),
+                aio.arepair("你好".encode('utf-8').decode('latin-1')),
+                aio.adecode_unicode_escapes(r"\u4f60\u597d"),
+            )
+
+        detected, converted, repaired, decoded = asyncio.run(run())
+        self.assertEqual(detected["encoding"], "gb18030")
+        self.assertEqual(converted, "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。")
+        self.assertEqual(repaired, "你好")
+        self.assertEqual(decoded, "你好")
+
+    def test_concurrency_limit(self):
+        """Test that no more than max_concurrency calls run at once"""
+        aio.configure(executor=ThreadPoolExecutor(8), max_concurrency=2, inline_threshold=0)
+        lock = threading.Lock()
+        state = {"running": 0, "peak": 0}
+
+        def slow_repair(text):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            time.sleep(0.02)
+            with lock:
+                state["running"] -= 1
+            return text
+
+        async def run():
+            await asyncio.gather(*(aio.arepair("x") for _ in range(8)))
+
+        with mock.patch.object(aio, "repair_mojibake", slow_repair):
+            asyncio.run(run())
+        self.assertEqual(state["peak"], 2)
+
+    def test_cancellation_releases_slot(self):
+        """Test that a cancelled call frees its concurrency slot"""
+        aio.configure(executor=ThreadPoolExecutor(2), max_concurrency=1, inline_threshold=0)
+
+        def slow_repair(text):
+            time.sleep(0.05)
+            return text
+
+        async def run():
+            task = asyncio.ensure_future(aio.arepair("x"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return await asyncio.wait_for(aio.arepair("y"), timeout=1)
+
+        with mock.patch.object(aio, "repair_mojibake", slow_repair):
+            self.assertEqual(asyncio.run(run()), "y")
+
+if __name__ == '__main__':
+    unittest.main()
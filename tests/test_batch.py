@@ -0,0 +1,67 @@
+import unittest
+from charset_util import instrument
+from charset_util.batch import BATCH_CHUNK, convert_many, detect_many
+
+# Short values that are ambiguous on their own but clearly GBK together
+NAMES = ["北京市", "上海市", "广州市", "深圳市", "张伟", "李娜", "王芳", "刘洋", "陈静", "杨磊",
+         "这是一个用于测试的句子", "数据库中的文本列", "确保能够被正确识别", "中华人民共和国"]
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_order_dedup_and_passthrough(self):
+        """Test that results follow input order, duplicates are detected once and None/str pass through"""
+        items = [b"plain", "Hello 世界".encode('utf-8'), None, b"plain", "already text", bytearray(b"ascii")]
+        with instrument.capture() as events:
+            results = detect_many(items)
+        self.assertEqual([r and r["encoding"] for r in results], ["ascii", "utf_8", None, "ascii", "ascii", "ascii"])
+        self.assertIsNot(results[0], results[3])
+        # Everything here is answered by the fast tiers
+        self.assertNotIn("detect.statistical", {e["stage"] for e in events})
+
+        self.assertEqual(convert_many(items), ["plain", "Hello 世界", None, "plain", "already text", "ascii"])
+
+    def test_column_pooling(self):
+        """Test that short values from one column share one detection"""
+        items = [name.encode('gbk') for name in NAMES] * 3 + [b"N/A"]
+        with instrument.capture() as events:
+            results = detect_many(items, column=True)
+        self.assertEqual(sum(e["stage"] == "detect.statistical" for e in events), 1)
+        self.assertEqual({r["method"] for r in results[:-1]}, {"column"})
+        self.assertEqual(results[-1]["encoding"], "ascii")
+
+        texts = convert_many(items, column=True)
+        self.assertEqual(texts, NAMES * 3 + ["N/A"])
+
+    def test_column_outlier_detected_alone(self):
+        """Test that a value the column encoding cannot decode gets its own detection"""
+        outlier = "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。".encode('gbk')[:-1] + b"\xff"
+        items = [name.encode('gbk') for name in NAMES] + [outlier]
+        results = detect_many(items, column=True)
+        self.assertNotEqual(results[-1]["method"], "column")
+
+    def test_value_longer_than_chunk_size(self):
+        """Test that a value whose sampled head is ASCII is not decoded as ASCII as a whole"""
+        value = b'a' * 60000 + '你好'.encode('gbk')
+        self.assertEqual(detect_many([value])[0]["method"], "ascii")
+        self.assertEqual(convert_many([value]), ['a' * 60000 + '你好'])
+
+    def test_value_ending_in_lead_byte(self):
+        """Test that a short value ending in a UTF-8 lead byte is not taken for UTF-8"""
+        items = [b"caf\xc3", b"Jos\xe9", "Zoë".encode('utf-8')]
+        results = detect_many(items)
+        self.assertNotIn("utf8-strict", {r["method"] for r in results[:2]})
+        self.assertEqual(results[2]["method"], "utf8-strict")
+        texts = convert_many(items)
+        self.assertEqual(len(texts), 3)
+        self.assertEqual(texts[2], "Zoë")
+
+    def test_process_pool(self):
+        """Test that chunks sent to worker processes come back in input order"""
+        long_text = "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。"
+        items = [f"{long_text}{i}".encode('gbk') for i in range(BATCH_CHUNK + 10)]
+        texts = convert_many(items, jobs=2, candidates="cjk")
+        self.assertEqual(texts, [f"{long_text}{i}" for i in range(BATCH_CHUNK + 10)])
+
+if __name__ == '__main__':
+    unittest.main()
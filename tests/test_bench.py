@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from charset_util.bench import CORPORA, compare, generate_corpus, parse_size, run_benchmarks
+
+class TestBench(unittest.TestCase):
+
+    def test_parse_size(self):
+        """Test size strings with binary units"""
+        self.assertEqual(parse_size("100B"), 100)
+        self.assertEqual(parse_size("10KB"), 10 * 1024)
+        self.assertEqual(parse_size("1gb"), 1024 ** 3)
+        with self.assertRaises(ValueError):
+            parse_size("ten")
+
+    def test_corpus_is_seeded_and_exact(self):
+        """Test that corpora are reproducible, exactly sized and valid in their encoding"""
+        for corpus in CORPORA:
+            payload = generate_corpus(corpus, 5000, seed=1)
+            self.assertEqual(len(payload), 5000, corpus)
+            self.assertEqual(payload, generate_corpus(corpus, 5000, seed=1), corpus)
+            self.assertNotEqual(payload, generate_corpus(corpus, 5000, seed=2), corpus)
+        generate_corpus("gbk", 5000).decode("gbk")
+        generate_corpus("shift_jis", 5000).decode("shift_jis")
+
+    def test_run_and_compare(self):
+        """Test a tiny run and regression detection against a baseline"""
+        results = run_benchmarks(sizes=["1KB"], operations=["detect"], corpora=["ascii"], min_time=0)
+        [result] = results["results"]
+        self.assertEqual(result["name"], "detect/ascii/1KB")
+        for key in ("mb_per_s", "p50_ms", "p90_ms", "p99_ms", "peak_bytes"):
+            self.assertIn(key, result)
+
+        faster = {"results": [dict(result, mb_per_s=result["mb_per_s"] * 2)]}
+        self.assertEqual([r["name"] for r in compare(results, faster, threshold=0.2)], ["detect/ascii/1KB"])
+        self.assertEqual(compare(results, results, threshold=0.2), [])
+
+        with self.assertRaises(ValueError):
+            run_benchmarks(operations=["nope"])
+
+    def test_cli_fails_on_regression(self):
+        """Test that charset-util bench exits non-zero when the baseline regresses"""
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = os.path.join(tmp, "baseline.json")
+            with open(baseline, "w", encoding="utf-8") as f:
+                json.dump({"results": [{"name": "detect/ascii/1KB", "mb_per_s": 1e12}]}, f)
+            proc = subprocess.run(
+                [sys.executable, "-m", "charset_util.cli", "bench", "--sizes", "1KB", "--ops", "detect",
+                 "--corpora", "ascii", "--min-time", "0", "--baseline", baseline, "-o", os.path.join(tmp, "out.json")],
+                capture_output=True, text=True,
+            )
+            self.assertEqual(proc.returncode, 1, proc.stderr)
+            self.assertIn("Regression: detect/ascii/1KB", proc.stderr)
+            with open(os.path.join(tmp, "out.json"), encoding="utf-8") as f:
+                self.assertEqual(len(json.load(f)["regressions"]), 1)
+
+if __name__ == '__main__':
+    unittest.main()
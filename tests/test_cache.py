@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from charset_util import cache as cache_module
+from charset_util.cache import DetectionCache, SQLiteCache
+from charset_util.encoding import detect
+
+GBK = "这是一个用于测试GBK编码检测的长句子。".encode('gbk')
+
+class TestDetectionCache(unittest.TestCase):
+
+    def test_hits_and_misses(self):
+        """Test that repeated detection is served from the cache"""
+        cache = DetectionCache()
+        first = detect(GBK, cache=cache)
+        second = detect(GBK, cache=cache)
+        self.assertEqual(first, second)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_policy_is_part_of_the_key(self):
+        """Test that a different sampling policy does not reuse a cached result"""
+        cache = DetectionCache()
+        detect(GBK, cache=cache)
+        detect(GBK, cache=cache, strategy='progressive')
+        self.assertEqual(cache.misses, 2)
+
+    def test_returned_results_are_copies(self):
+        """Test that modifying a returned result does not corrupt the cache"""
+        cache = DetectionCache()
+        detect(GBK, cache=cache)["encoding"] = "broken"
+        self.assertNotEqual(detect(GBK, cache=cache)["encoding"], "broken")
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted"""
+        cache = DetectionCache(maxsize=2)
+        cache.set("a", {"encoding": "a"})
+        cache.set("b", {"encoding": "b"})
+        cache.get("a")
+        cache.set("c", {"encoding": "c"})
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertEqual(len(cache), 2)
+
+class TestSQLiteCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_persists_between_instances(self):
+        """Test that results survive reopening the cache file"""
+        with SQLiteCache(self.path) as cache:
+            expected = detect(GBK, cache=cache)
+        with SQLiteCache(self.path) as cache:
+            self.assertEqual(detect(GBK, cache=cache), expected)
+            self.assertEqual(cache.hits, 1)
+
+    def test_file_key(self):
+        """Test that files are keyed by path, size and mtime"""
+        sample = os.path.join(self.tmp.name, "sample.txt")
+        with open(sample, "wb") as f:
+            f.write(GBK)
+        with SQLiteCache(self.path) as cache:
+            with open(sample, "rb") as f:
+                detect(f, cache=cache)
+            with open(sample, "rb") as f:
+                detect(f, cache=cache)
+            self.assertEqual(cache.hits, 1)
+            with open(sample, "ab") as f:
+                f.write(b"more")
+            with open(sample, "rb") as f:
+                detect(f, cache=cache)
+            self.assertEqual(cache.misses, 2)
+
+    def test_version_change_invalidates(self):
+        """Test that a detector version change empties the persistent cache"""
+        with SQLiteCache(self.path) as cache:
+            detect(GBK, cache=cache)
+            self.assertEqual(len(cache), 1)
+        with mock.patch.object(cache_module, "CACHE_FORMAT", cache_module.CACHE_FORMAT + 1):
+            with SQLiteCache(self.path) as cache:
+                self.assertEqual(len(cache), 0)
+
+if __name__ == '__main__':
+    unittest.main()
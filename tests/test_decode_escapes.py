@@ -1,5 +1,5 @@
 import unittest
-from charset_util.recovery import decode_unicode_escapes
+from charset_util.recovery import decode_unicode_escapes, iter_decode_unicode_escapes
 
 class TestDecodeEscapes(unittest.TestCase):
     def test_basic_decode(self):
@@ -48,5 +48,33 @@ class TestDecodeEscapes(unittest.TestCase):
         text = "Hello World"
         self.assertEqual(decode_unicode_escapes(text), text)
 
+class TestDecodeEscapesEngine(unittest.TestCase):
+    def test_surrogate_pair(self):
+        """Test that UTF-16 surrogate pairs combine into one character."""
+        pair = "\\u" + "D83D" + "\\u" + "DE00"
+        self.assertEqual(decode_unicode_escapes("smile " + pair + "!"), "smile \U0001F600!")
+
+    def test_lone_surrogate_is_kept(self):
+        """Test that an unpaired surrogate is decoded as-is."""
+        self.assertEqual(decode_unicode_escapes(r"\uD83D x"), "\ud83d x")
+
+    def test_long_escapes(self):
+        """Test \\UXXXXXXXX escapes, including out-of-range ones."""
+        self.assertEqual(decode_unicode_escapes(r"\U0001F600 \U00110000"), "\U0001F600 \\U00110000")
+
+    def test_byte_escapes(self):
+        """Test \\xNN escapes: UTF-8 runs and Latin-1 bytes."""
+        self.assertEqual(decode_unicode_escapes(r"\xe4\xbd\xa0\xe5\xa5\xbd"), "你好")
+        self.assertEqual(decode_unicode_escapes(r"caf\xe9 \x41"), "café A")
+
+    def test_streaming_matches_whole(self):
+        """Test that chunked decoding equals whole-text decoding for every split."""
+        pair = "\\u" + "D83D" + "\\u" + "DE00"
+        text = "a" + pair + r"b \U0001F600 \xe4\xbd\xa0\xe5\xa5\xbd \xe9 \u4f60\u597d \\u0041 \u12"
+        expected = decode_unicode_escapes(text)
+        for size in range(1, 16):
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            self.assertEqual("".join(iter_decode_unicode_escapes(chunks)), expected)
+
 if __name__ == '__main__':
     unittest.main()
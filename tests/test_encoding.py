@@ -1,5 +1,9 @@
+import io
+import os
 import unittest
-from charset_util.encoding import detect, convert
+from unittest import mock
+from charset_util.cache import DetectionCache
+from charset_util.encoding import PROFILE_ENV, detect, convert, convert_report
 
 class TestEncoding(unittest.TestCase):
     
@@ -41,6 +45,102 @@ class TestEncoding(unittest.TestCase):
         result = detect(large_content, chunk_size=10)
         self.assertIsNotNone(result['encoding'])
         
+    def test_detect_fast_path_methods(self):
+        """Test that the cheap tiers answer before the statistical detector"""
+        self.assertEqual(detect(b"plain ascii").get('method'), 'ascii')
+        self.assertEqual(detect("Hello 世界".encode('utf-8'))['method'], 'utf8-strict')
+        self.assertEqual(detect("这是一个用于测试GBK编码检测的长句子。".encode('gbk'))['method'], 'statistical')
+
+    def test_detect_bom(self):
+        """Test BOM detection for UTF-8/16/32"""
+        cases = [
+            ("utf-8-sig", "utf_8_sig"),
+            ("utf-16", "utf_16"),
+            ("utf-32", "utf_32"),
+        ]
+        for codec, expected in cases:
+            content = "Hello 世界".encode(codec)
+            result = detect(content)
+            self.assertEqual(result['method'], 'bom')
+            self.assertEqual(result['encoding'], expected)
+            self.assertEqual(convert(content), "Hello 世界")
+
+    def test_detect_utf16_without_bom(self):
+        """Test that BOM-less UTF-16 is not mistaken for ASCII"""
+        content = "hello world, this is text".encode('utf-16-le')
+        self.assertEqual(detect(content)['encoding'], 'utf_16_le')
+
+    def test_detect_utf8_truncated_sample(self):
+        """Test that a multibyte sequence cut by chunk_size does not break strict UTF-8"""
+        content = "你好世界".encode('utf-8') * 10
+        result = detect(content, chunk_size=10)
+        self.assertEqual(result['encoding'], 'utf_8')
+
+    def test_detect_latin1_ending_in_lead_byte(self):
+        """Test that a whole value ending in a UTF-8 lead byte is not taken for cut UTF-8"""
+        for content in (b"caf\xe9", b"Jos\xe9"):
+            self.assertNotEqual(detect(content)['method'], 'utf8-strict')
+            self.assertEqual(detect(content, candidates="western")['encoding'], 'cp1252')
+        self.assertEqual(convert(b"caf\xe9", candidates="western"), "café")
+        # Still UTF-8 when only the sample was cut
+        self.assertEqual(detect("café".encode('utf-8') * 10, chunk_size=4)['method'], 'utf8-strict')
+
+    def test_detect_without_fast_path(self):
+        """Test that fast_path=False always uses charset_normalizer"""
+        result = detect("Hello 世界".encode('utf-8'), fast_path=False)
+        self.assertEqual(result['method'], 'statistical')
+
+    def test_detect_progressive_stops_early(self):
+        """Test that progressive detection stops at the first clear window"""
+        content = "Hello 世界".encode('utf-8') * 100000
+        result = detect(content, chunk_size=None, strategy='progressive')
+        self.assertEqual(result['encoding'], 'utf_8')
+        self.assertLess(result['bytes_examined'], len(content))
+
+    def test_detect_progressive_long_ascii_header(self):
+        """Test that progressive detection grows past a long ASCII header"""
+        header = "id,name,comment\n" * 4000
+        body = "这是一个用于测试GBK编码检测的长句子。" * 200
+        content = (header + body).encode('gbk')
+        self.assertEqual(detect(content)['encoding'], 'ascii')
+        result = detect(content, chunk_size=1024 * 1024, strategy='progressive')
+        self.assertEqual(result['encoding'], 'gb18030')
+        self.assertGreater(result['bytes_examined'], len(header))
+
+    def test_detect_stratified_late_body(self):
+        """Test that stratified sampling sees a GBK body behind a long ASCII header"""
+        header = "id,name,comment\n" * 8000
+        body = "这是一个用于测试GBK编码检测的长句子，里面有很多常见的汉字和标点符号。\n" * 5000
+        content = (header + body).encode('gbk')
+        self.assertEqual(detect(content)['encoding'], 'ascii')
+        result = detect(content, strategy='stratified')
+        self.assertEqual(result['encoding'], 'gb18030')
+        self.assertEqual(len(result['windows']), 5)
+        self.assertLessEqual(result['bytes_examined'], 1024 * 50)
+        self.assertGreaterEqual(result['disagreement'], 0.0)
+
+    def test_detect_stratified_file(self):
+        """Test stratified sampling on an open file, restoring its position"""
+        content = ("Hello 世界\n" * 20000).encode('utf-8')
+        f = io.BytesIO(content)
+        f.seek(7)
+        result = detect(f, strategy='stratified', chunk_size=4096)
+        self.assertEqual(result['encoding'], 'utf_8')
+        self.assertEqual(f.tell(), 7)
+        # Every window starts on a character boundary
+        for window in result['windows']:
+            content[window['offset']:].decode('utf-8')
+
+    def test_detect_file_head(self):
+        """Test head detection on an open file"""
+        f = io.BytesIO("Hello 世界".encode('utf-8'))
+        self.assertEqual(detect(f)['encoding'], 'utf_8')
+
+    def test_detect_unknown_strategy(self):
+        """Test that an unknown strategy is rejected"""
+        with self.assertRaises(ValueError):
+            detect(b"abc", strategy='nope')
+
     def test_convert_utf8(self):
         """Test converting UTF-8 bytes to string"""
         original = "Hello World"
@@ -66,5 +166,96 @@ class TestEncoding(unittest.TestCase):
         converted = convert(content)
         self.assertEqual(converted, original)
 
+    def test_convert_explicit_encoding(self):
+        """Test that an explicit encoding skips detection"""
+        content = "café".encode('cp1252')
+        self.assertEqual(convert(content, encoding='cp1252'), "café")
+
+    def test_convert_with_detection_result(self):
+        """Test that a precomputed detect() result is reused"""
+        original = "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。"
+        content = original.encode('gbk')
+        detection = detect(content)
+        self.assertEqual(convert(content, detection=detection), original)
+
+    def test_convert_redetects_on_decode_failure(self):
+        """Test that a misleading ASCII sample triggers re-detection over a wider window"""
+        body = "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。" * 20
+        original = "id,name,comment\n" * 200 + body
+        content = original.encode('gbk')
+        self.assertEqual(convert(content, chunk_size=1024), original)
+
+    def test_convert_report_corrupt_bytes(self):
+        """Test that corrupt bytes are replaced in one pass and accounted for by offset"""
+        text = "这是一个用于测试编码转换的句子。\n" * 100
+        content = bytearray(text.encode('utf-8'))
+        content[300] = 0xff
+        converted, report = convert_report(bytes(content))
+        self.assertIn(report["encoding"], ["utf_8", "utf-8"])
+        self.assertEqual(report["recovered_bytes"], {})
+        self.assertEqual(report["invalid_bytes"], report["replaced_bytes"])
+        self.assertEqual(report["spans"][0][0], 300 - 300 % 3)
+        self.assertEqual(converted.count("\ufffd"), report["invalid_spans"])
+        # Everything but the damaged character survives
+        self.assertEqual(len(converted) - report["invalid_spans"], len(text) - 1)
+
+    def test_convert_report_foreign_run(self):
+        """Test that a run in another encoding is re-decoded with the fallback, not replaced"""
+        gbk_line = "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。".encode('gbk')
+        content = "café ".encode('utf-8') + gbk_line + b" ok"
+        converted, report = convert_report(content, encoding="utf-8")
+        self.assertEqual(converted, "café 这是一个用于测试GBK编码转换的句子，确保能够被正确识别。 ok")
+        self.assertEqual(report["replaced_bytes"], 0)
+        # The ASCII 'GBK' in the middle decodes as UTF-8
+        self.assertEqual(report["recovered_bytes"], {"gb18030": len(gbk_line) - len("GBK")})
+        self.assertEqual(convert_report("plain".encode('utf-8'))[1]["invalid_spans"], 0)
+
+    def test_convert_undetected_gb18030(self):
+        """Test that GB18030 four-byte sequences survive when detection gives no answer"""
+        original = ("你好 café " + "你好".encode('utf-8').decode('latin-1') + "\n") * 100
+        content = original.encode('gb18030')
+        self.assertEqual(convert_report(content, encoding="utf-8")[0], original)
+        self.assertEqual(convert(content), original)
+
+    def test_convert_cjk_body_after_ascii_header(self):
+        """Test that re-detection from the failing line accepts a correct zero-coherence answer"""
+        header = "x,y,z\n" * 20000
+        for line, encoding in [("這是一個用於測試繁體中文編碼的句子，請確認它能被正確識別。\n", "big5"),
+                               ("日本語のテキストです。ログを確認してください。\n", "shift_jis")]:
+            original = header + line * 50
+            self.assertEqual(convert(original.encode(encoding)), original, encoding)
+
+    def test_convert_short_tail_after_long_ascii(self):
+        """Test that an incoherent re-detection guess does not replace the fallbacks"""
+        content = b'a' * 60000 + '你好'.encode('gbk')
+        converted, report = convert_report(content)
+        self.assertEqual(converted, 'a' * 60000 + '你好')
+        self.assertEqual(report["recovered_bytes"], {"gb18030": 4})
+
+    def test_detect_candidates_and_profiles(self):
+        """Test that candidates, profiles and exclusions restrict every tier"""
+        short_gbk = "你好世界".encode('gbk')
+        self.assertIn(detect(short_gbk, candidates="cjk")['encoding'], ['gb18030', 'euc_kr', 'big5', 'shift_jis', 'euc_jp'])
+        self.assertEqual(detect(short_gbk, candidates=['gb18030', 'big5'])['encoding'], 'gb18030')
+        self.assertEqual(detect(short_gbk, language='zh-CN')['encoding'], 'gb18030')
+        # Too short for charset_normalizer: the first candidate that decodes answers
+        result = detect("café déjà".encode('cp1252'), candidates="western")
+        self.assertEqual((result['encoding'], result['method']), ('cp1252', 'candidate'))
+        # ... but not a UTF-8 candidate for a value ending in a lead byte
+        self.assertEqual(detect(b"caf\xc3", candidates="western")['encoding'], 'cp1252')
+        # The UTF-8 tier respects exclusions
+        self.assertNotIn(detect("héllo wörld".encode('utf-8'), exclude=['utf-8'])['encoding'], ['utf_8', 'utf-8'])
+        with self.assertRaises(ValueError):
+            detect(short_gbk, candidates="nope")
+
+    def test_profile_from_environment(self):
+        """Test that CHARSET_UTIL_PROFILE sets the default candidates and is part of the cache key"""
+        cache = DetectionCache()
+        content = "café déjà".encode('cp1252')
+        detect(content, cache=cache)
+        with mock.patch.dict(os.environ, {PROFILE_ENV: "western"}):
+            self.assertEqual(detect(content, cache=cache)['encoding'], 'cp1252')
+        self.assertEqual(cache.hits, 0)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,102 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from charset_util.cache import DetectionCache
+from charset_util.encoding import detect_file, convert_file, transcode_file
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+class TestFileAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.original = "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。\n" * 2000
+        self.path = os.path.join(self.tmp.name, "gbk.txt")
+        with open(self.path, "wb") as f:
+            f.write(self.original.encode('gbk'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_detect_file(self):
+        """Test detection through a memory map"""
+        result = detect_file(self.path)
+        self.assertEqual(result['encoding'], 'gb18030')
+        self.assertLessEqual(result['bytes_examined'], 1024 * 50)
+        self.assertEqual(detect_file(self.path, strategy='stratified')['encoding'], 'gb18030')
+
+    def test_detect_file_cache(self):
+        """Test that detect_file keys the cache by path, size and mtime"""
+        cache = DetectionCache()
+        detect_file(self.path, cache=cache)
+        detect_file(self.path, cache=cache)
+        self.assertEqual(cache.hits, 1)
+
+    def test_convert_file_to_path(self):
+        """Test converting a mapped file to an output path"""
+        out = os.path.join(self.tmp.name, "out.txt")
+        written = convert_file(self.path, out, block_size=1001)
+        self.assertEqual(written, len(self.original))
+        with open(out, encoding='utf-8') as f:
+            self.assertEqual(f.read(), self.original)
+
+    def test_convert_file_to_stream(self):
+        """Test converting a mapped file to a text stream"""
+        dst = io.StringIO()
+        convert_file(self.path, dst, encoding='gbk', block_size=7)
+        self.assertEqual(dst.getvalue(), self.original)
+
+    def test_empty_file(self):
+        """Test that empty files (which cannot be mapped) are handled"""
+        empty = os.path.join(self.tmp.name, "empty.txt")
+        open(empty, "wb").close()
+        self.assertEqual(detect_file(empty)['bytes_examined'], 0)
+        self.assertEqual(convert_file(empty, io.StringIO()), 0)
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "needs named pipes")
+    def test_fifo_is_streamed(self):
+        """Test that a FIFO, whose size says nothing, is read as a stream instead of mapped"""
+        fifo = os.path.join(self.tmp.name, "fifo")
+        os.mkfifo(fifo)
+        content = self.original.encode('gbk')
+
+        def feed():
+            with open(fifo, "wb") as f:
+                f.write(content)
+
+        def read(call):
+            writer = threading.Thread(target=feed)
+            writer.start()
+            try:
+                return call()
+            finally:
+                writer.join()
+
+        self.assertEqual(read(lambda: detect_file(fifo))['encoding'], 'gb18030')
+        dst = io.StringIO()
+        read(lambda: convert_file(fifo, dst))
+        self.assertEqual(dst.getvalue(), self.original)
+        out = io.BytesIO()
+        read(lambda: transcode_file(fifo, out))
+        self.assertEqual(out.getvalue(), self.original.encode('utf-8'))
+
+    def test_cli_reads_piped_input(self):
+        """Test the CLI on /dev/stdin fed by a pipe"""
+        if not os.path.exists("/dev/stdin"):
+            self.skipTest("needs /dev/stdin")
+        env = dict(os.environ, PYTHONPATH=SRC + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        content = self.original.encode('gbk')
+        for args in (["convert", "/dev/stdin"], ["convert", "/dev/stdin", "--mixed"]):
+            result = subprocess.run([sys.executable, "-m", "charset_util.cli"] + args,
+                                    input=content, check=True, capture_output=True, env=env)
+            self.assertEqual(result.stdout.decode('utf-8'), self.original, args)
+        result = subprocess.run([sys.executable, "-m", "charset_util.cli", "detect", "/dev/stdin"],
+                                input=content, check=True, capture_output=True, env=env)
+        self.assertIn("gb18030", result.stdout.decode('utf-8'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from charset_util import instrument
+from charset_util.encoding import convert, detect
+from charset_util.recovery import decode_unicode_escapes, repair_mojibake
+
+class TestInstrument(unittest.TestCase):
+
+    def test_capture_stages(self):
+        """Test that detection and repair stages report structured events"""
+        gbk = "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。".encode('gbk')
+        broken = "你好".encode('utf-8').decode('latin-1')
+        with instrument.capture() as events:
+            detect(gbk)
+            repair_mojibake(broken)
+            decode_unicode_escapes("\\" + "u4f60")
+        stages = [event["stage"] for event in events]
+        self.assertEqual(stages, ["detect.fast", "detect.statistical", "repair.screen", "repair.fix", "decode_escapes"])
+        self.assertEqual(events[1]["bytes"], len(gbk))
+        self.assertTrue(all(event["elapsed_ns"] >= 0 and event["fallback"] is None for event in events))
+
+    def test_fallback_is_reported(self):
+        """Test that convert() reports which fallback fired"""
+        with instrument.capture() as events:
+            text = convert("héllo".encode('utf-8'), encoding="ascii", chunk_size=None)
+        self.assertEqual(text, "héllo")
+        # One pass: only the invalid span is re-decoded with the fallback
+        self.assertEqual([(e["stage"], e["fallback"]) for e in events], [("convert.fallback", "utf-8")])
+
+    def test_stats_and_listeners(self):
+        """Test cumulative stats, and that nothing is emitted once everyone stops listening"""
+        instrument.stats.reset()
+        instrument.stats.enable()
+        try:
+            convert("héllo".encode('utf-8'), encoding="ascii", chunk_size=None)
+            convert("héllo".encode('utf-8'), encoding="ascii", chunk_size=None)
+        finally:
+            instrument.stats.disable()
+        snapshot = instrument.stats.snapshot()
+        self.assertEqual(snapshot["stages"]["convert.fallback"]["count"], 2)
+        self.assertEqual(sum(snapshot["stages"]["convert.fallback"]["histogram"].values()), 2)
+        self.assertEqual(snapshot["fallbacks"], {"convert.fallback:utf-8": 2})
+
+        seen = []
+        instrument.add_listener(seen.append)
+        instrument.remove_listener(seen.append)
+        detect(b"plain ascii")
+        self.assertEqual(seen, [])
+        self.assertEqual(instrument.stats.snapshot(), snapshot)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import charset_util
+
+# Heavy dependencies that only detection/repair should load
+HEAVY = ("charset_normalizer", "ftfy", "sqlite3", "multiprocessing")
+
+# `import charset_util.cli` may cost at most this many times the stdlib modules it needs anyway
+IMPORT_BUDGET_RATIO = 4
+
+
+def _loaded_after(code):
+    """Run code in a fresh interpreter and return the heavy modules it left loaded."""
+    probe = code + f"\nimport sys\nprint(','.join(m for m in {HEAVY!r} if m in sys.modules), file=sys.stderr)"
+    proc = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+    return [name for name in proc.stderr.strip().splitlines()[-1].split(",") if name] if proc.stderr.strip() else []
+
+
+def _import_time_us(statement):
+    """Best-of-three total import time (microseconds) of running statement in a fresh interpreter."""
+    times = []
+    for _ in range(3):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True, check=True)
+        total = 0
+        for line in proc.stderr.splitlines():
+            _, cumulative, name = line.split("|")
+            # Top-level entries only; the header line has no number
+            if cumulative.strip().isdigit() and not name.startswith("  "):
+                total += int(cumulative)
+        times.append(total)
+    return min(times)
+
+
+class TestLazyImport(unittest.TestCase):
+
+    def test_facade(self):
+        """Test that the public names resolve lazily and unknown names still fail"""
+        self.assertIn("detect", dir(charset_util))
+        self.assertEqual(charset_util.convert(b"hi"), "hi")
+        with self.assertRaises(AttributeError):
+            charset_util.no_such_function
+
+    def test_import_loads_no_heavy_dependencies(self):
+        """Test that importing the package and the CLI does not load charset_normalizer or ftfy"""
+        self.assertEqual(_loaded_after("import charset_util"), [])
+        self.assertEqual(_loaded_after("import charset_util.cli"), [])
+
+    def test_decode_escapes_command_stays_light(self):
+        """Test that charset-util decode-escapes runs without the detection and repair libraries"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "escaped.txt")
+            with open(path, "w", encoding="ascii") as f:
+                f.write("\\" + "u4f60" + "\\" + "u597d\n")
+            code = (
+                "import sys\n"
+                f"sys.argv = ['charset-util', 'decode-escapes', {path!r}]\n"
+                "from charset_util.cli import main\n"
+                "main()"
+            )
+            self.assertEqual(_loaded_after(code), [])
+
+    def test_import_time_budget(self):
+        """Test that CLI cold start stays close to the cost of the stdlib modules it uses"""
+        baseline = _import_time_us("import argparse, json, logging")
+        cli = _import_time_us("import charset_util.cli")
+        self.assertLess(cli, baseline * IMPORT_BUDGET_RATIO, f"charset_util.cli {cli}us vs stdlib {baseline}us")
+
+if __name__ == '__main__':
+    unittest.main()
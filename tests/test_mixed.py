@@ -0,0 +1,80 @@
+import io
+import os
+import tempfile
+import unittest
+from charset_util.mixed import convert_mixed, segment_detect, transcode_mixed_file
+
+class TestMixed(unittest.TestCase):
+
+    def setUp(self):
+        self.utf8 = "2024-01-01 INFO 用户登录成功，会话已经建立，欢迎回来 user=alice\n"
+        self.gbk = "2024-01-01 WARN 这是一个用于测试GBK编码转换的句子，确保能够被正确识别。\n"
+        self.parts = [(self.utf8, 'utf-8')] * 40 + [(self.gbk, 'gbk')] * 40 + [(self.utf8, 'utf-8')] * 30 + [(self.gbk, 'gbk')] * 3
+        self.data = b"".join(text.encode(enc) for text, enc in self.parts)
+
+    def test_runs_follow_encoding_changes(self):
+        """Test that runs start on the lines where the encoding changes"""
+        runs = segment_detect(self.data)
+        self.assertEqual([run["encoding"] for run in runs], ['utf_8', 'gb18030', 'utf_8', 'gb18030'])
+        utf8_len, gbk_len = len(self.utf8.encode('utf-8')), len(self.gbk.encode('gbk'))
+        self.assertEqual(runs[1]["start"], 40 * utf8_len)
+        self.assertEqual(runs[2]["start"], 40 * utf8_len + 40 * gbk_len)
+        self.assertEqual(runs[-1]["end"], len(self.data))
+
+    def test_convert_mixed(self):
+        """Test that each run is decoded with its own codec, also from a memoryview"""
+        expected = "".join(text for text, _ in self.parts)
+        text, runs = convert_mixed(memoryview(self.data), block_size=100)
+        self.assertEqual(text, expected)
+        self.assertEqual(len(runs), 4)
+
+    def test_adjacent_gbk_and_cp1252_lines(self):
+        """Test that GBK and cp1252 lines with no UTF-8 line between them are both recovered"""
+        cp1252 = "2024-01-01 INFO Café déjà vu, naïve façade über\n"
+        parts = [(self.utf8, 'utf-8')] + [(self.gbk, 'gbk'), (cp1252, 'cp1252')] * 20 + [(self.utf8, 'utf-8')]
+        data = b"".join(text.encode(enc) for text, enc in parts)
+        text, runs = convert_mixed(data)
+        self.assertIn("gb18030", {run["encoding"] for run in runs})
+        lines = text.splitlines(keepends=True)
+        self.assertEqual(len(lines), len(parts))
+        for line, (original, encoding) in zip(lines, parts):
+            if encoding == 'cp1252':
+                # A lone Western line is as good as charset_normalizer's single-byte guess for it
+                self.assertEqual(len(line), len(original))
+                self.assertNotIn("\ufffd", line)
+            else:
+                self.assertEqual(line, original)
+
+    def test_single_legacy_encoding_not_split(self):
+        """Test that a detected codec which decodes the whole region is kept, even with zero confidence"""
+        for original, encoding in [("日本語のテキストです。ログを確認してください。\n" * 50, 'shift_jis'),
+                                   ("INFO 안녕하세요 로그인 성공했습니다\n" * 50, 'euc_kr')]:
+            text, runs = convert_mixed(original.encode(encoding))
+            self.assertEqual(text, original, encoding)
+            self.assertEqual(len(runs), 1)
+            self.assertNotEqual(runs[0]["method"], "gb18030-strict")
+
+    def test_transcode_mixed_file(self):
+        """Test that a mixed file is transcoded through a memory map into a path or a stream"""
+        expected = "".join(text for text, _ in self.parts)
+        with tempfile.TemporaryDirectory() as tmp:
+            src, dst = os.path.join(tmp, "mixed.log"), os.path.join(tmp, "out.log")
+            with open(src, "wb") as f:
+                f.write(self.data)
+            runs = transcode_mixed_file(src, dst, target_encoding="gb18030")
+            with open(dst, "rb") as f:
+                self.assertEqual(f.read().decode("gb18030"), expected)
+            self.assertEqual(len(runs), 4)
+            out = io.BytesIO()
+            transcode_mixed_file(src, out)
+            self.assertEqual(out.getvalue().decode("utf-8"), expected)
+
+    def test_single_encoding(self):
+        """Test plain inputs give a single run"""
+        self.assertEqual(segment_detect(b"just ascii\n")[0]["encoding"], "ascii")
+        self.assertEqual(segment_detect(b""), [])
+        text, runs = convert_mixed("hé".encode('utf-16'))
+        self.assertEqual((text, runs[0]["method"]), ("hé", "bom"))
+
+if __name__ == '__main__':
+    unittest.main()
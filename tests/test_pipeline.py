@@ -0,0 +1,70 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from charset_util.encoding import convert
+from charset_util.pipeline import Pipeline
+from charset_util.recovery import decode_unicode_escapes, iter_repair_mojibake, repair_mojibake
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# GBK text with mojibake and escapes on every line
+LINE = "这是一个测试 café \\u4f60\\u597d " + "你好".encode('utf-8').decode('latin-1') + " \\xe4\\xbd\\xa0 done\n"
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_matches_steps_run_one_after_another(self):
+        """Test that the streamed chain equals running each step over the whole text"""
+        content = (LINE * 300).encode('gb18030')
+        expected = decode_unicode_escapes(repair_mojibake(convert(content)))
+        # A tiny block size puts chunk boundaries inside lines, escapes and multibyte characters
+        for block_size in (7, 64, 4096):
+            out = io.BytesIO()
+            pipeline = Pipeline(["convert", "repair", "unescape"], block_size=block_size, chunk_size=1024)
+            written = pipeline.run(io.BytesIO(content), out)
+            self.assertEqual(out.getvalue().decode('utf-8'), expected)
+            self.assertEqual(written, len(out.getvalue()))
+            timings = pipeline.timings()
+            self.assertEqual(list(timings), ["convert", "repair", "unescape", "encode"])
+            self.assertEqual(timings["encode"]["output"], written)
+
+    def test_steps_and_target_encoding(self):
+        """Test step validation, an omitted 'convert' step and a non-UTF-8 target"""
+        pipeline = Pipeline(["unescape"], target_encoding="gbk")
+        self.assertEqual(pipeline.steps, ["convert", "unescape"])
+        self.assertEqual(b"".join(pipeline.iter_bytes(io.BytesIO(b"\\u4f60\\u597d"))), "你好".encode('gbk'))
+        with self.assertRaises(ValueError):
+            Pipeline(["repair", "convert"])
+        with self.assertRaises(ValueError):
+            Pipeline(["shout"])
+
+    def test_ascii_header_longer_than_sample(self):
+        """Test that the body after an ASCII header is decoded by its own encoding"""
+        original = "id,name\n" * 200 + "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。\n" * 20
+        pipeline = Pipeline(["convert"], chunk_size=256, block_size=64)
+        self.assertEqual(b"".join(pipeline.iter_bytes(io.BytesIO(original.encode('gbk')))).decode('utf-8'), original)
+
+    def test_iter_repair_mojibake_chunks(self):
+        """Test that mojibake split across chunks is still repaired"""
+        text = ("naïve café " + "déjà vu".encode('utf-8').decode('latin-1') + "\n") * 50
+        chunks = [text[i:i + 5] for i in range(0, len(text), 5)]
+        self.assertEqual("".join(iter_repair_mojibake(chunks)), repair_mojibake(text))
+
+    def test_cli(self):
+        """Test the pipeline subcommand writes the processed bytes"""
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "in.txt")
+            dst = os.path.join(tmp, "out.txt")
+            with open(src, "wb") as f:
+                f.write((LINE * 10).encode('gb18030'))
+            env = dict(os.environ, PYTHONPATH=SRC + os.pathsep + os.environ.get("PYTHONPATH", ""))
+            subprocess.run([sys.executable, "-m", "charset_util.cli", "pipeline", src, "--steps", "convert,unescape", "-o", dst],
+                           check=True, capture_output=True, env=env)
+            with open(dst, "rb") as f:
+                self.assertEqual(f.read().decode('utf-8'), decode_unicode_escapes(LINE * 10))
+
+if __name__ == '__main__':
+    unittest.main()
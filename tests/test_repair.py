@@ -0,0 +1,73 @@
+import re
+import unittest
+from unittest import mock
+import ftfy
+from charset_util import recovery
+from charset_util.recovery import repair_mojibake, repair_mojibake_report
+
+MOJIBAKE = "你好".encode('utf-8').decode('latin-1')
+
+class TestRepairMojibake(unittest.TestCase):
+
+    def test_clean_text_is_untouched(self):
+        """Test that text without mojibake is not sent to ftfy"""
+        clean = "干净的中文，没有乱码。\r\nCafé “quoted” naïve\n"
+        fixed, report = repair_mojibake_report(clean)
+        self.assertEqual(fixed, clean)
+        self.assertEqual(report["segments"], 0)
+
+    def test_only_suspect_lines_are_repaired(self):
+        """Test that mojibake lines are fixed and the others kept as-is"""
+        text = "第一行，干净。\n" + MOJIBAKE + " means hello\n" + "第三行，干净。\n"
+        fixed, report = repair_mojibake_report(text)
+        self.assertEqual(fixed, "第一行，干净。\n你好 means hello\n第三行，干净。\n")
+        self.assertEqual(report["segments"], 1)
+        self.assertEqual(report["changed"], 1)
+        self.assertEqual(report["chars_repaired"], len(MOJIBAKE + " means hello\n"))
+
+    def test_other_mojibake_is_screened_in(self):
+        """Test that mojibake the cp1252 pattern misses, and HTML entities, still reach ftfy"""
+        cases = {
+            "РџСЂРёРІРµС‚ РјРёСЂ": "Привет мир",  # UTF-8 read as cp1251
+            "Αθήνα".encode('utf-8').decode('cp1253'): "Αθήνα",
+            "Gr√º√üe": "Grüße",  # mac_roman
+            "na├»ve": "naïve",  # cp437 box drawing
+            "&lt;p&gt;": "<p>",
+        }
+        for broken, expected in cases.items():
+            text = "第一行，干净。\n" + broken + "\n"
+            fixed, report = repair_mojibake_report(text)
+            self.assertEqual(fixed, "第一行，干净。\n" + expected + "\n", broken)
+            self.assertEqual(report["segments"], 1)
+        clean = "Привет мир, Αθήνα, Grüße, naïve — “ok”\n"
+        self.assertEqual(repair_mojibake_report(clean)[1]["segments"], 0)
+
+    def test_screen_does_not_read_badness_pattern(self):
+        """Test that the pre-screen works however ftfy writes its badness pattern"""
+        escaped = re.compile(r'\u0420[\u0400-\u04ff]')
+        with mock.patch('ftfy.badness.BADNESS_RE', escaped), mock.patch.object(recovery, '_screen', None):
+            text = "第一行，干净。\nРџСЂРёРІРµС‚ РјРёСЂ\n"
+            fixed, report = repair_mojibake_report(text)
+        self.assertEqual(fixed, "第一行，干净。\nПривет мир\n")
+        self.assertEqual(report["segments"], 1)
+
+    def test_segments_respect_size(self):
+        """Test that adjacent suspect lines are merged up to segment_size"""
+        text = (MOJIBAKE + "\n") * 10
+        _, report = repair_mojibake_report(text, segment_size=len(MOJIBAKE) * 3)
+        self.assertGreater(report["segments"], 1)
+        self.assertEqual(report["changed"], report["segments"])
+
+    def test_without_prescreen_matches_ftfy(self):
+        """Test that prescreen=False gives ftfy's result for the whole text"""
+        text = ("全角，标点\n" + MOJIBAKE + "\n") * 5
+        fixed, _ = repair_mojibake_report(text, prescreen=False, segment_size=8)
+        self.assertEqual(fixed, ftfy.fix_text(text))
+
+    def test_workers(self):
+        """Test that parallel repair gives the same result"""
+        text = ("clean line\n" + MOJIBAKE + "\n") * 50
+        self.assertEqual(repair_mojibake(text, workers=2), repair_mojibake(text))
+
+if __name__ == '__main__':
+    unittest.main()
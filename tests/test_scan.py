@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from charset_util.scan import PENDING_PER_JOB, iter_paths, scan, scan_file
+
+
+def _crash_on_marker(path, **options):
+    """scan_file(), except that the worker process dies on files named 'crash'."""
+    if os.path.basename(path) == "crash":
+        os._exit(1)
+    return scan_file(path, **options)
+
+
+class TestScan(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        os.makedirs(os.path.join(self.root, "sub"))
+        self.files = {
+            "ascii.txt": b"plain ascii text\n",
+            os.path.join("sub", "utf8.txt"): "Hello 世界\n".encode('utf-8'),
+            os.path.join("sub", "gbk.txt"): "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。\n".encode('gbk'),
+        }
+        for name, content in self.files.items():
+            with open(os.path.join(self.root, name), "wb") as f:
+                f.write(content)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_iter_paths_directory_glob_and_filelist(self):
+        """Test the three kinds of scan targets"""
+        expected = sorted(os.path.join(self.root, name) for name in self.files)
+        self.assertEqual(sorted(iter_paths(self.root)), expected)
+        self.assertEqual(sorted(iter_paths(os.path.join(self.root, "**", "*.txt"))), expected)
+
+        filelist = os.path.join(self.root, "list")
+        with open(filelist, "w", encoding="utf-8") as f:
+            f.write("\n".join(expected) + "\n")
+        self.assertEqual(list(iter_paths("@" + filelist)), expected)
+
+    def test_scan_records_and_failures(self):
+        """Test that every file gets a record and failures do not stop the scan"""
+        paths = list(iter_paths(self.root)) + [os.path.join(self.root, "missing.txt")]
+        records = {r["path"]: r for r in scan(paths, jobs=2)}
+        self.assertEqual(len(records), 4)
+        self.assertIn("error", records[os.path.join(self.root, "missing.txt")])
+        utf8 = records[os.path.join(self.root, "sub", "utf8.txt")]
+        self.assertEqual(utf8["encoding"], "utf_8")
+        self.assertEqual(utf8["size"], len(self.files[os.path.join("sub", "utf8.txt")]))
+        self.assertIn("elapsed", utf8)
+
+    def test_scan_convert_to_mirror(self):
+        """Test conversion into a mirrored output directory"""
+        with tempfile.TemporaryDirectory() as out:
+            records = list(scan(iter_paths(self.root), jobs=1, convert_to="utf-8", output_dir=out, root=self.root))
+            self.assertTrue(all("output" in r for r in records))
+            with open(os.path.join(out, "sub", "gbk.txt"), encoding="utf-8") as f:
+                self.assertEqual(f.read(), "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。\n")
+
+    def test_scan_convert_to_ascii_header(self):
+        """Test that a file whose sampled head is ASCII is converted by its body's encoding"""
+        original = "id,name\n" * 100 + "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。\n" * 20
+        path = os.path.join(self.root, "header.csv")
+        with open(path, "wb") as f:
+            f.write(original.encode('gbk'))
+        with tempfile.TemporaryDirectory() as out:
+            [record] = scan([path], jobs=1, convert_to="utf-8", output_dir=out, root=self.root, chunk_size=256)
+            self.assertEqual(record["encoding"], "ascii")
+            with open(record["output"], encoding="utf-8") as f:
+                self.assertEqual(f.read(), original)
+
+    def test_failed_conversion_leaves_no_partial_output(self):
+        """Test that a conversion that fails midway keeps the previous output and leaves no temp file"""
+        with tempfile.TemporaryDirectory() as out:
+            target = os.path.join(out, "sub", "gbk.txt")
+            os.makedirs(os.path.dirname(target))
+            with open(target, "w", encoding="utf-8") as f:
+                f.write("previous")
+            [record] = scan([os.path.join(self.root, "sub", "gbk.txt")], jobs=1, convert_to="ascii",
+                            output_dir=out, root=self.root)
+            self.assertIn("UnicodeEncodeError", record["error"])
+            self.assertEqual(os.listdir(os.path.dirname(target)), ["gbk.txt"])
+            with open(target, encoding="utf-8") as f:
+                self.assertEqual(f.read(), "previous")
+
+    def test_dead_worker_is_recorded(self):
+        """Test that a worker process dying is recorded and the scan goes on"""
+        crash = os.path.join(self.root, "crash")
+        open(crash, "wb").close()
+        paths = [crash] + sorted(iter_paths(os.path.join(self.root, "sub"))) * 20
+        with mock.patch("charset_util.scan.scan_file", _crash_on_marker):
+            records = list(scan(paths, jobs=2))
+        self.assertEqual(len(records), len(paths))
+        self.assertIn("BrokenProcessPool", next(r for r in records if r["path"] == crash)["error"])
+        # Only files in flight with it fail; the rest run on a fresh pool
+        self.assertGreaterEqual(sum("encoding" in r for r in records), len(paths) - 2 * PENDING_PER_JOB)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import asyncio
+import base64
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import threading
+import unittest
+from unittest import mock
+from charset_util import serve
+from charset_util.cache import DetectionCache
+from charset_util.serve import handle_request
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+GBK_TEXT = "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。"
+
+
+def _env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = SRC + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+class TestServe(unittest.TestCase):
+
+    def test_handle_request_operations(self):
+        """Test each operation with inline payloads, text and file paths"""
+        cache = DetectionCache()
+        data = base64.b64encode(GBK_TEXT.encode('gbk')).decode('ascii')
+
+        self.assertIn(handle_request({"op": "detect", "data": data}, cache)["encoding"].lower(), ["gbk", "gb2312", "gb18030"])
+        self.assertEqual(handle_request({"op": "convert", "data": data}, cache), {"text": GBK_TEXT})
+        # The second convert reuses the shared cache
+        self.assertGreaterEqual(cache.stats()["hits"], 1)
+        self.assertEqual(handle_request({"op": "convert", "data": data, "options": {"encoding": "gbk"}}), {"text": GBK_TEXT})
+        self.assertEqual(handle_request({"op": "decode-escapes", "text": "\\u4f60\\u597d"}), {"text": "你好"})
+        self.assertEqual(handle_request({"op": "repair", "text": "Ã©"})["text"], "é")
+
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(GBK_TEXT.encode('gbk'))
+        try:
+            self.assertEqual(handle_request({"op": "convert", "path": f.name}), {"text": GBK_TEXT})
+            self.assertIn("bytes_examined", handle_request({"op": "detect", "path": f.name}))
+        finally:
+            os.remove(f.name)
+
+        with self.assertRaises(ValueError):
+            handle_request({"op": "explode", "data": data})
+        with self.assertRaises(ValueError):
+            handle_request({"op": "convert"})
+
+    def test_stdio_pipelining_and_errors(self):
+        """Test that every request line gets a response tagged with its id, including failures"""
+        data = base64.b64encode(GBK_TEXT.encode('gbk')).decode('ascii')
+        lines = [
+            {"id": 1, "op": "convert", "data": data},
+            "not json",
+            {"id": 2, "op": "detect", "path": "/nonexistent/file"},
+            {"id": 3, "op": "decode-escapes", "text": "\\u4f60"},
+            {"id": 4, "op": "nope"},
+        ]
+        stdin = "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines) + "\n"
+        proc = subprocess.run(
+            [sys.executable, "-m", "charset_util.cli", "serve", "-j", "2"],
+            input=stdin.encode('utf-8'), capture_output=True, env=_env(), timeout=60,
+        )
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        responses = [json.loads(line) for line in proc.stdout.decode('utf-8').splitlines()]
+        self.assertEqual(len(responses), 5)
+        by_id = {r["id"]: r for r in responses}
+        self.assertEqual(by_id[1], {"id": 1, "ok": True, "result": {"text": GBK_TEXT}})
+        self.assertFalse(by_id[2]["ok"])
+        self.assertIn("FileNotFoundError", by_id[2]["error"])
+        self.assertEqual(by_id[3]["result"], {"text": "你"})
+        self.assertFalse(by_id[4]["ok"])
+        self.assertFalse(by_id[None]["ok"])
+
+    def test_stdio_line_too_long(self):
+        """Test that a line over the limit gets one error and the next request is still answered"""
+        code = "import charset_util.serve as s; s.MAX_REQUEST_SIZE = 1024; s._SKIP_BLOCK = 100; s.serve(jobs=1)"
+        stdin = json.dumps({"id": 1, "op": "decode-escapes", "text": "x" * 5000}) + "\n"
+        stdin += json.dumps({"id": 2, "op": "decode-escapes", "text": "\\u4f60"}) + "\n"
+        proc = subprocess.run([sys.executable, "-c", code], input=stdin.encode('utf-8'),
+                              capture_output=True, env=_env(), timeout=60)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        responses = [json.loads(line) for line in proc.stdout.decode('utf-8').splitlines()]
+        self.assertEqual(len(responses), 2)
+        by_id = {r["id"]: r for r in responses}
+        self.assertIn("longer than 1024 bytes", by_id[None]["error"])
+        self.assertEqual(by_id[2]["result"], {"text": "你"})
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix domain sockets are not available")
+    def test_unix_socket(self):
+        """Test a round trip over the Unix domain socket"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "serve.sock")
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "charset_util.cli", "serve", "--socket", path],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=_env(),
+            )
+            try:
+                deadline = time.monotonic() + 30
+                while not os.path.exists(path):
+                    self.assertIsNone(proc.poll(), proc.stderr.read() if proc.poll() is not None else None)
+                    self.assertLess(time.monotonic(), deadline, "server did not start")
+                    time.sleep(0.05)
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                    client.connect(path)
+                    client.sendall(b'{"id": "a", "op": "decode-escapes", "text": "\\\\u4f60"}\n')
+                    with client.makefile("rb") as reader:
+                        response = json.loads(reader.readline())
+                self.assertEqual(response, {"id": "a", "ok": True, "result": {"text": "你"}})
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+                proc.stderr.close()
+
+    def test_timed_out_call_keeps_its_slot(self):
+        """Test that a timed-out request is answered at once but holds its slot until its thread returns"""
+        stuck = threading.Event()
+        lines = [json.dumps({"id": 1, "op": "detect", "timeout": 0.05}).encode() + b"\n",
+                 json.dumps({"id": 2, "op": "detect"}).encode() + b"\n", b""]
+        reads = []
+        responses = []
+
+        def handle(request, cache):
+            if request["id"] == 1:
+                stuck.wait(30)
+            return {}
+
+        async def readline():
+            reads.append(len(reads))
+            return lines[len(reads) - 1]
+
+        async def write(data):
+            responses.append(json.loads(data))
+
+        async def main():
+            server = serve._Server(1, None, DetectionCache())
+            try:
+                running = asyncio.ensure_future(server.run(readline, write))
+                while not responses:
+                    await asyncio.sleep(0.01)
+                self.assertIn("timed out", responses[0]["error"])
+                await asyncio.sleep(0.2)
+                # The only slot is still taken by the stuck call: the next request is not read yet
+                self.assertEqual(len(reads), 1)
+                stuck.set()
+                await asyncio.wait_for(running, 30)
+            finally:
+                stuck.set()
+                server.pool.shutdown()
+
+        with mock.patch.object(serve, "handle_request", handle), mock.patch.object(serve, "PENDING_PER_JOB", 1):
+            asyncio.run(main())
+        self.assertEqual(len(reads), 3)
+        self.assertEqual(responses[1], {"id": 2, "ok": True, "result": {}})
+
+if __name__ == '__main__':
+    unittest.main()
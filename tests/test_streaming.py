@@ -0,0 +1,85 @@
+import io
+import unittest
+from charset_util.encoding import iter_convert, convert_stream, transcode
+
+# Bodies charset_normalizer answers correctly but with zero coherence (Big5 for contrast)
+CJK_BODIES = [
+    ("日本語のテキストです。ログを確認してください。\n", "shift_jis"),
+    ("INFO 안녕하세요 로그인 성공했습니다\n", "euc_kr"),
+    ("這是一個用於測試繁體中文編碼的句子，請確認它能被正確識別。\n", "big5"),
+]
+
+class TestStreaming(unittest.TestCase):
+
+    def test_iter_convert_split_multibyte(self):
+        """Test that multibyte sequences split across blocks are decoded correctly"""
+        original = "这是一个用于测试流式转换的句子。" * 50
+        content = original.encode('utf-8')
+        # Block size 7 guarantees that 3-byte UTF-8 sequences straddle block boundaries
+        pieces = list(iter_convert(io.BytesIO(content), chunk_size=64, block_size=7))
+        self.assertGreater(len(pieces), 1)
+        self.assertEqual("".join(pieces), original)
+
+    def test_iter_convert_gbk(self):
+        """Test streaming conversion of GBK bytes"""
+        original = "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。" * 20
+        content = original.encode('gbk')
+        text = "".join(iter_convert(io.BytesIO(content), block_size=5))
+        self.assertEqual(text, original)
+
+    def test_iter_convert_explicit_encoding(self):
+        """Test that an explicit encoding skips detection"""
+        content = "café".encode('cp1252')
+        text = "".join(iter_convert(io.BytesIO(content), encoding='cp1252'))
+        self.assertEqual(text, "café")
+
+    def test_iter_convert_strips_utf8_bom(self):
+        """Test that a UTF-8 BOM is not emitted as text"""
+        content = "﻿Hello 世界".encode('utf-8')
+        text = "".join(iter_convert(io.BytesIO(content)))
+        self.assertEqual(text, "Hello 世界")
+
+    def test_iter_convert_empty(self):
+        """Test streaming an empty file"""
+        self.assertEqual(list(iter_convert(io.BytesIO(b""))), [])
+
+    def test_convert_stream(self):
+        """Test that convert_stream writes to a text stream"""
+        original = "Hello 世界\n" * 100
+        dst = io.StringIO()
+        written = convert_stream(io.BytesIO(original.encode('utf-8')), dst, block_size=3)
+        self.assertEqual(dst.getvalue(), original)
+        self.assertEqual(written, len(original))
+
+    def test_iter_convert_ascii_header_longer_than_sample(self):
+        """Test that an all-ASCII sample does not pin ascii for the body after it"""
+        header = "id,name,comment\n" * 100
+        for body, encoding in (("第%d行：这是一段中文日志内容。\n", "utf-8"), ("第%d行：这是一段中文日志内容。\n", "gbk")):
+            original = header + "".join(body % i for i in range(100))
+            content = original.encode(encoding)
+            text = "".join(iter_convert(io.BytesIO(content), chunk_size=256, block_size=100))
+            self.assertEqual(text, original, encoding)
+        # Too few bytes after the header for the detector to say anything
+        content = b'a' * 60000 + '你好'.encode('gbk')
+        self.assertEqual("".join(iter_convert(io.BytesIO(content))), 'a' * 60000 + '你好')
+
+    def test_iter_convert_cjk_body_after_ascii_header(self):
+        """Test that a correct zero-coherence answer is pinned instead of the GB18030 fallback"""
+        header = "x,y,z\n" * 20000
+        for line, encoding in CJK_BODIES:
+            original = header + line * 50
+            content = original.encode(encoding)
+            self.assertEqual("".join(iter_convert(io.BytesIO(content))), original, encoding)
+            self.assertEqual(transcode(content), original.encode('utf-8'), encoding)
+
+    def test_iter_convert_redetects_at_first_error(self):
+        """Test that a sample detected as UTF-8 is re-detected when the body is GBK"""
+        original = "Hello 世界\n" + "".join("第%d行：这是一段中文日志内容。\n" % i for i in range(100))
+        head, body = original.split("\n", 1)
+        head = (head + "\n").encode('utf-8')
+        content = head + body.encode('gbk')
+        text = "".join(iter_convert(io.BytesIO(content), chunk_size=len(head), block_size=4096))
+        self.assertEqual(text, original)
+
+if __name__ == '__main__':
+    unittest.main()
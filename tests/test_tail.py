@@ -0,0 +1,157 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from charset_util.tail import tail_convert
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+TEXT = "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。\n"
+GBK = TEXT.encode('gbk')
+
+
+class TestTail(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "app.log")
+        self.state = os.path.join(self.tmp.name, "app.state")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def append(self, data: bytes):
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+    def test_follow_appends_and_partial_characters(self):
+        """Test that only appended bytes are decoded and a character cut at EOF waits for the rest"""
+        self.append(b"starting up\n")
+        follower = tail_convert(self.path, poll_interval=0.01)
+        try:
+            # Pure ASCII does not pin the encoding yet
+            self.assertEqual(next(follower), "starting up\n")
+            self.append(GBK * 2 + GBK[:5])
+            self.assertEqual(next(follower), TEXT * 2 + TEXT[:2])
+            self.append(GBK[5:])
+            self.assertEqual(next(follower), TEXT[2:])
+        finally:
+            follower.close()
+
+    def test_short_gbk_line_after_ascii(self):
+        """Test that one short GBK line after ASCII is not pinned as whatever a zero-confidence guess says"""
+        self.append(b"x" * 100 + b"\n")
+        follower = tail_convert(self.path, poll_interval=0.01)
+        try:
+            self.assertEqual(next(follower), "x" * 100 + "\n")
+            self.append("你好\n".encode('gbk'))
+            self.assertEqual(next(follower), "你好\n")
+            self.append(GBK)
+            self.assertEqual(next(follower), TEXT)
+        finally:
+            follower.close()
+
+    def test_non_gbk_logs(self):
+        """Test that logs in other legacy encodings decode like convert() does, even when short"""
+        cases = [
+            ("INFO 안녕하세요 로그인\n", 'euc_kr'),
+            ("日本語のテキストです。ログを確認してください。\n" * 30, 'shift_jis'),
+            ("日本語のテキストです。\n", 'euc_jp'),
+            ("這是一個用於測試繁體中文編碼的句子，請確認它能被正確識別。\n", 'big5'),
+            ("INFO Привет мир, это тестовая строка\n", 'cp1251'),
+        ]
+        for text, encoding in cases:
+            with open(self.path, "wb") as f:
+                f.write(text.encode(encoding))
+            self.assertEqual("".join(tail_convert(self.path, follow=False)), text, encoding)
+
+    def test_state_file_resume(self):
+        """Test that a restart resumes from the checkpoint, including a cut character"""
+        self.append(GBK + GBK[:3])
+        self.assertEqual("".join(tail_convert(self.path, state_path=self.state, follow=False)), TEXT + TEXT[:1])
+        with open(self.state, encoding="utf-8") as f:
+            state = json.load(f)
+        self.assertEqual(state["offset"], len(GBK) + 3)
+        self.assertEqual(state["encoding"], "gb18030")
+
+        self.append(GBK[3:])
+        self.assertEqual("".join(tail_convert(self.path, state_path=self.state, follow=False)), TEXT[1:])
+        self.assertEqual(list(tail_convert(self.path, state_path=self.state, follow=False)), [])
+
+    def test_rotation_and_truncation(self):
+        """Test that a rotated or truncated file is followed from its start with the pinned encoding"""
+        self.append(GBK)
+        self.assertEqual("".join(tail_convert(self.path, state_path=self.state, follow=False)), TEXT)
+
+        os.rename(self.path, self.path + ".1")
+        self.append(GBK[:2])
+        # Too little to detect on its own: the pinned encoding from the state file is kept
+        self.assertEqual("".join(tail_convert(self.path, state_path=self.state, follow=False)), TEXT[:1])
+
+        self.append(GBK[2:])
+        self.assertEqual("".join(tail_convert(self.path, state_path=self.state, follow=False)), TEXT[1:])
+
+        # copytruncate: same file, now shorter than the checkpoint
+        with open(self.path, "wb") as f:
+            f.write("新\n".encode('gbk'))
+        self.assertEqual("".join(tail_convert(self.path, state_path=self.state, follow=False)), "新\n")
+
+    def test_rotation_while_following(self):
+        """Test that the rest of the old file is read before switching to the new one"""
+        self.append(GBK)
+        follower = tail_convert(self.path, poll_interval=0.01)
+        try:
+            self.assertEqual(next(follower), TEXT)
+            self.append(b"last line\n")
+            os.rename(self.path, self.path + ".1")
+            self.append(GBK)
+            self.assertEqual(next(follower), "last line\n" + TEXT)
+        finally:
+            follower.close()
+
+    def test_cli_follow(self):
+        """Test convert --follow writes appended text as it arrives"""
+        self.append(GBK)
+        output = os.path.join(self.tmp.name, "out.txt")
+        env = dict(os.environ, PYTHONPATH=SRC + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        proc = subprocess.Popen([sys.executable, "-m", "charset_util.cli", "convert", self.path, "--follow",
+                                 "--poll", "0.05", "--state", self.state, "-o", output], env=env)
+        try:
+            self.append(GBK)
+            deadline = time.monotonic() + 30
+            while True:
+                if os.path.exists(output):
+                    with open(output, "rb") as f:
+                        if f.read() == (TEXT * 2).encode('utf-8'):
+                            break
+                self.assertLess(time.monotonic(), deadline, "output did not catch up")
+                time.sleep(0.05)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    @unittest.skipIf(sys.platform == "win32", "needs SIGINT")
+    def test_cli_follow_flushes_encoder_on_interrupt(self):
+        """Test that a stateful target encoding is ended properly when --follow is interrupted"""
+        self.append("日本語".encode('utf-8'))
+        output = os.path.join(self.tmp.name, "out.txt")
+        env = dict(os.environ, PYTHONPATH=SRC + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        proc = subprocess.Popen([sys.executable, "-m", "charset_util.cli", "convert", self.path, "--follow",
+                                 "--poll", "0.05", "-t", "iso2022_jp", "-o", output], env=env)
+        try:
+            deadline = time.monotonic() + 30
+            while not (os.path.exists(output) and os.path.getsize(output)):
+                self.assertLess(time.monotonic(), deadline, "output did not catch up")
+                time.sleep(0.05)
+        finally:
+            proc.send_signal(signal.SIGINT)
+            proc.wait(timeout=30)
+        with open(output, "rb") as f:
+            # Ends by switching back to ASCII
+            self.assertEqual(f.read(), "日本語".encode('iso2022_jp'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import io
+import os
+import tempfile
+import unittest
+from charset_util.encoding import transcode, transcode_file
+
+class TestTranscode(unittest.TestCase):
+
+    def setUp(self):
+        self.text = "这是一个用于测试GBK编码转换的句子，确保能够被正确识别。\n" * 200
+
+    def test_gbk_to_utf8_chunked(self):
+        """Test transcoding with multibyte characters split across blocks"""
+        self.assertEqual(transcode(self.text.encode('gbk'), 'utf-8', block_size=7), self.text.encode('utf-8'))
+        self.assertEqual(transcode(io.BytesIO(self.text.encode('gbk')), 'gb18030'), self.text.encode('gb18030'))
+
+    def test_same_codec_passthrough(self):
+        """Test that input already in the target encoding is copied, and invalid bytes are still replaced"""
+        data = self.text.encode('utf-8')
+        self.assertEqual(transcode(data, 'utf-8', block_size=7), data)
+        broken = data[:100] + b'\xff' + data[100:-1]
+        expected = broken.decode('utf-8', errors='replace').encode('utf-8')
+        self.assertEqual(transcode(broken, 'utf-8', block_size=7, encoding='utf-8'), expected)
+        with self.assertRaises(UnicodeDecodeError):
+            transcode(broken, 'utf-8', encoding='utf-8', errors='strict')
+
+    def test_bom_is_dropped(self):
+        """Test that a UTF-8 BOM is not copied into UTF-8 output"""
+        self.assertEqual(transcode(b'\xef\xbb\xbfhello', 'utf-8'), b'hello')
+
+    def test_transcode_file_to_stream(self):
+        """Test transcoding a mapped file into a binary stream"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "gbk.txt")
+            with open(path, "wb") as f:
+                f.write(self.text.encode('gbk'))
+            out = io.BytesIO()
+            written = transcode_file(path, out, block_size=1001)
+            self.assertEqual(out.getvalue(), self.text.encode('utf-8'))
+            self.assertEqual(written, len(out.getvalue()))
+
+    def test_transcode_file_ascii_header(self):
+        """Test that an ASCII header longer than the sample does not pin ascii for the body"""
+        original = "id,name,comment\n" * 100 + self.text
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "header.csv")
+            for encoding in ('utf-8', 'gbk'):
+                with open(path, "wb") as f:
+                    f.write(original.encode(encoding))
+                out = io.BytesIO()
+                transcode_file(path, out, chunk_size=256, block_size=1001)
+                self.assertEqual(out.getvalue().decode('utf-8'), original, encoding)
+
+    def test_redetects_at_first_error(self):
+        """Test that a sample detected as UTF-8 is re-detected when the body is GBK"""
+        head = "Hello 世界\n".encode('utf-8')
+        content = head + self.text.encode('gbk')
+        self.assertEqual(transcode(content, 'utf-8', chunk_size=len(head)), head + self.text.encode('utf-8'))
+
+if __name__ == '__main__':
+    unittest.main()